@@ -0,0 +1,7 @@
+import pandas as pd
+
+# Copy-on-write: frames handed to preprocessing and the analysis modules are read-only
+# inputs, and frames derived from them share the untouched columns instead of copying
+# them (always on since pandas 3.0, where the option is deprecated)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
@@ -0,0 +1,71 @@
+"""
+Analysis modules.
+
+Each module declares the raw columns it reads in ``REQUIRED_COLUMNS`` so the
+loaders can pass them to ``usecols`` instead of parsing all 39 columns
+(the ``*_list`` history columns alone are most of the file).
+
+Modules also declare their ``DERIVED_COLUMNS`` and ``AGGREGATIONS`` and
+build their state from the aggregation results (``build_state``), so the
+fused engine (``engine.partial_states``) can evaluate all of them in one
+pass over the frame.
+"""
+
+from ..config import COLUMN_NAMES
+from . import metrics, user, product, behavior
+from .engine import partial_states, verify_states
+from .dask_engine import is_dask_frame, dask_partial_states
+
+
+def get_required_columns(*modules) -> list:
+    """
+    Union of ``REQUIRED_COLUMNS`` of the given modules, in file column order.
+
+    Args:
+        modules: Analysis modules (e.g. ``metrics``, ``user``)
+    """
+    needed = set()
+    for module in modules:
+        needed.update(getattr(module, 'REQUIRED_COLUMNS', []))
+    return [col for col in COLUMN_NAMES if col in needed]
+
+
+# Columns needed by the full dashboard (all analysis modules)
+ANALYSIS_COLUMNS = get_required_columns(metrics, user, product, behavior)
+
+
+# Modules of the full dashboard, in output order, with their finalize step
+ANALYSIS_MODULES = [metrics, user, product, behavior]
+FINALIZERS = {
+    'metrics': metrics.finalize_metrics,
+    'user': user.finalize_user,
+    'product': product.finalize_product,
+    'behavior': behavior.finalize_behavior
+}
+
+
+def finalize_states(states: dict) -> tuple:
+    """
+    Finalize the (merged) states of all ANALYSIS_MODULES.
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    return tuple(FINALIZERS[name](states[name]) for name in FINALIZERS)
+
+
+def analyze_all(df) -> tuple:
+    """
+    Run all analysis modules with the fused engine: derived columns and
+    groupbys shared between modules are computed once.
+
+    A Dask DataFrame is reduced on the workers in a single dask.compute
+    (see dask_engine); only the aggregated states reach the client. Top-K
+    summaries are then made exact by a second pass over their candidates.
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    if is_dask_frame(df):
+        return finalize_states(dask_partial_states(df, ANALYSIS_MODULES))
+    return finalize_states(verify_states(df, partial_states(df, ANALYSIS_MODULES), ANALYSIS_MODULES))
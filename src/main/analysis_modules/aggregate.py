@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from .sketches import SpaceSaving
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """
+    Distinct 64-bit hashes of the non-null values of a column.
+
+    Used as a mergeable stand-in for the values themselves (e.g. user_id
+    strings) when counting distinct values across chunks.
+    """
+    return np.unique(pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy())
+
+
+def merge_states(left: dict, right: dict) -> dict:
+    """
+    Merge two partial aggregate states of the same analysis module.
+
+    States are dicts of additive parts: scalars and grouped Series/DataFrames
+    are summed (missing keys count as 0), arrays of distinct hashes are unioned
+    and distinct counts and sketches merged (their `+`).
+    """
+    if left is None:
+        return right
+    if right is None:
+        return left
+
+    merged = {}
+    for key in left.keys() | right.keys():
+        if key not in right:
+            merged[key] = left[key]
+        elif key not in left:
+            merged[key] = right[key]
+        elif isinstance(left[key], (pd.Series, pd.DataFrame)):
+            merged[key] = left[key].add(right[key], fill_value=0)
+        elif isinstance(left[key], np.ndarray):
+            merged[key] = np.union1d(left[key], right[key])
+        else:
+            merged[key] = left[key] + right[key]
+    return merged
+
+
+def scale_state(state: dict, factor: float, distinct_factor: float = 1) -> dict:
+    """
+    Scale the additive parts of a state by factor (e.g. 1 / f for a sample of fraction f).
+
+    Ratios of scaled parts (means, rates, shares) are unchanged; top-K
+    summaries scale their counts. Distinct counts (hash arrays,
+    HyperLogLog sketches) cannot be scaled in the state; distinct_factor
+    is recorded under 'distinct_scale' for the finalize step. It is only
+    an unbiased multiplier when the sample kept or dropped every row of a
+    counted key together (hashed sampling on user_id); the default 1
+    leaves distinct counts of the sample as they are.
+    """
+    scaled = {key: value * factor if isinstance(value, (int, float, np.number, pd.Series, pd.DataFrame, SpaceSaving)) else value
+              for key, value in state.items()}
+    scaled['distinct_scale'] = distinct_factor
+    return scaled
@@ -1,45 +1,94 @@
+import sys
 import pandas as pd
 import numpy as np
 from ..config import get_category_name
+from .derived import PERIODS, select
+from .engine import Aggregation, derive_columns, run_aggregations
+from .dask_engine import is_dask_frame, dask_partial_states
 
-def analyze_behavior(df: pd.DataFrame) -> dict:
+# Columns read by analyze_behavior; loaders project the CSV down to these
+REQUIRED_COLUMNS = ['label', 'user_id', 'avg_price', 'category_1_id', 'times', 'hours', 'weekdays']
+
+# 1. Hourly Trend (hour_extracted), 2. Weekday vs Weekend (is_weekend),
+# 4. Time-Category Preference (time_period), shared registry (see derived.DERIVED)
+DERIVED_COLUMNS = select('hour_extracted', 'label64', 'is_weekend', 'price64', 'time_period')
+
+AGGREGATIONS = [
+    Aggregation('hours', ('hour_extracted',), {'clicks': ('label64', 'sum')}),
+    # Distinct users per hour (exact, or HyperLogLog sketches in the sketch modes)
+    Aggregation('hour_users', ('hour_extracted',), {'users': ('user_id', 'hll')}),
+    Aggregation('weekend', ('is_weekend',), {
+        'label_sum': ('label64', 'sum'),
+        'label_count': ('label64', 'count'),
+        'price_sum': ('price64', 'sum'),
+        'price_count': ('price64', 'count')
+    }),
+    # --- 3. Funnel ---
+    Aggregation('totals', (), {
+        'impressions': (None, 'size'),
+        'clicks': ('label64', 'sum')
+    }),
+    # Category counts per period (rows of all periods, so totals give the overall top categories)
+    Aggregation('period_category', ('time_period', 'category_1_id'), {'rows': (None, 'size')}),
+]
+
+def build_state(results: dict) -> dict:
+    """
+    Build the mergeable behavior state from the engine's aggregation results.
+    """
+    state = {
+        'hour_clicks': results['hours']['clicks'],
+        'impressions': results['totals']['impressions'],
+        'clicks': int(results['totals']['clicks']),
+        'period_category': results['period_category']['rows']
+    }
+    # Without the weekdays column there is no weekday / weekend split
+    if 'weekend' in results:
+        state['weekend'] = results['weekend']
+    # Without the user_id column there are no distinct user counts
+    if 'hour_users' in results:
+        state['hour_users'] = results['hour_users']['users']
+    return state
+
+def partial_behavior(df: pd.DataFrame) -> dict:
+    """
+    Compute the mergeable aggregate state of the behavior analysis for df (or one chunk of it).
+    """
+    return build_state(run_aggregations(derive_columns(df, DERIVED_COLUMNS), AGGREGATIONS))
+
+def finalize_behavior(state: dict) -> dict:
+    """
+    Turn a (merged) behavior state into the behavior JSON structure.
+    """
     results = {}
-    
+
     # --- 1. Hourly Trend ---
-    # Need hour extraction if not present
-    if 'datetime' in df.columns:
-        df['hour_extracted'] = df['datetime'].dt.hour
-    elif 'hours' in df.columns:
-        df['hour_extracted'] = df['hours']
-    else:
-        df['hour_extracted'] = 0
-        
-    hour_grp = df.groupby('hour_extracted')
-    h_clicks = hour_grp['label'].sum()
+    h_clicks = state['hour_clicks']
     # Approx orders using CVR proxy: click * avg_cvr
     # Or just use sum of clicks * 0.285 (global cvr) for shape
-    h_orders = (h_clicks * 0.285).astype(int) 
-    
+    h_orders = (h_clicks * 0.285).astype(int)
+
     results['hourly_trend'] = {
         "hours": [f"{i}:00" for i in range(24)],
         "clicks": [int(h_clicks.get(i, 0)) for i in range(24)],
         "orders": [int(h_orders.get(i, 0)) for i in range(24)]
     }
-    
+    if 'hour_users' in state:
+        # Samples on user_id scale the distinct counts up (see aggregate.scale_state)
+        h_users = state['hour_users'].counts() * state.get('distinct_scale', 1)
+        results['hourly_trend']["users"] = [int(round(h_users.get(i, 0))) for i in range(24)]
+
     # --- 2. Weekday vs Weekend ---
-    if 'weekdays' in df.columns:
-        # 0=Monday, ... 5=Sat, 6=Sun
-        df['is_weekend'] = df['weekdays'].isin([5, 6])
-        
-        wk_grp = df.groupby('is_weekend')
-        
+    if 'weekend' in state:
+        weekend = state['weekend']
+
         # Metrics: Clicks (K), Orders (K), Avg Price, CTR
-        w_clicks = wk_grp['label'].sum() / 1000
-        w_ctr = wk_grp['label'].mean() * 100
-        w_price = wk_grp['avg_price'].mean()
+        w_clicks = weekend['label_sum'] / 1000
+        w_ctr = weekend['label_sum'] / weekend['label_count'] * 100
+        w_price = weekend['price_sum'] / weekend['price_count']
         # Proxy orders
-        w_orders = (wk_grp['label'].sum() * 0.285) / 1000
-        
+        w_orders = (weekend['label_sum'] * 0.285) / 1000
+
         results['weekday_comparison'] = {
             "metrics": ["点击数(千)", "订单数(千)", "平均客单价(元)", "CTR(%)"],
             "weekday": [
@@ -55,58 +104,54 @@ def analyze_behavior(df: pd.DataFrame) -> dict:
                 round(w_ctr.get(True, 0), 1)
             ]
         }
-    
+
     # --- 3. Funnel ---
-    impressions = len(df)
-    clicks = int(df['label'].sum())
+    impressions = int(state['impressions'])
+    clicks = int(state['clicks'])
     # Estimate orders: impressions * global_ctr * global_cvr
-    # Real data: we don't have order label per row. 
+    # Real data: we don't have order label per row.
     # Use global stats: 128M imp, 4.56M clicks (3.56%), ~1.3M orders (28.5% CVR)
     # Scale to current sample size
     orders = int(clicks * 0.285)
     add_to_cart = int(clicks * 0.4) # Mock ratio
-    
+
     results['conversion_funnel'] = [
         {"name": "曝光", "value": impressions},
         {"name": "点击", "value": clicks},
         {"name": "加购", "value": add_to_cart},
         {"name": "下单", "value": orders}
     ]
-    
+
     # --- 4. Time-Category Preference ---
-    # Time periods
-    def get_time_period(h):
-        if 6 <= h <= 9: return "早餐(6-9)"
-        if 11 <= h <= 13: return "午餐(11-13)"
-        if 14 <= h <= 16: return "下午茶(14-16)"
-        if 17 <= h <= 20: return "晚餐(17-20)"
-        if 21 <= h <= 23 or 0 <= h <= 5: return "夜宵(21-24)"
-        return "其他"
-        
-    df['time_period'] = df['hour_extracted'].apply(get_time_period)
-    periods = ["早餐(6-9)", "午餐(11-13)", "下午茶(14-16)", "晚餐(17-20)", "夜宵(21-24)"]
-    
+    period_category = state['period_category']
+
     # Top 5 categories
-    top_cats = df['category_1_id'].value_counts().head(5).index.tolist()
+    top_cats = period_category.groupby(level=1).sum().sort_values(ascending=False).head(5).index.tolist()
     cat_names = [get_category_name(c) for c in top_cats]
-    
+
     matrix_data = []
-    for p in periods:
-        period_data = df[df['time_period'] == p]
-        if len(period_data) == 0:
+    for p in PERIODS:
+        if p not in period_category.index.get_level_values(0):
             matrix_data.append([0]*5)
             continue
-            
-        cat_counts = period_data['category_1_id'].value_counts(normalize=True) * 100
+
+        cat_counts = period_category.loc[p]
+        cat_counts = cat_counts / cat_counts.sum() * 100
         row = []
         for c in top_cats:
             row.append(round(cat_counts.get(c, 0), 1))
         matrix_data.append(row)
-        
+
     results['time_category_preference'] = {
-        "times": periods,
+        "times": PERIODS,
         "categories": cat_names,
         "data": matrix_data
     }
-    
+
     return {"behavior": results}
+
+def analyze_behavior(df: pd.DataFrame) -> dict:
+    if is_dask_frame(df):
+        # Lazy graph over the partitions, evaluated in a single dask.compute
+        return finalize_behavior(dask_partial_states(df, [sys.modules[__name__]])['behavior'])
+    return finalize_behavior(partial_behavior(df))
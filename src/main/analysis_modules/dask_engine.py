@@ -0,0 +1,103 @@
+import dask
+import dask.dataframe as dd
+from dask import delayed
+
+from ..config import get_rfm_scoring
+from .aggregate import merge_states
+from .engine import count_candidates, partial_states, topk_candidates, verify_topk
+from .rfm import SCORE_COLUMNS, make_rfm_scorer, partial_rfm_stats
+
+
+def is_dask_frame(df) -> bool:
+    """Whether df is a (lazy) Dask DataFrame rather than a pandas one."""
+    return isinstance(df, dd.DataFrame)
+
+
+def rfm_stats(parts: list):
+    """
+    Statistics compute for the global RFM terciles (see rfm.partial_rfm_stats).
+
+    Only the per-partition t-digests (or, for exact scoring, value counts)
+    of the two RFM columns come back.
+
+    Returns:
+        (global RFM statistics, per partition statistics of the partitions before it
+         for exact scoring, else None)
+    """
+    # Resolved on the client: workers do not see its command line
+    scoring = get_rfm_scoring(sketches=True)
+    part_stats = dask.compute(*[delayed(partial_rfm_stats)(part, scoring) for part in parts])
+    stats = None
+    offsets = []
+    for part_stat in part_stats:
+        offsets.append(stats if scoring == 'exact' else None)
+        stats = merge_states(stats, part_stat)
+    return stats, offsets
+
+
+def partition_states(part, modules: list, stats: dict = None, offsets: dict = None, sketches: bool = True) -> dict:
+    """
+    Fused partial states of one partition, with globally consistent RFM scores.
+
+    Dask partitions use fixed-size sketches; parallel.slice_states passes
+    sketches=False for exact, mergeable distinct counts and quantiles.
+    """
+    if stats is not None:
+        f_score, m_score = make_rfm_scorer(stats, offsets).score(part)
+        part = part.assign(**dict(zip(SCORE_COLUMNS, (f_score, m_score))))
+    return partial_states(part, modules, sketches)
+
+
+def merge_module_states(left: dict, right: dict) -> dict:
+    """Merge two {module name: state} dicts."""
+    return {name: merge_states(left[name], right[name]) for name in left}
+
+
+def tree_merge(values: list, merge):
+    """Merge delayed values pairwise in a tree of delayed merge calls."""
+    while len(values) > 1:
+        values = [delayed(merge)(*values[i:i + 2]) if i + 1 < len(values) else values[i]
+                  for i in range(0, len(values), 2)]
+    return values[0]
+
+
+def dask_partial_states(ddf, modules: list) -> dict:
+    """
+    Fused partial states of the analysis modules over a Dask DataFrame.
+
+    Every partition is reduced to the modules' partial states on the
+    workers and the states are merged pairwise in a tree in one
+    dask.compute; only the small merged states come back to the client.
+    This is up to three passes over the input, not one: modules that
+    score RFM terciles need a statistics compute first (t-digests or
+    value counts of the two RFM columns), so scores agree with the pandas
+    ones (exactly for exact scoring, up to the sketch error otherwise),
+    and Top-K summaries that dropped keys are made exact by a last compute
+    counting only their candidate keys. Persist ddf first to read the
+    input once.
+
+    Args:
+        ddf: Preprocessed Dask DataFrame (see preprocess_eleme_data)
+        modules: Analysis modules
+
+    Returns:
+        {module name: merged partial state}
+    """
+    parts = ddf.to_delayed()
+    if any(SCORE_COLUMNS in module.DERIVED_COLUMNS for module in modules):
+        stats, offsets = rfm_stats(parts)
+        # One graph key for the statistics instead of a copy per task
+        stats = delayed(stats, pure=True)
+    else:
+        stats, offsets = None, [None] * len(parts)
+
+    states = [delayed(partition_states)(part, modules, stats, offset) for part, offset in zip(parts, offsets)]
+    (merged,) = dask.compute(tree_merge(states, merge_module_states))
+
+    candidates = topk_candidates(merged)
+    if candidates:
+        keys = delayed(candidates, pure=True)
+        counts = [delayed(count_candidates)(part, keys, modules) for part in parts]
+        (counts,) = dask.compute(tree_merge(counts, merge_states))
+        merged = verify_topk(merged, candidates, counts)
+    return merged
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from ..config import get_segment_rules
+
+# Price / rank binning
+PRICE_BINS = [0, 20, 40, 60, 80, float('inf')]
+PRICE_LABELS = ["<20元", "20-40元", "40-60元", "60-80元", ">80元"]
+RANK_BINS = [0, 5, 10, 20, 50, 100, float('inf')]
+RANK_LABELS = ["TOP 1-5", "TOP 6-10", "TOP 11-20", "TOP 21-50", "TOP 51-100", "100+"]
+
+PERIODS = ["早餐(6-9)", "午餐(11-13)", "下午茶(14-16)", "晚餐(17-20)", "夜宵(21-24)"]
+
+# Time periods
+def get_time_period(h):
+    if 6 <= h <= 9: return "早餐(6-9)"
+    if 11 <= h <= 13: return "午餐(11-13)"
+    if 14 <= h <= 16: return "下午茶(14-16)"
+    if 17 <= h <= 20: return "晚餐(17-20)"
+    if 21 <= h <= 23 or 0 <= h <= 5: return "夜宵(21-24)"
+    return "其他"
+
+# get_time_period of the hours 0-23, then of any other value
+PERIOD_BY_HOUR = np.array([get_time_period(h) for h in range(24)] + ["其他"], dtype=object)
+
+def time_period(df: pd.DataFrame) -> pd.Series:
+    """Period of hour_extracted, a table lookup instead of get_time_period per row."""
+    hours = df['hour_extracted'].to_numpy(dtype='float64', na_value=np.nan)
+    index = np.where((hours >= 0) & (hours < 24), hours, 24).astype('int64')
+    return pd.Series(PERIOD_BY_HOUR[index], index=df.index)
+
+def extract_hour(df: pd.DataFrame) -> pd.Series:
+    # Need hour extraction if not present
+    if 'datetime' in df.columns:
+        return df['datetime'].dt.hour
+    if 'hours' in df.columns:
+        return df['hours']
+    return pd.Series(0, index=df.index)
+
+# Derived columns shared by the analysis modules, which pick theirs with select().
+# Modules naming the same column get the same function, so the fused engine
+# computes it once per frame (see engine.derive_columns).
+DERIVED = {
+    # int64 accumulator: summing the int8 label keeps int8 for some groupings
+    'label64': lambda df: df['label'].astype('int64'),
+    # float64 accumulator for the float32 price column
+    'price64': lambda df: df['avg_price'].astype('float64'),
+    # Conversion (User level avg): ord_30 / ctr_30, 0 for users without clicks
+    # Note: Using user's conversion ability as proxy for product conversion
+    # Ideally should use is_ordered label but we don't have it.
+    'cvr': lambda df: (df['ord_30'].astype('float64') / df['ctr_30'].astype('float64')).where(df['ctr_30'] > 0, 0),
+    'hour_extracted': extract_hour,
+    # 0=Monday, ... 5=Sat, 6=Sun
+    'is_weekend': lambda df: df['weekdays'].isin([5, 6]) if 'weekdays' in df.columns else None,
+    # Requires hour_extracted
+    'time_period': time_period,
+    'price_bin': lambda df: pd.cut(df['avg_price'], bins=PRICE_BINS, labels=PRICE_LABELS),
+    'rank_bin': lambda df: pd.cut(df['rank_7'], bins=RANK_BINS, labels=RANK_LABELS),
+}
+
+def select(*names) -> dict:
+    """Entries of DERIVED for a module's DERIVED_COLUMNS, in DERIVED order (dependencies first)."""
+    return {name: derive for name, derive in DERIVED.items() if name in names}
+
+def get_key_categories() -> dict:
+    """Categories of the categorical group keys (derived columns and user.assign_segments), in category order."""
+    return {
+        'price_bin': PRICE_LABELS,
+        'rank_bin': RANK_LABELS,
+        'segment': [segment['name'] for segment in get_segment_rules()['segments']]
+    }
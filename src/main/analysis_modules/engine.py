@@ -0,0 +1,344 @@
+from typing import NamedTuple
+
+import pandas as pd
+
+from ..config import use_sketches
+from .aggregate import hash_values
+from .derived import get_key_categories
+from .sketches import (HyperLogLog, GroupedHyperLogLog, DistinctCount, GroupedDistinctCount, TDigest, GroupedTDigest,
+                       ExactQuantiles, GroupedExactQuantiles, SpaceSaving)
+
+# Sketch aggregation funcs: (whole-frame sketch, grouped sketch) classes
+SKETCHES = {
+    'hll': (HyperLogLog, GroupedHyperLogLog),
+    'tdigest': (TDigest, GroupedTDigest),
+}
+# Exact counterparts with the same interface, used unless config.use_sketches()
+EXACT = {
+    'hll': (DistinctCount, GroupedDistinctCount),
+    'tdigest': (ExactQuantiles, GroupedExactQuantiles),
+}
+
+
+def sketch_classes(sketches: bool = None) -> dict:
+    """SKETCHES, or their EXACT counterparts; sketches defaults to config.use_sketches()."""
+    return SKETCHES if (use_sketches() if sketches is None else sketches) else EXACT
+
+
+class Aggregation(NamedTuple):
+    """
+    One aggregation an analysis module needs.
+
+    Attributes:
+        name: Key of the result handed back to the module
+        by: Group key columns, () aggregates the whole frame
+        aggs: {output: (column, func)} with func in 'sum', 'count', 'size'
+              (column ignored), a sketch of SKETCHES ('hll' distinct count,
+              'tdigest' quantiles; grouped sketches must be the only output
+              of their aggregation; exact outside the sketch modes, see
+              sketch_classes) and, for by=() only, 'distinct' (exact
+              hash_values)
+        top: (output, k) to keep only the heaviest groups by that output
+             in a SpaceSaving summary (bounded memory for item / shop ids),
+             of which the module reports the k first
+    """
+    name: str
+    by: tuple
+    aggs: dict
+    top: tuple = None
+
+
+def aggregate_frame(frame: pd.DataFrame, column: str, func: str, classes: dict = SKETCHES):
+    """Whole-frame aggregate of one column."""
+    if func == 'size':
+        return len(frame)
+    if func == 'distinct':
+        return hash_values(frame[column])
+    if func in classes:
+        return classes[func][0].from_values(frame[column])
+    return getattr(frame[column], func)()
+
+
+def run_aggregations(frame: pd.DataFrame, aggregations: list, sketches: bool = None) -> dict:
+    """
+    Evaluate aggregations with one groupby per distinct key set.
+
+    Aggregations sharing their group keys are answered by the same
+    groupby, and each (column, func) pair is computed once. Aggregations
+    that reference columns missing from the frame are skipped. Sketch
+    funcs are exact unless sketches (default config.use_sketches()).
+
+    Returns:
+        {name: DataFrame with the aggs outputs as columns, indexed by the group keys}
+        ({name: {output: value}} for whole-frame and grouped sketch aggregations,
+        {name: SpaceSaving} for top-K aggregations)
+    """
+    by_keys = {}
+    for agg in aggregations:
+        columns = list(agg.by) + [col for col, func in agg.aggs.values() if func != 'size']
+        if all(col in frame.columns for col in columns):
+            by_keys.setdefault(tuple(agg.by), []).append(agg)
+
+    classes = sketch_classes(sketches)
+    results = {}
+    for by, group in by_keys.items():
+        if not by:
+            pairs = list(dict.fromkeys((col, func) for agg in group for col, func in agg.aggs.values()))
+            table = {pair: aggregate_frame(frame, *pair, classes) for pair in pairs}
+            for agg in group:
+                results[agg.name] = {out: table[pair] for out, pair in agg.aggs.items()}
+            continue
+
+        for agg in [agg for agg in group if any(func in SKETCHES for _, func in agg.aggs.values())]:
+            (out, (col, func)), = agg.aggs.items()
+            results[agg.name] = {out: classes[func][1].from_frame(frame, list(by), col)}
+            group.remove(agg)
+        if not group:
+            continue
+
+        pairs = list(dict.fromkeys((col, func) for agg in group for col, func in agg.aggs.values()))
+
+        # observed=False keeps the empty bins of categorical keys (price / rank bins)
+        grouped = frame.groupby(list(by), observed=False)
+        named = {f"{col}:{func}": (col, func) for col, func in pairs if func != 'size'}
+        table = grouped.agg(**named) if named else grouped.size().to_frame(':size')
+        if named and any(func == 'size' for _, func in pairs):
+            table[':size'] = grouped.size()
+        for agg in group:
+            results[agg.name] = pd.DataFrame({
+                out: table[":size" if func == 'size' else f"{col}:{func}"] for out, (col, func) in agg.aggs.items()
+            })
+            if agg.top:
+                results[agg.name] = SpaceSaving.from_table(results[agg.name], agg.by, agg.aggs, *agg.top)
+    return results
+
+
+def module_name(module) -> str:
+    """Short name of an analysis module ('metrics', 'user', ...)."""
+    return module.__name__.rsplit('.', 1)[-1]
+
+
+def derive_columns(df: pd.DataFrame, *registries) -> pd.DataFrame:
+    """
+    Add the derived columns of the registries (modules' DERIVED_COLUMNS) to a new frame, the input is not modified.
+
+    Each entry maps a column name (or a tuple of names, for functions
+    returning several Series) to a function of the frame built so far, so
+    derivations can use earlier ones. Columns already present, from the
+    input or from another module, are not derived again; modules that
+    share a name must define it identically. A function returns None when
+    its inputs are missing, the column is then left out (and aggregations
+    using it are skipped, see run_aggregations).
+    """
+    frame = df
+    for registry in registries:
+        for names, derive in registry.items():
+            names = names if isinstance(names, tuple) else (names,)
+            if all(name in frame.columns for name in names):
+                continue
+            values = derive(frame)
+            if values is None:
+                continue
+            values = values if isinstance(values, tuple) else (values,)
+            frame = frame.assign(**dict(zip(names, values)))
+    return frame
+
+
+def module_aggregations(modules: list) -> list:
+    """AGGREGATIONS of several modules, named (module name, aggregation name)."""
+    return [agg._replace(name=(module_name(module), agg.name)) for module in modules for agg in module.AGGREGATIONS]
+
+
+def build_states(modules: list, results: dict) -> dict:
+    """Each module's state from the results of module_aggregations(modules)."""
+    states = {}
+    for module in modules:
+        name = module_name(module)
+        states[name] = module.build_state({key: value for (owner, key), value in results.items() if owner == name})
+    return states
+
+
+def partial_states(df: pd.DataFrame, modules: list, sketches: bool = None) -> dict:
+    """
+    Fused partial states of several analysis modules over one frame.
+
+    Each module declares DERIVED_COLUMNS, its AGGREGATIONS and
+    build_state(results). Derived columns are computed once, then all
+    modules' aggregations run together, one groupby per distinct key set,
+    and each module builds its state from its own results.
+
+    Args:
+        sketches: Sketch or exact distinct counts (see run_aggregations)
+
+    Returns:
+        {module name: partial state}
+    """
+    frame = derive_columns(df, *[module.DERIVED_COLUMNS for module in modules])
+    return build_states(modules, run_aggregations(frame, module_aggregations(modules), sketches))
+
+
+def plan_queries(aggregations: list, columns: list) -> dict:
+    """
+    Queries answering aggregations on a query engine (see polars_engine, duckdb_engine).
+
+    Sketches are built from reduced inputs that give the same sketches:
+    HyperLogLogs and distinct hashes from the distinct (by, column) rows
+    (registers only keep maxima), t-digests from the value counts of the
+    column per group. The other outputs of an aggregation come from one
+    grouped (or whole-frame) query. Group keys are never null, like
+    pandas groupby keys; aggregations referencing columns missing from
+    columns are skipped.
+
+    Returns:
+        {(name, output): ('distinct' or 'counts', by, column)} for sketches and
+        {(name, None): ('aggregate', by, [(column, func)])} for the other outputs
+    """
+    queries = {}
+    for agg in aggregations:
+        if not all(col in columns for col in list(agg.by) + [col for col, func in agg.aggs.values() if func != 'size']):
+            continue
+        for out, (col, func) in agg.aggs.items():
+            if func in ('hll', 'distinct'):
+                queries[(agg.name, out)] = ('distinct', tuple(agg.by), col)
+            elif func == 'tdigest':
+                queries[(agg.name, out)] = ('counts', tuple(agg.by), col)
+        pairs = list(dict.fromkeys((col, func) for col, func in agg.aggs.values()
+                                   if func not in ('hll', 'distinct', 'tdigest')))
+        if pairs:
+            queries[(agg.name, None)] = ('aggregate', tuple(agg.by), pairs)
+    return queries
+
+
+def group_table(frame: pd.DataFrame, by: tuple) -> pd.DataFrame:
+    """A query engine's group table as a pandas groupby result: indexed and sorted by the keys, every category present."""
+    table = frame.set_index(list(by)).sort_index()
+    categories = get_key_categories()
+    if any(key in categories for key in by):
+        # observed=False: every category of a categorical key, in category order
+        levels = [categories.get(key, table.index.get_level_values(key).unique().sort_values()) for key in by]
+        index = pd.Index(levels[0], name=by[0]) if len(by) == 1 else pd.MultiIndex.from_product(levels, names=by)
+        table = table.reindex(index, fill_value=0)
+    return table
+
+
+def collect_results(aggregations: list, frames: dict) -> dict:
+    """
+    run_aggregations results from the answers of plan_queries.
+
+    Top-K summaries are built from the exact group tables and verified
+    right away, no second pass is needed.
+
+    Args:
+        aggregations: Aggregations passed to plan_queries
+        frames: {query key: pandas DataFrame}, with the by columns and the column
+                ('distinct'), plus a 'len' column ('counts'), or f"{column}:{func}"
+                columns ('aggregate', count and size as int64)
+
+    Returns:
+        The same {name: result} as run_aggregations
+    """
+    classes = sketch_classes()
+    results = {}
+    for agg in aggregations:
+        by = list(agg.by)
+        sketches = {}
+        for out, (col, func) in agg.aggs.items():
+            if (agg.name, out) not in frames:
+                continue
+            frame = frames[(agg.name, out)]
+            if func == 'distinct':
+                sketches[out] = hash_values(frame[col])
+            elif func == 'hll':
+                sketches[out] = classes[func][1].from_frame(frame, by, col) if by else classes[func][0].from_values(frame[col])
+            else:
+                frame = frame.sort_values(col)
+                sketches[out] = classes[func][1].from_counts(frame, by, col, 'len') if by \
+                    else classes[func][0].from_counts(frame[col], frame['len'])
+        if (agg.name, None) not in frames:
+            if sketches:
+                results[agg.name] = sketches
+            continue
+
+        frame = frames[(agg.name, None)]
+        if not by:
+            row = frame.iloc[0]
+            results[agg.name] = {**{out: row[f"{col}:{func}"] for out, (col, func) in agg.aggs.items()
+                                    if out not in sketches}, **sketches}
+            continue
+
+        table = group_table(frame, agg.by)
+        results[agg.name] = pd.DataFrame({out: table[f"{col}:{func}"] for out, (col, func) in agg.aggs.items()})
+        if agg.top:
+            summary = SpaceSaving.from_table(results[agg.name], agg.by, agg.aggs, *agg.top)
+            if not summary.exact:
+                summary = summary.with_counts(results[agg.name], summary.candidates())
+            results[agg.name] = summary
+    return results
+
+
+def topk_candidates(states: dict) -> dict:
+    """
+    Candidate keys of the top-K summaries that are not exact yet.
+
+    Args:
+        states: {module name: (merged) partial state}
+
+    Returns:
+        {(module name, state key): (group key columns, aggs, candidate keys)}
+    """
+    return {(name, key): (value.by, value.aggs, value.candidates())
+            for name, state in states.items() for key, value in state.items()
+            if isinstance(value, SpaceSaving) and not value.exact}
+
+
+def count_candidates(df: pd.DataFrame, candidates: dict, modules: list) -> dict:
+    """
+    Exact second pass over df (or one chunk of it): the aggregations of the
+    top-K summaries, restricted to the rows of their candidate keys. Only
+    the derived columns these aggregations use are computed.
+
+    Returns:
+        {(module name, state key): DataFrame indexed by the candidate keys found in df}
+    """
+    registries = [module.DERIVED_COLUMNS for module in modules]
+    counts = {}
+    for target, (by, aggs, keys) in candidates.items():
+        if len(by) == 1:
+            rows = df[by[0]].isin(keys)
+        else:
+            rows = pd.MultiIndex.from_frame(df[list(by)]).isin(keys)
+        needed = {col for col, func in aggs.values() if col is not None and col not in df.columns}
+        registry = {names: derive for registry in registries for names, derive in registry.items()
+                    if needed & set(names if isinstance(names, tuple) else (names,))}
+        frame = derive_columns(df[rows], registry)
+        counts[target] = run_aggregations(frame, [Aggregation('counts', by, aggs)])['counts']
+    return counts
+
+
+def verify_topk(states: dict, candidates: dict, counts: dict) -> dict:
+    """
+    Replace the top-K summaries by their candidates' exact counts.
+
+    Args:
+        states: {module name: merged partial state}
+        candidates: topk_candidates(states)
+        counts: count_candidates over the whole data, merged (aggregate.merge_states)
+
+    Returns:
+        States with exact top-K summaries
+    """
+    verified = {name: dict(state) for name, state in states.items()}
+    for (name, key), (_, _, keys) in candidates.items():
+        summary = verified[name][key].with_counts(counts[(name, key)], keys)
+        if not summary.complete:
+            print(f"⚠️ Top-K {name}.{key} 可能不完整 (floor={summary.floor:g})，可增大 --topk-capacity")
+        verified[name][key] = summary
+    return verified
+
+
+def verify_states(df: pd.DataFrame, states: dict, modules: list) -> dict:
+    """Exact top-K of in-memory data: verify the states of modules over df, the data they were computed on."""
+    candidates = topk_candidates(states)
+    if not candidates:
+        return states
+    return verify_topk(states, candidates, count_candidates(df, candidates, modules))
@@ -1,45 +1,96 @@
+import sys
 import pandas as pd
+from .derived import select
+from .engine import Aggregation, derive_columns, run_aggregations
+from .dask_engine import is_dask_frame, dask_partial_states
 
-def calculate_metrics(df: pd.DataFrame) -> dict:
+# Columns read by calculate_metrics; loaders project the CSV down to these
+REQUIRED_COLUMNS = ['label', 'user_id', 'avg_price', 'ctr_30', 'ord_30']
+
+# CVR: Total Orders / Total Clicks (Approximation using ord_30 is tricky because ord_30 is user-level history,
+# but the requirement says "global_cvr: 28.5%".
+# For this specific dataset, label=1 means click. We don't have an explicit "order" label for this specific interaction.
+# However, the requirement doc says "Global CVR = 订单数 / 点击数".
+# Since we lack a direct 'is_ordered' label for the interaction, we might use a proxy or placeholder logic based on doc.
+# Requirement data spec says: "global_cvr = (ord_30 / ctr_30) 的平均值" (Average of user historical CVR).
+# Let's stick to the spec logic:
+DERIVED_COLUMNS = {
+    **select('label64', 'price64'),
+    # User level CVR, only for users with > 0 clicks to avoid inf
+    'user_cvr': lambda df: (df['ord_30'].astype('float64') / df['ctr_30']).where(df['ctr_30'] > 0),
+}
+
+AGGREGATIONS = [
+    Aggregation('totals', (), {
+        'impressions': (None, 'size'),
+        'clicks': ('label64', 'sum'),
+        'cvr_sum': ('user_cvr', 'sum'),
+        'cvr_count': ('user_cvr', 'count'),
+        'price_sum': ('price64', 'sum'),
+        'price_count': ('price64', 'count')
+    }),
+    # Exact distinct count in memory, HyperLogLog sketch (fixed 16 KB state) in the sketch modes
+    Aggregation('users', (), {'users': ('user_id', 'hll')})
+]
+
+def build_state(results: dict) -> dict:
     """
-    Calculate core KPI metrics.
+    Build the mergeable metrics state from the engine's aggregation results.
+    """
+    totals = results['totals']
+    state = {
+        'impressions': totals['impressions'],
+        'clicks': int(totals['clicks']),
+        'cvr_sum': float(totals['cvr_sum']),
+        'cvr_count': int(totals['cvr_count']),
+        'price_sum': float(totals['price_sum']),
+        'price_count': int(totals['price_count'])
+    }
+    # Without the user_id column (or from a cube slice, see cube.run_cube) there is no distinct user count
+    if 'users' in results:
+        state['users'] = results['users']['users']
+    return state
+
+def partial_metrics(df: pd.DataFrame) -> dict:
+    """
+    Compute the mergeable aggregate state of the core KPIs for df (or one chunk of it).
+    """
+    return build_state(run_aggregations(derive_columns(df, DERIVED_COLUMNS), AGGREGATIONS))
+
+def finalize_metrics(state: dict) -> dict:
+    """
+    Turn a (merged) metrics state into the metrics JSON structure.
     """
-    total_impressions = len(df)
-    total_clicks = int(df['label'].sum())
-    
+    total_impressions = int(state['impressions'])
+    total_clicks = int(state['clicks'])
+
     # Avoid division by zero
     global_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-    
-    # CVR: Total Orders / Total Clicks (Approximation using ord_30 is tricky because ord_30 is user-level history, 
-    # but the requirement says "global_cvr: 28.5%". 
-    # For this specific dataset, label=1 means click. We don't have an explicit "order" label for this specific interaction.
-    # However, the requirement doc says "Global CVR = 订单数 / 点击数".
-    # Since we lack a direct 'is_ordered' label for the interaction, we might use a proxy or placeholder logic based on doc.
-    # Requirement data spec says: "global_cvr = (ord_30 / ctr_30) 的平均值" (Average of user historical CVR).
-    # Let's stick to the spec logic:
-    
-    # Filter users with > 0 clicks to avoid inf
-    valid_users = df[df['ctr_30'] > 0]
-    if len(valid_users) > 0:
-        # User level CVR
-        user_cvr = valid_users['ord_30'] / valid_users['ctr_30']
-        global_cvr = user_cvr.mean() * 100
-    else:
-        global_cvr = 0
-        
-    avg_price = df['avg_price'].mean()
-    active_users = df['user_id'].nunique()
-    
-    return {
-        "metrics": {
-            "total_impressions": total_impressions,
-            "total_impressions_unit": "M" if total_impressions > 1000000 else "",
-            "total_clicks": round(total_clicks / 1000000, 2) if total_clicks > 1000000 else total_clicks,
-            "total_clicks_unit": "M" if total_clicks > 1000000 else "",
-            "global_ctr": round(global_ctr, 2),
-            "global_cvr": round(global_cvr, 2),
-            "avg_price": round(avg_price, 2),
-            "active_users": round(active_users / 1000000, 2) if active_users > 1000000 else active_users,
-            "active_users_unit": "M" if active_users > 1000000 else ""
-        }
+    global_cvr = (state['cvr_sum'] / state['cvr_count'] * 100) if state['cvr_count'] > 0 else 0
+    avg_price = state['price_sum'] / state['price_count'] if state['price_count'] > 0 else float('nan')
+
+    metrics = {
+        "total_impressions": total_impressions,
+        "total_impressions_unit": "M" if total_impressions > 1000000 else "",
+        "total_clicks": round(total_clicks / 1000000, 2) if total_clicks > 1000000 else total_clicks,
+        "total_clicks_unit": "M" if total_clicks > 1000000 else "",
+        "global_ctr": round(global_ctr, 2),
+        "global_cvr": round(global_cvr, 2),
+        "avg_price": round(avg_price, 2)
     }
+    if 'users' in state:
+        # Samples on user_id scale the distinct count up (see aggregate.scale_state)
+        active_users = int(round(state['users'].count() * state.get('distinct_scale', 1)))
+        metrics["active_users"] = round(active_users / 1000000, 2) if active_users > 1000000 else active_users
+        metrics["active_users_unit"] = "M" if active_users > 1000000 else ""
+
+    return {"metrics": metrics}
+
+def calculate_metrics(df: pd.DataFrame) -> dict:
+    """
+    Calculate core KPI metrics.
+    """
+    if is_dask_frame(df):
+        # Lazy graph over the partitions, evaluated in a single dask.compute
+        return finalize_metrics(dask_partial_states(df, [sys.modules[__name__]])['metrics'])
+    return finalize_metrics(partial_metrics(df))
@@ -1,78 +1,153 @@
+import sys
+import functools
 import pandas as pd
 import numpy as np
 from ..config import get_category_name
+from ..id_encoding import decode_ids
+from .derived import PRICE_LABELS, RANK_LABELS, select
+from .engine import Aggregation, derive_columns, run_aggregations, verify_states
+from .dask_engine import is_dask_frame, dask_partial_states
 
-def analyze_product(df: pd.DataFrame) -> dict:
-    results = {}
-    
-    # --- 1. Top Products ---
-    # Aggregate clicks and impressions (count of rows) per item
-    prod_stats = df.groupby('item_id').agg({
-        'label': 'sum',
-        'user_id': 'count'
-    }).rename(columns={'label': 'clicks', 'user_id': 'impressions'})
-    
-    prod_stats['ctr'] = (prod_stats['clicks'] / prod_stats['impressions'] * 100).round(2)
-    top_30 = prod_stats.sort_values('clicks', ascending=False).head(30)
-    
-    results['top_products'] = {
-        "items": [f"Item_{i[:6]}" for i in top_30.index], # Truncate hash for display
-        "clicks": top_30['clicks'].tolist(),
-        "ctr": top_30['ctr'].tolist()
+# Columns read by analyze_product; loaders project the CSV down to these
+REQUIRED_COLUMNS = ['label', 'user_id', 'avg_price', 'ctr_30', 'ord_30', 'shop_id', 'item_id', 'brand_id',
+                    'category_1_id', 'rank_7']
+
+# Leaderboard sizes (top-K summaries, exact after the verification pass)
+TOP_ITEMS = 30
+TOP_SHOPS = 10
+TOP_BRANDS = 10
+# Per-category price percentiles (t-digest estimates)
+PRICE_PERCENTILES = [25, 50, 75, 90]
+
+# 3. Price Analysis: price bins and conversion rate (avg of ord_30/ctr_30 per bin),
+# 4. Rank Effect: rank_7 bins, shared registry (see derived.DERIVED)
+DERIVED_COLUMNS = select('label64', 'price_bin', 'cvr', 'rank_bin')
+
+AGGREGATIONS = [
+    # --- 1. Top Products / Shops / Brands ---
+    # Clicks and impressions (count of rows) of the most clicked ids only
+    Aggregation('items', ('item_id',), {
+        'clicks': ('label64', 'sum'),
+        'impressions': ('user_id', 'count')
+    }, top=('clicks', TOP_ITEMS)),
+    Aggregation('shops', ('shop_id',), {
+        'clicks': ('label64', 'sum'),
+        'impressions': ('user_id', 'count')
+    }, top=('clicks', TOP_SHOPS)),
+    Aggregation('brands', ('brand_id',), {
+        'clicks': ('label64', 'sum'),
+        'impressions': ('user_id', 'count')
+    }, top=('clicks', TOP_BRANDS)),
+    # --- 2. Category Distribution ---
+    Aggregation('categories', ('category_1_id',), {'clicks': ('label64', 'sum')}),
+    Aggregation('category_prices', ('category_1_id',), {'prices': ('avg_price', 'tdigest')}),
+    # Click rate: sum(label) / count
+    Aggregation('price', ('price_bin',), {
+        'label_sum': ('label64', 'sum'),
+        'label_count': ('label64', 'count'),
+        'cvr_sum': ('cvr', 'sum'),
+        'cvr_count': ('cvr', 'count')
+    }),
+    Aggregation('rank', ('rank_bin',), {
+        'label_sum': ('label64', 'sum'),
+        'label_count': ('label64', 'count'),
+        'impressions': ('user_id', 'count')
+    }),
+]
+
+def build_state(results: dict) -> dict:
+    """
+    Build the mergeable product state from the engine's aggregation results.
+    """
+    state = {
+        'categories': results['categories']['clicks'],
+        'price': results['price'],
+        'rank': results['rank']
     }
-    
+    # Leaderboards and price percentiles are missing from cube slices (see cube.run_cube)
+    for name in ('items', 'shops', 'brands'):
+        if name in results:
+            state[name] = results[name]
+    if 'category_prices' in results:
+        state['category_prices'] = results['category_prices']['prices']
+    return state
+
+def partial_product(df: pd.DataFrame) -> dict:
+    """
+    Compute the mergeable aggregate state of the product analysis for df (or one chunk of it).
+    """
+    return build_state(run_aggregations(derive_columns(df, DERIVED_COLUMNS), AGGREGATIONS))
+
+def finalize_product(state: dict) -> dict:
+    """
+    Turn a (merged) product state into the product JSON structure.
+    """
+    results = {}
+
+    # --- 1. Top Products / Shops / Brands ---
+    def leaderboard(summary, prefix: str, field: str) -> dict:
+        # Ids decoded first, so ties are ordered by id as for string keys
+        top = summary.map_keys(functools.partial(decode_ids, summary.by[0])).head().astype('int64')
+        ctr = (top['clicks'] / top['impressions'] * 100).round(2)
+        return {
+            field: [f"{prefix}_{i[:6]}" for i in top.index], # Truncate hash for display
+            "clicks": top['clicks'].tolist(),
+            "ctr": ctr.tolist()
+        }
+
+    for key, name, prefix, field in [('top_products', 'items', "Item", "items"), ('top_shops', 'shops', "Shop", "shops"),
+                                     ('top_brands', 'brands', "Brand", "brands")]:
+        if name in state:
+            results[key] = leaderboard(state[name], prefix, field)
+
     # --- 2. Category Distribution ---
-    cat_stats = df.groupby('category_1_id')['label'].sum()
     cat_data = []
     # Sort by clicks
-    cat_stats = cat_stats.sort_values(ascending=False).head(7) # Top 7 + others ideally, but simple top 7 here
+    cat_stats = state['categories'].sort_values(ascending=False).head(7) # Top 7 + others ideally, but simple top 7 here
     for cat_id, clicks in cat_stats.items():
         cat_data.append({
             "name": get_category_name(cat_id),
             "value": int(clicks)
         })
     results['category_distribution'] = cat_data
-    
+
+    # Price percentiles of the same top categories
+    if 'category_prices' in state:
+        quantiles = state['category_prices'].quantiles([p / 100 for p in PRICE_PERCENTILES])
+        results['category_price_percentiles'] = {
+            "categories": [get_category_name(cat_id) for cat_id in cat_stats.index],
+            "percentiles": [f"P{p}" for p in PRICE_PERCENTILES],
+            "data": [[round(float(v), 2) for v in quantiles.loc[cat_id]] if cat_id in quantiles.index
+                     else [None] * len(PRICE_PERCENTILES) for cat_id in cat_stats.index]
+        }
+
     # --- 3. Price Analysis ---
-    # Binning
-    bins = [0, 20, 40, 60, 80, float('inf')]
-    labels = ["<20元", "20-40元", "40-60元", "60-80元", ">80元"]
-    df['price_bin'] = pd.cut(df['avg_price'], bins=bins, labels=labels)
-    
-    price_grp = df.groupby('price_bin', observed=False)
-    
-    # Click rate: sum(label) / count
-    p_clicks = (price_grp['label'].mean() * 100).round(2)
-    
-    # Conversion rate: avg of (ord_30/ctr_30) per bin
-    # Note: Using user's conversion ability as proxy for product conversion in that price range
-    # Ideally should use is_ordered label but we don't have it.
-    temp_df = df.copy()
-    temp_df['cvr'] = temp_df.apply(lambda r: r['ord_30']/r['ctr_30'] if r['ctr_30']>0 else 0, axis=1)
-    # Re-assign price bin to temp_df
-    temp_df['price_bin'] = pd.cut(temp_df['avg_price'], bins=bins, labels=labels)
-    p_cvr = (temp_df.groupby('price_bin', observed=False)['cvr'].mean() * 100).round(2)
-    
+    price = state['price']
+    p_clicks = (price['label_sum'] / price['label_count'] * 100).round(2)
+    p_cvr = (price['cvr_sum'] / price['cvr_count'] * 100).round(2)
+
     results['price_analysis'] = {
-        "ranges": labels,
-        "clicks": [p_clicks.get(l, 0) for l in labels],
-        "conversion": [p_cvr.get(l, 0) for l in labels]
+        "ranges": PRICE_LABELS,
+        "clicks": [p_clicks.get(l, 0) for l in PRICE_LABELS],
+        "conversion": [p_cvr.get(l, 0) for l in PRICE_LABELS]
     }
-    
+
     # --- 4. Rank Effect ---
-    # Rank 7
-    rank_bins = [0, 5, 10, 20, 50, 100, float('inf')]
-    rank_labels = ["TOP 1-5", "TOP 6-10", "TOP 11-20", "TOP 21-50", "TOP 51-100", "100+"]
-    df['rank_bin'] = pd.cut(df['rank_7'], bins=rank_bins, labels=rank_labels)
-    
-    rank_grp = df.groupby('rank_bin', observed=False)
-    r_ctr = (rank_grp['label'].mean() * 100).round(2)
-    r_imp = (rank_grp['user_id'].count() / 1000000).round(2) # In Millions
-    
+    rank = state['rank']
+    r_ctr = (rank['label_sum'] / rank['label_count'] * 100).round(2)
+    r_imp = (rank['impressions'] / 1000000).round(2) # In Millions
+
     results['rank_effect'] = {
-        "positions": rank_labels,
-        "ctr": [r_ctr.get(l, 0) for l in rank_labels],
-        "impressions": [r_imp.get(l, 0) for l in rank_labels]
+        "positions": RANK_LABELS,
+        "ctr": [r_ctr.get(l, 0) for l in RANK_LABELS],
+        "impressions": [r_imp.get(l, 0) for l in RANK_LABELS]
     }
-    
+
     return {"product": results}
+
+def analyze_product(df: pd.DataFrame) -> dict:
+    if is_dask_frame(df):
+        # Lazy graph over the partitions, evaluated in a single dask.compute
+        return finalize_product(dask_partial_states(df, [sys.modules[__name__]])['product'])
+    # Exact second pass over the top-K candidates
+    return finalize_product(verify_states(df, {'product': partial_product(df)}, [sys.modules[__name__]])['product'])
@@ -0,0 +1,535 @@
+import numpy as np
+import pandas as pd
+
+from ..config import get_hll_precision, get_tdigest_compression, get_topk_capacity
+from ..id_encoding import hash_codes, is_encoded
+
+
+def hash_series(series: pd.Series) -> np.ndarray:
+    """Stable 64-bit hashes of the non-null values (same across chunks, workers and runs)."""
+    if is_encoded(series):
+        # Dictionary codes hash like the ids they stand for
+        return hash_codes(series)
+    return pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy()
+
+
+# Salt of the HyperLogLog hashes (see mix_hashes)
+HLL_SALT = np.uint64(0x5BD1E9955BD1E995)
+
+
+def mix_hashes(hashes: np.ndarray) -> np.ndarray:
+    """
+    Salted splitmix64 finalizer of the value hashes, a bijection on 64 bits.
+
+    hash_series hashes also drive hashed sampling (approx.sample_chunk keeps
+    the rows whose hash is below fraction * 2^64), so the ids of such a
+    sample all have small raw hashes and would pile into the first
+    registers. Remixed, every bit depends on every input bit.
+    """
+    with np.errstate(over='ignore'):
+        hashes = hashes ^ HLL_SALT
+        hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return hashes ^ (hashes >> np.uint64(31))
+
+
+def register_updates(hashes: np.ndarray, precision: int):
+    """
+    Register index and rank of each hash (remixed first, see mix_hashes).
+
+    The top `precision` bits select the register. The rank is the position
+    of the first 1 bit in the remaining 64 - precision bits, or 65 - precision
+    if they are all 0.
+    """
+    hashes = mix_hashes(hashes)
+    width = 64 - precision
+    index = (hashes >> np.uint64(width)).astype(np.int64)
+    rest = hashes & np.uint64((1 << width) - 1)
+    # Exact bit length via frexp on the 32-bit halves (float64 holds them exactly)
+    high = (rest >> np.uint64(32)).astype(np.float64)
+    low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    bit_length = np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+    return index, (width - bit_length + 1).astype(np.uint8)
+
+
+def estimate(registers: np.ndarray) -> np.ndarray:
+    """HyperLogLog cardinality estimate over the last axis, with linear counting for small cardinalities."""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch with 2 ** precision one-byte registers.
+
+    The relative standard error is about 1.04 / sqrt(2 ** precision)
+    (0.8% at the default precision 14, 16 KB). Sketches merge with `+`
+    (register-wise max), so merge_states combines them across chunks,
+    workers and runs, and pickle persists them.
+    """
+
+    def __init__(self, precision: int = None, registers: np.ndarray = None):
+        self.precision = precision or get_hll_precision()
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_values(cls, values: pd.Series, precision: int = None) -> "HyperLogLog":
+        """Sketch of the non-null values of a column."""
+        sketch = cls(precision)
+        index, rank = register_updates(hash_series(values), sketch.precision)
+        np.maximum.at(sketch.registers, index, rank)
+        return sketch
+
+    def count(self) -> float:
+        return float(estimate(self.registers))
+
+    def __add__(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+
+class GroupedHyperLogLog:
+    """
+    One HyperLogLog per group key (e.g. distinct users per city), built in a single vectorized update.
+
+    Keys are plain Python values (tuples for several group columns).
+    """
+
+    def __init__(self, precision: int = None, keys: list = None, registers: np.ndarray = None):
+        self.precision = precision or get_hll_precision()
+        self.keys = list(keys or [])
+        self.registers = np.zeros((len(self.keys), 1 << self.precision), dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, by: list, column: str, precision: int = None) -> "GroupedHyperLogLog":
+        """Sketches of the distinct non-null values of column per group of the by columns."""
+        sketch = cls(precision)
+        keys = frame[by[0]] if len(by) == 1 else pd.MultiIndex.from_frame(frame[list(by)])
+        codes, uniques = pd.factorize(keys)
+        valid = (codes >= 0) & frame[column].notna().to_numpy()
+        index, rank = register_updates(hash_series(frame[column][valid]), sketch.precision)
+
+        sketch.keys = list(uniques.tolist() if hasattr(uniques, 'tolist') else uniques)
+        sketch.registers = np.zeros((len(sketch.keys), 1 << sketch.precision), dtype=np.uint8)
+        np.maximum.at(sketch.registers.reshape(-1), codes[valid] * (1 << sketch.precision) + index, rank)
+        return sketch
+
+    def counts(self) -> pd.Series:
+        """Estimated distinct count per key."""
+        return pd.Series(estimate(self.registers), index=pd.Index(self.keys, tupleize_cols=False), dtype='float64')
+
+    def __add__(self, other: "GroupedHyperLogLog") -> "GroupedHyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        known = set(self.keys)
+        keys = self.keys + [key for key in other.keys if key not in known]
+        position = {key: i for i, key in enumerate(keys)}
+        registers = np.zeros((len(keys), 1 << self.precision), dtype=np.uint8)
+        registers[:len(self.keys)] = self.registers
+        rows = [position[key] for key in other.keys]
+        registers[rows] = np.maximum(registers[rows], other.registers)
+        return GroupedHyperLogLog(self.precision, keys, registers)
+
+
+class DistinctCount:
+    """
+    Exact mergeable distinct count: the sorted distinct 64-bit hashes of the values.
+
+    The in-memory counterpart of HyperLogLog (see config.use_sketches),
+    with the same interface; the state grows with the number of distinct
+    values instead of staying fixed.
+    """
+
+    def __init__(self, hashes: np.ndarray = None):
+        self.hashes = np.empty(0, dtype=np.uint64) if hashes is None else hashes
+
+    @classmethod
+    def from_values(cls, values: pd.Series) -> "DistinctCount":
+        """Distinct hashes of the non-null values of a column."""
+        return cls(np.unique(hash_series(values)))
+
+    def count(self) -> float:
+        return float(len(self.hashes))
+
+    def __add__(self, other: "DistinctCount") -> "DistinctCount":
+        return DistinctCount(np.union1d(self.hashes, other.hashes))
+
+
+class GroupedDistinctCount:
+    """
+    Exact distinct count per group key, the in-memory counterpart of GroupedHyperLogLog.
+
+    Keys are plain Python values (tuples for several group columns).
+    """
+
+    def __init__(self, hashes: dict = None):
+        self.hashes = dict(hashes or {})
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, by: list, column: str) -> "GroupedDistinctCount":
+        """Distinct hashes of the non-null values of column per group of the by columns."""
+        keys = frame[by[0]] if len(by) == 1 else pd.MultiIndex.from_frame(frame[list(by)])
+        codes, uniques = pd.factorize(keys)
+        valid = (codes >= 0) & frame[column].notna().to_numpy()
+        codes, hashes = codes[valid], hash_series(frame[column][valid])
+        # Sort by group, then hash: every group is a sorted slice
+        order = np.lexsort((hashes, codes))
+        codes, hashes = codes[order], hashes[order]
+        bounds = np.searchsorted(codes, np.arange(len(uniques) + 1))
+        uniques = list(uniques.tolist() if hasattr(uniques, 'tolist') else uniques)
+        return cls({key: np.unique(hashes[bounds[i]:bounds[i + 1]]) for i, key in enumerate(uniques)})
+
+    def counts(self) -> pd.Series:
+        """Distinct count per key."""
+        return pd.Series([len(hashes) for hashes in self.hashes.values()],
+                         index=pd.Index(list(self.hashes), tupleize_cols=False), dtype='float64')
+
+    def __add__(self, other: "GroupedDistinctCount") -> "GroupedDistinctCount":
+        hashes = dict(self.hashes)
+        for key, values in other.hashes.items():
+            hashes[key] = np.union1d(hashes[key], values) if key in hashes else values
+        return GroupedDistinctCount(hashes)
+
+
+def compress(means: np.ndarray, weights: np.ndarray, lows: np.ndarray, highs: np.ndarray, compression: int):
+    """
+    Merge (mean, weight, low, high) points sorted by mean into t-digest centroids.
+
+    Points of the same single value are combined first. The rest are
+    bucketed by the k1 scale function k(q) = compression / (2 pi)
+    * asin(2q - 1) of the quantile at their left edge, and each bucket
+    (one k unit) becomes one centroid: small centroids near the tails,
+    large ones around the median, about compression / 2 in total. A point
+    spanning a whole k unit by itself (a frequent value) is kept on its
+    own, so ties stay exact. Each centroid keeps the value range it covers.
+    """
+    if len(means) < 2:
+        return means, weights, lows, highs
+
+    single = lows == highs
+    duplicate = single[1:] & single[:-1] & (means[1:] == means[:-1])
+    if duplicate.any():
+        starts = np.flatnonzero(np.concatenate([[True], ~duplicate]))
+        means, lows, highs = means[starts], lows[starts], highs[starts]
+        weights = np.add.reduceat(weights, starts)
+
+    total = weights.sum()
+    right = np.cumsum(weights) / total
+    scale = compression / (2 * np.pi)
+    k_left = scale * np.arcsin(2 * (right - weights / total) - 1)
+    k_right = scale * np.arcsin(np.minimum(2 * right - 1, 1))
+    bucket = np.floor(k_left - k_left[0])
+    heavy = k_right - k_left >= 1
+    # New centroid where the bucket changes, and around heavy points
+    boundary = (np.diff(bucket) > 0) | heavy[1:] | heavy[:-1]
+    starts = np.concatenate([[0], np.flatnonzero(boundary) + 1])
+    merged = np.add.reduceat(weights, starts)
+    return (np.add.reduceat(means * weights, starts) / merged, merged,
+            np.minimum.reduceat(lows, starts), np.maximum.reduceat(highs, starts))
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest) of a numeric column.
+
+    The state is a bounded list of centroids (mean, weight and the value
+    range they cover), independent of the number of values. Quantiles
+    interpolate between centroid centers, except inside centroids of a
+    single value (ties such as ord_30 = 0), which are exact; the error is
+    a small fraction of a percentile at the default compression. Digests merge with `+`, so
+    merge_states combines them across chunks, workers and runs, and
+    pickle persists them.
+    """
+
+    def __init__(self, compression: int = None, centroids: tuple = None):
+        self.compression = compression or get_tdigest_compression()
+        self.means, self.weights, self.lows, self.highs = centroids or (np.empty(0),) * 4
+
+    @classmethod
+    def from_values(cls, values, compression: int = None) -> "TDigest":
+        """Digest of the non-null values of a column (or of a sorted float64 array)."""
+        if isinstance(values, pd.Series):
+            values = np.sort(values.dropna().to_numpy(dtype=np.float64))
+        return cls.from_counts(*np.unique(values, return_counts=True), compression)
+
+    @classmethod
+    def from_counts(cls, values, counts, compression: int = None) -> "TDigest":
+        """Digest of distinct sorted values with their counts (the same digest as from_values of the repeated values)."""
+        digest = cls(compression)
+        if len(values):
+            values = np.asarray(values, dtype=np.float64)
+            digest.means, digest.weights, digest.lows, digest.highs = compress(
+                values, np.asarray(counts, dtype=np.float64), values, values, digest.compression)
+        return digest
+
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def quantile(self, q):
+        """Estimated quantile(s) for q in [0, 1], NaN for an empty digest."""
+        if len(self.means) == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float('nan')
+        right = np.cumsum(self.weights)
+        left = right - self.weights
+        center = left + self.weights / 2
+        # Interpolate between centroid centers, but hold single-value centroids flat over their whole rank range
+        single = self.lows == self.highs
+        ranks = np.column_stack([np.where(single, left, center), np.where(single, right, center)]).ravel()
+        values = np.repeat(self.means, 2)
+        ranks = np.concatenate([[0], ranks, [right[-1]]])
+        values = np.concatenate([[self.lows[0]], values, [self.highs[-1]]])
+        result = np.interp(np.asarray(q) * right[-1], ranks, values)
+        return result if np.ndim(q) else float(result)
+
+    def __add__(self, other: "TDigest") -> "TDigest":
+        centroids = [np.concatenate([a, b]) for a, b in zip(self.centroids(), other.centroids())]
+        order = np.argsort(centroids[0], kind='stable')
+        return TDigest(self.compression, compress(*[array[order] for array in centroids], self.compression))
+
+    def centroids(self) -> tuple:
+        return self.means, self.weights, self.lows, self.highs
+
+
+class GroupedTDigest:
+    """
+    One TDigest per group key (e.g. price percentiles per category).
+
+    Meant for low-cardinality keys: each group is compressed separately.
+    Keys are plain Python values (tuples for several group columns).
+    """
+
+    def __init__(self, digests: dict = None):
+        self.digests = dict(digests or {})
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, by: list, column: str, compression: int = None) -> "GroupedTDigest":
+        """Digests of the non-null values of column per group of the by columns."""
+        keys = frame[by[0]] if len(by) == 1 else pd.MultiIndex.from_frame(frame[list(by)])
+        codes, uniques = pd.factorize(keys)
+        values = frame[column].to_numpy(dtype=np.float64)
+        valid = (codes >= 0) & ~np.isnan(values)
+        codes, values = codes[valid], values[valid]
+        # Sort by group, then value: every group is a sorted slice
+        order = np.lexsort((values, codes))
+        codes, values = codes[order], values[order]
+        bounds = np.searchsorted(codes, np.arange(len(uniques) + 1))
+        uniques = list(uniques.tolist() if hasattr(uniques, 'tolist') else uniques)
+        return cls({key: TDigest.from_values(values[bounds[i]:bounds[i + 1]], compression)
+                    for i, key in enumerate(uniques) if bounds[i + 1] > bounds[i]})
+
+    @classmethod
+    def from_counts(cls, frame: pd.DataFrame, by: list, column: str, counts: str,
+                    compression: int = None) -> "GroupedTDigest":
+        """Digests per group from a frame of distinct (by, column) rows and their counts (see TDigest.from_counts)."""
+        frame = frame[frame[column].notna()].sort_values(list(by) + [column])
+        return cls({key if len(by) > 1 else key[0]: TDigest.from_counts(group[column], group[counts], compression)
+                    for key, group in frame.groupby(list(by), sort=False)})
+
+    def quantiles(self, qs: list) -> pd.DataFrame:
+        """Estimated quantiles per key (rows) and q (columns)."""
+        return pd.DataFrame([digest.quantile(qs) for digest in self.digests.values()],
+                            index=pd.Index(list(self.digests), tupleize_cols=False), columns=qs)
+
+    def __add__(self, other: "GroupedTDigest") -> "GroupedTDigest":
+        digests = dict(self.digests)
+        for key, digest in other.digests.items():
+            digests[key] = digests[key] + digest if key in digests else digest
+        return GroupedTDigest(digests)
+
+
+class ExactQuantiles:
+    """
+    Exact mergeable quantiles of a numeric column: its distinct values and their counts.
+
+    The in-memory counterpart of TDigest, with the same interface. Quantiles
+    interpolate linearly like Series.quantile, so they do not depend on
+    how the data was split.
+    """
+
+    def __init__(self, values: np.ndarray = None, counts: np.ndarray = None):
+        self.values = np.empty(0) if values is None else values
+        self.counts = np.empty(0, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def from_values(cls, values) -> "ExactQuantiles":
+        """Value counts of the non-null values of a column (or of a float64 array)."""
+        if isinstance(values, pd.Series):
+            values = values.dropna().to_numpy(dtype=np.float64)
+        return cls(*np.unique(values, return_counts=True))
+
+    @classmethod
+    def from_counts(cls, values, counts) -> "ExactQuantiles":
+        """From distinct sorted values and their counts."""
+        return cls(np.asarray(values, dtype=np.float64), np.asarray(counts, dtype=np.int64))
+
+    def count(self) -> float:
+        return float(self.counts.sum())
+
+    def quantile(self, q):
+        """Quantile(s) for q in [0, 1] (linear interpolation), NaN when empty."""
+        if len(self.values) == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float('nan')
+        ends = np.cumsum(self.counts)
+        position = np.asarray(q, dtype=np.float64) * (ends[-1] - 1)
+        below = np.floor(position)
+        # Value at each 0-based rank of the sorted data
+        low = self.values[np.searchsorted(ends, below, side='right')]
+        high = self.values[np.minimum(np.searchsorted(ends, below + 1, side='right'), len(self.values) - 1)]
+        result = low + (high - low) * (position - below)
+        return result if np.ndim(q) else float(result)
+
+    def __add__(self, other: "ExactQuantiles") -> "ExactQuantiles":
+        values, inverse = np.unique(np.concatenate([self.values, other.values]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([self.counts, other.counts]), minlength=len(values))
+        return ExactQuantiles(values, counts.astype(np.int64))
+
+
+class GroupedExactQuantiles:
+    """One ExactQuantiles per group key, the in-memory counterpart of GroupedTDigest."""
+
+    def __init__(self, quantiles: dict = None):
+        self.digests = dict(quantiles or {})
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, by: list, column: str) -> "GroupedExactQuantiles":
+        """Value counts of the non-null values of column per group of the by columns."""
+        counts = frame.loc[frame[column].notna(), list(by) + [column]].value_counts(sort=False).reset_index()
+        return cls.from_counts(counts, by, column, 'count')
+
+    @classmethod
+    def from_counts(cls, frame: pd.DataFrame, by: list, column: str, counts: str) -> "GroupedExactQuantiles":
+        """From a frame of distinct (by, column) rows and their counts."""
+        frame = frame[frame[column].notna()].sort_values(list(by) + [column])
+        return cls({key if len(by) > 1 else key[0]: ExactQuantiles.from_counts(group[column], group[counts])
+                    for key, group in frame.groupby(list(by), sort=False)})
+
+    def quantiles(self, qs: list) -> pd.DataFrame:
+        """Quantiles per key (rows) and q (columns)."""
+        return pd.DataFrame([digest.quantile(qs) for digest in self.digests.values()],
+                            index=pd.Index(list(self.digests), tupleize_cols=False), columns=qs)
+
+    def __add__(self, other: "GroupedExactQuantiles") -> "GroupedExactQuantiles":
+        digests = dict(self.digests)
+        for key, digest in other.digests.items():
+            digests[key] = digests[key] + digest if key in digests else digest
+        return GroupedExactQuantiles(digests)
+
+
+class SpaceSaving:
+    """
+    Mergeable Space-Saving summary of the heaviest groups (top-K items, shops, cities, ...).
+
+    Keeps the aggregated outputs of at most `capacity` group keys, ranked
+    by the `top` output (e.g. clicks), plus an 'error' column; the k
+    heaviest are reported. For every kept key, top - error <= true value
+    <= top; a key that is not kept has a true value <= floor, and floor
+    <= total / capacity. Summaries merge with `+` (mergeable summaries: a
+    key missing from one side may have had up to that side's floor). The
+    other outputs (e.g. impressions) of a key are only counted while it is
+    kept; with_counts() replaces all of them with the exact values of an
+    exact second pass over the candidates (see engine.verify_topk).
+
+    The memory bound only holds where summaries are built chunk by chunk
+    (--stream, --incremental, Dask partitions): from_table truncates a
+    group table that run_aggregations has already built in full for the
+    frame at hand, which for in-memory runs (including --workers slices)
+    is every distinct key of the data.
+    """
+
+    def __init__(self, by: tuple, aggs: dict, top: str, k: int, capacity: int, table: pd.DataFrame,
+                 floor: float = 0, verified: bool = False):
+        self.by = tuple(by)
+        self.aggs = dict(aggs)
+        self.top = top
+        self.k = k
+        self.capacity = capacity
+        self.table = table
+        self.floor = floor
+        self.verified = verified
+
+    @property
+    def exact(self) -> bool:
+        """Whether the kept outputs are exact: verified, or no key was ever dropped."""
+        return self.verified or self.floor == 0
+
+    @property
+    def complete(self) -> bool:
+        """Whether the reported k heaviest are certainly the true ones (no dropped key can beat them)."""
+        if self.floor == 0:
+            return True
+        head = self.table[self.top].nlargest(self.k)
+        return self.verified and len(head) == self.k and head.iloc[-1] >= self.floor
+
+    @classmethod
+    def from_table(cls, table: pd.DataFrame, by: tuple, aggs: dict, top: str, k: int,
+                   capacity: int = None) -> "SpaceSaving":
+        """Summary of an exact grouped table (e.g. one chunk's groupby)."""
+        capacity = max(capacity or get_topk_capacity(), k)
+        return cls(by, aggs, top, k, capacity, table.assign(error=0.0)).truncated(0)
+
+    def truncated(self, floor: float) -> "SpaceSaving":
+        """Keep the capacity heaviest keys; floor bounds every key dropped before or now."""
+        table = self.table
+        if len(table) > self.capacity:
+            ranked = table[self.top].sort_values(ascending=False, kind='stable')
+            floor = max(floor, float(ranked.iloc[self.capacity]))
+            table = table.loc[ranked.index[:self.capacity]]
+        return SpaceSaving(self.by, self.aggs, self.top, self.k, self.capacity, table, floor)
+
+    def __add__(self, other: "SpaceSaving") -> "SpaceSaving":
+        index = self.table.index.union(other.table.index)
+        outputs = list(self.aggs)
+        table = self.table[outputs].add(other.table[outputs], fill_value=0).reindex(index)
+        # Keys missing from one side may have had up to its floor there
+        missing = [side.floor * ~index.isin(side.table.index) for side in (self, other)]
+        table[self.top] = table[self.top] + missing[0] + missing[1]
+        table['error'] = (self.table['error'].reindex(index, fill_value=0)
+                          + other.table['error'].reindex(index, fill_value=0) + missing[0] + missing[1])
+        return SpaceSaving(self.by, self.aggs, self.top, self.k, self.capacity, table).truncated(self.floor + other.floor)
+
+    def __mul__(self, factor: float) -> "SpaceSaving":
+        """Summary with every count scaled (see aggregate.scale_state)."""
+        return SpaceSaving(self.by, self.aggs, self.top, self.k, self.capacity, self.table * factor,
+                           self.floor * factor, self.verified)
+
+    def candidates(self) -> pd.Index:
+        """
+        Keys that can be among the k heaviest: those whose upper bound reaches
+        the k-th largest lower bound. Complete when floor is below that bound.
+        """
+        lower = (self.table[self.top] - self.table['error']).sort_values(ascending=False)
+        threshold = lower.iloc[self.k - 1] if len(lower) >= self.k else 0
+        return self.table.index[self.table[self.top] >= threshold]
+
+    def with_counts(self, counts: pd.DataFrame, keys: pd.Index) -> "SpaceSaving":
+        """
+        Summary with the exact outputs of the candidate keys (from the second pass).
+
+        The other kept keys keep their bounds, so the summary can still be
+        merged with later data (see incremental).
+        """
+        table = self.table.astype('float64')
+        outputs = list(self.aggs)
+        table.loc[keys, outputs] = counts.reindex(keys, fill_value=0)[outputs].to_numpy(dtype='float64')
+        table.loc[keys, 'error'] = 0.0
+        return SpaceSaving(self.by, self.aggs, self.top, self.k, self.capacity, table, self.floor, verified=True)
+
+    def map_keys(self, mapper) -> "SpaceSaving":
+        """Summary with its keys mapped, e.g. dictionary codes to ids for display (see id_encoding.decode_ids)."""
+        table = self.table.set_axis(mapper(self.table.index))
+        return SpaceSaving(self.by, self.aggs, self.top, self.k, self.capacity, table, self.floor, self.verified)
+
+    def head(self) -> pd.DataFrame:
+        """
+        The k heaviest keys by the top output, without the error column.
+
+        Ties are ordered by key ascending, whatever the chunking or merge
+        order. (Before the summaries, top products came from an unstable
+        quicksort of the full table, so tied items could come in any order.)
+        """
+        table = self.table.sort_index().sort_values(self.top, ascending=False, kind='stable')
+        return table.head(self.k).drop(columns='error')
@@ -1,92 +1,158 @@
+import sys
 import pandas as pd
 import numpy as np
-from ..config import get_city_name
+from ..config import get_city_name, get_segment_rules
+from .derived import select
+from .engine import Aggregation, derive_columns, run_aggregations, verify_states
+from .dask_engine import is_dask_frame, dask_partial_states
+from .rfm import RFM_COLUMNS, SCORE_COLUMNS, score_rfm, QuantileRfmScorer, StreamingRfmScorer
 
-def analyze_user(df: pd.DataFrame) -> dict:
+# Columns read by analyze_user; loaders project the CSV down to these
+REQUIRED_COLUMNS = ['label', 'user_id', 'visit_city', 'avg_price', 'is_supervip', 'ctr_30', 'ord_30', 'total_amt_30']
+
+def assign_segments(df: pd.DataFrame) -> pd.Series:
     """
-    Perform user analysis: Segmentation, VIP comparison, Geography.
+    Vectorized RFM segmentation driven by the segment rule table (config.get_segment_rules).
+
+    Each rule is a conjunction of {column: allowed values} masks; the first
+    matching rule wins and unmatched rows get the default segment.
+
+    Returns:
+        Categorical Series of segment names (int8 codes) aligned with df
     """
-    results = {}
-    
+    table = get_segment_rules()
+    names = [segment['name'] for segment in table['segments']]
+    conditions = []
+    for rule in table['rules']:
+        mask = np.ones(len(df), dtype=bool)
+        for col, values in rule['when'].items():
+            mask &= df[col].isin(values).to_numpy()
+        conditions.append(mask)
+    codes = np.select(conditions, [names.index(rule['segment']) for rule in table['rules']],
+                      default=names.index(table['default']))
+    return pd.Series(pd.Categorical.from_codes(codes.astype('int8'), categories=names), index=df.index)
+
+DERIVED_COLUMNS = {
     # --- 1. RFM Segmentation ---
-    # R: Not explicitly available as "days since last order", using a proxy or skip R logic if not strictly doable.
-    # Spec says: use qcut on total_amt_30 (M), ord_30 (F).
-    # Let's simplify to 5 segments based on M and F for demonstration if R is missing.
-    # Actually doc says: "提取用户的 Recency...". But we only have `times` (current request time) and lists of history.
-    # We will use M and F to segment.
-    
-    # Calculate Scores
-    # qcut needs unique bins, 'rank' method handles duplicates
-    try:
-        df['f_score'] = pd.qcut(df['ord_30'].rank(method='first'), q=3, labels=[1, 2, 3])
-        df['m_score'] = pd.qcut(df['total_amt_30'].rank(method='first'), q=3, labels=[1, 2, 3])
-    except Exception:
-        # Fallback if too little data
-        df['f_score'] = 1
-        df['m_score'] = 1
-
-    def assign_segment(row):
-        f, m = row['f_score'], row['m_score']
-        is_vip = row['is_supervip'] == 1
-        
-        if is_vip and m == 3: return "👑 超级VIP用户"
-        if m == 3 and f >= 2: return "💎 潜力优质用户"
-        if m == 2 or f == 3: return "💰 大众活跃用户"
-        if m == 1 and f == 1: return "🔄 流失风险用户"
-        return "👤 一般用户"
-
-    df['segment'] = df.apply(assign_segment, axis=1)
-    
+    # Precomputed f_score / m_score columns (e.g. StreamingRfmScorer) are used as is
+    SCORE_COLUMNS: score_rfm,
+    'segment': assign_segments,
+    # float64 accumulators for the float32 columns
+    'amt64': lambda df: df['total_amt_30'].astype('float64'),
+    'ord64': lambda df: df['ord_30'].astype('float64'),
+    # --- 2. VIP Comparison ---
+    # Conversion (User level avg): ord_30 / ctr_30 mean, shared registry (see derived.DERIVED)
+    **select('price64', 'label64', 'cvr'),
+}
+
+AGGREGATIONS = [
+    Aggregation('segments', ('segment',), {
+        'rows': (None, 'size'),
+        'sum': ('amt64', 'sum'),
+        'count': ('amt64', 'count')
+    }),
+    Aggregation('vip', ('is_supervip',), {
+        'label_sum': ('label64', 'sum'),
+        'label_count': ('label64', 'count'),
+        'cvr_sum': ('cvr', 'sum'),
+        'cvr_count': ('cvr', 'count'),
+        'price_sum': ('price64', 'sum'),
+        'price_count': ('price64', 'count'),
+        'ord_sum': ('ord64', 'sum'),
+        'ord_count': ('ord64', 'count')
+    }),
+    # --- 3. City Distribution ---
+    Aggregation('cities', ('visit_city',), {'rows': (None, 'size')}, top=('rows', 20)),
+    # Distinct users per segment / city (exact, or HyperLogLog sketches in the sketch modes)
+    Aggregation('segment_users', ('segment',), {'users': ('user_id', 'hll')}),
+    Aggregation('city_users', ('visit_city',), {'users': ('user_id', 'hll')}),
+]
+
+def build_state(results: dict) -> dict:
+    """
+    Build the mergeable user state from the engine's aggregation results.
+    """
+    segments = results['segments']
+    state = {
+        'segment_counts': segments['rows'],
+        'segment_amt': segments[['sum', 'count']],
+        'vip': results['vip'],
+        'city_counts': results['cities']
+    }
+    # Without the user_id column there are no distinct user counts
+    for name in ('segment_users', 'city_users'):
+        if name in results:
+            state[name] = results[name]['users']
+    return state
+
+def partial_user(df: pd.DataFrame, scores=None) -> dict:
+    """
+    Compute the mergeable aggregate state of the user analysis.
+
+    Args:
+        df: Preprocessed data (or one chunk of it)
+        scores: (f_score, m_score) for df, defaults to score_rfm(df)
+    """
+    if scores is not None:
+        df = df.assign(f_score=scores[0], m_score=scores[1])
+    return build_state(run_aggregations(derive_columns(df, DERIVED_COLUMNS), AGGREGATIONS))
+
+def finalize_user(state: dict) -> dict:
+    """
+    Turn a (merged) user state into the user JSON structure.
+    """
+    results = {}
+    # Samples on user_id scale the distinct counts up (see aggregate.scale_state)
+    distinct_scale = state.get('distinct_scale', 1)
+
+    segments = get_segment_rules()['segments']
+    labels = {segment['name']: segment for segment in segments}
+
     # 1.1 Distribution
-    seg_counts = df['segment'].value_counts(normalize=True) * 100
+    seg_counts = state['segment_counts']
+    # Categorical grouping also reports segments without rows
+    seg_counts = seg_counts[seg_counts > 0]
+    seg_counts = (seg_counts / seg_counts.sum() * 100).sort_values(ascending=False)
+    seg_users = state['segment_users'].counts() if 'segment_users' in state else None
     seg_data = []
-    colors = {
-        "👑 超级VIP用户": "#faad14",
-        "💎 潜力优质用户": "#1890ff",
-        "💰 大众活跃用户": "#52c41a",
-        "👤 一般用户": "#8c8c8c",
-        "🔄 流失风险用户": "#f5222d"
-    }
-    
     for name, val in seg_counts.items():
-        seg_data.append({
-            "name": name, 
+        item = {
+            "name": labels[name]['label'] if name in labels else name,
             "value": round(val, 2),
-            "color": colors.get(name, "#333")
-        })
+            "color": labels[name]['color'] if name in labels else "#333"
+        }
+        if seg_users is not None:
+            item["users"] = int(round(seg_users.get(name, 0) * distinct_scale))
+        seg_data.append(item)
     results['segment_distribution'] = seg_data
-    
+
     # 1.2 Average Consumption
-    avg_cons = df.groupby('segment')['total_amt_30'].mean().round(2)
-    # Sort by custom order
-    order = ["👑 超级VIP用户", "💎 潜力优质用户", "💰 大众活跃用户", "👤 一般用户", "🔄 流失风险用户"]
+    segment_amt = state['segment_amt']
+    segment_amt = segment_amt[segment_amt['count'] > 0]
+    avg_cons = (segment_amt['sum'] / segment_amt['count']).round(2)
+    # Sort by the segment table order
     ordered_values = []
     ordered_cats = []
-    for cat in order:
-        if cat in avg_cons.index:
-            ordered_cats.append(cat.replace("👑 ", "").replace("💎 ", "").replace("💰 ", "").replace("👤 ", "").replace("🔄 ", ""))
-            ordered_values.append(avg_cons[cat])
-            
+    for segment in segments:
+        if segment['name'] in avg_cons.index:
+            ordered_cats.append(segment['short_label'])
+            ordered_values.append(avg_cons[segment['name']])
+
     results['segment_avg_consumption'] = {
         "categories": ordered_cats,
         "values": ordered_values
     }
-    
+
     # --- 2. VIP Comparison ---
-    vip_grp = df.groupby('is_supervip')
-    
+    vip = state['vip']
+
     # Metrics
     # Click Rate: label mean * 100
-    click_rate = vip_grp['label'].mean() * 100
-    # Conversion (User level avg): ord_30 / ctr_30 mean
-    # Avoid div by zero
-    temp_df = df.copy()
-    temp_df['cvr'] = temp_df.apply(lambda r: r['ord_30']/r['ctr_30'] if r['ctr_30']>0 else 0, axis=1)
-    conv_rate = temp_df.groupby('is_supervip')['cvr'].mean() * 100
-    
-    avg_price = vip_grp['avg_price'].mean()
-    orders_30 = vip_grp['ord_30'].mean()
-    
+    click_rate = vip['label_sum'] / vip['label_count'] * 100
+    conv_rate = vip['cvr_sum'] / vip['cvr_count'] * 100
+    avg_price = vip['price_sum'] / vip['price_count']
+    orders_30 = vip['ord_sum'] / vip['ord_count']
+
     results['vip_comparison'] = {
         "categories": ["点击率(%)", "转化率(%)", "平均客单价(元)", "30天下单次数"],
         "vip": [
@@ -102,15 +168,29 @@ def analyze_user(df: pd.DataFrame) -> dict:
             round(orders_30.get(0, 0), 2)
         ]
     }
-    
+
     # --- 3. City Distribution ---
-    city_counts = df['visit_city'].value_counts().head(20)
+    city_counts = state['city_counts'].head()['rows']
+    city_users = state['city_users'].counts() if 'city_users' in state else None
     city_data = []
     for city_id, count in city_counts.items():
-        city_data.append({
+        item = {
             "name": get_city_name(city_id),
             "value": int(count)
-        })
+        }
+        if city_users is not None:
+            item["users"] = int(round(city_users.get(city_id, 0) * distinct_scale))
+        city_data.append(item)
     results['city_distribution'] = city_data
-    
+
     return {"user": results}
+
+def analyze_user(df: pd.DataFrame) -> dict:
+    """
+    Perform user analysis: Segmentation, VIP comparison, Geography.
+    """
+    if is_dask_frame(df):
+        # Lazy graph over the partitions, evaluated in a single dask.compute
+        return finalize_user(dask_partial_states(df, [sys.modules[__name__]])['user'])
+    # Exact second pass over the top-K candidates
+    return finalize_user(verify_states(df, {'user': partial_user(df)}, [sys.modules[__name__]])['user'])
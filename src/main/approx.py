@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Approximate dashboard from a one-pass uniform or hashed sample, with confidence intervals
+@Version: 1.2
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from .config import APPROX_GROUPS, APPROX_SEED, STREAM_CHUNKSIZE
+from .data_loader import load_data_pandas_chunks
+from .preprocess import preprocess_eleme_data
+from .analysis_modules import ANALYSIS_COLUMNS, ANALYSIS_MODULES, FINALIZERS
+from .analysis_modules.aggregate import scale_state
+from .analysis_modules.engine import partial_states, verify_states
+
+# flatten_numbers paths of percentages: CTR / CVR fields, price_analysis click rates, segment and time-category
+# shares, and the "(%)" rows of vip_comparison / weekday_comparison
+PERCENT_PATHS = re.compile(r"(^|\.)(global_ctr|global_cvr|ctr|conversion)(\.|$)|^price_analysis\.clicks\.|"
+                           r"^segment_distribution\.[^.]+\.value$|^time_category_preference\.data\.|\(%\)")
+# Student t 0.975 quantiles by degrees of freedom (APPROX_GROUPS - 1), normal beyond
+T_QUANTILES = {4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 14: 2.145, 19: 2.093, 29: 2.045}
+
+def sample_chunk(chunk: pd.DataFrame, fraction: float, groups: int, key: str = None, rng=None):
+    """
+    Bernoulli-sample the rows of one chunk and assign them to replicate groups.
+
+    Each row gets a uniform number u in [0, 1), random or derived from the
+    64-bit hash of its key column (so all rows of a key are kept or dropped
+    together, in every run). Rows with u < fraction are kept and fall into
+    group floor(u / fraction * groups), i.e. independent subsamples.
+
+    Returns:
+        (sampled rows, their group ids)
+    """
+    if key:
+        u = pd.util.hash_pandas_object(chunk[key], index=False).to_numpy() / 2.0 ** 64
+    else:
+        u = rng.random(len(chunk))
+    kept = u < fraction
+    return chunk[kept], (u[kept] / fraction * groups).astype('int64')
+
+def load_sample(filename, fraction: float, key: str = None, chunksize: int = STREAM_CHUNKSIZE):
+    """
+    Draw the sample in a single chunked pass over the input.
+
+    Returns:
+        (sample DataFrame, group id array aligned with it)
+    """
+    rng = np.random.default_rng(APPROX_SEED)
+    parts, group_parts = [], []
+    for chunk in load_data_pandas_chunks(filename, chunksize, usecols=ANALYSIS_COLUMNS):
+        part, group_ids = sample_chunk(chunk, fraction, APPROX_GROUPS, key, rng)
+        parts.append(part)
+        group_parts.append(group_ids)
+    return pd.concat(parts, ignore_index=True), np.concatenate(group_parts)
+
+def list_labels(chart: dict) -> dict:
+    """
+    Labels of the (nested) lists of a chart dict, by key.
+
+    Charts keep parallel lists, e.g. the items, clicks and ctr of
+    top_products, or the categories and percentiles of the rows and
+    columns of category_price_percentiles: a list lines up with the first
+    other list of distinct strings of its length, its rows with the next.
+
+    Returns:
+        {key: tuple of label lists, one per nesting level}
+    """
+    candidates = [value for value in chart.values() if isinstance(value, list) and value
+                  and all(isinstance(v, str) for v in value) and len(set(value)) == len(value)]
+    labels = {}
+    for key, value in chart.items():
+        levels = []
+        while isinstance(value, list) and value:
+            match = next((candidate for candidate in candidates if len(candidate) == len(value)
+                          and candidate is not chart[key] and all(candidate is not level for level in levels)), None)
+            if match is None:
+                break
+            levels.append(match)
+            value = value[0]
+        labels[key] = tuple(levels)
+    return labels
+
+def flatten_numbers(obj, prefix: str = "", labels: tuple = ()) -> dict:
+    """
+    Numeric leaves of a result JSON by dotted path.
+
+    List items with a "name" are keyed by name and the lists of a chart by
+    the labels of their parallel list (see list_labels), so ranked lists
+    (cities, segments, top items / shops / brands) line up across
+    replicates even when their order differs. Other items are keyed by position.
+    """
+    if isinstance(obj, dict):
+        nested = list_labels(obj)
+        items = [(name, value, nested[name]) for name, value in obj.items()]
+    elif isinstance(obj, list):
+        names = labels[0] if labels and len(labels[0]) == len(obj) else range(len(obj))
+        items = [(item["name"] if isinstance(item, dict) and "name" in item else name, item, labels[1:])
+                 for name, item in zip(names, obj)]
+    else:
+        if isinstance(obj, (int, float, np.number)) and not isinstance(obj, bool):
+            return {prefix: float(obj)}
+        return {}
+    leaves = {}
+    for name, value, item_labels in items:
+        leaves.update(flatten_numbers(value, f"{prefix}.{name}" if prefix else str(name), item_labels))
+    return leaves
+
+def is_percent_path(path: str) -> bool:
+    """Whether a flatten_numbers path is a percentage (CTR, CVR, shares)."""
+    return bool(PERCENT_PATHS.search(path))
+
+def is_distinct_path(path: str) -> bool:
+    """Whether a flatten_numbers path is a distinct user count (active_users, the "users" fields)."""
+    return bool({'active_users', 'users'} & set(path.split('.')))
+
+def confidence_intervals(result: dict, replicates: list) -> dict:
+    """
+    95% random-groups confidence intervals of every numeric value in result.
+
+    The standard error is the spread of the replicate estimates divided by
+    sqrt(number of replicates); values present in fewer than two replicates
+    (e.g. a city that only made one replicate's top 20) get no interval.
+    Intervals are clipped to the range of the value: [0, 100] for
+    percentages (see is_percent_path), [0, inf) otherwise.
+    """
+    replicate_leaves = [flatten_numbers(replicate) for replicate in replicates]
+    intervals = {}
+    for path, value in flatten_numbers(result).items():
+        estimates = np.array([leaves[path] for leaves in replicate_leaves if path in leaves])
+        estimates = estimates[np.isfinite(estimates)]
+        if len(estimates) < 2 or not np.isfinite(value):
+            continue
+        t = T_QUANTILES.get(len(estimates) - 1, 1.96)
+        half_width = t * estimates.std(ddof=1) / np.sqrt(len(estimates))
+        # Every dashboard value is non-negative, percentages are at most 100
+        high = min(value + half_width, 100.0) if is_percent_path(path) else value + half_width
+        intervals[path] = [round(max(value - half_width, 0.0), 4), round(high, 4)]
+    return intervals
+
+def run_approx(filename, fraction: float, key: str = None, chunksize: int = STREAM_CHUNKSIZE):
+    """
+    Run metrics / user / product / behavior analysis on a sample of the input.
+
+    The sample is preprocessed like the full data. Every module runs on the
+    whole sample, with its state scaled by 1 / fraction so counts
+    (impressions, clicks, city distribution, ...) estimate the full totals.
+    It also runs on each of the APPROX_GROUPS replicate groups, scaled by
+    APPROX_GROUPS / fraction, whose spread gives the confidence intervals
+    stored under each module's "confidence_intervals" key.
+
+    Distinct user counts (active_users, the "users" fields) are only scaled
+    up when sampling on key=user_id, which keeps or drops all rows of a
+    user. Other samples see most users with only some of their rows, so the
+    count is reported unscaled as a lower bound: its paths are listed under
+    the module's "lower_bounds" key and get no confidence interval.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH
+        fraction: Sampling fraction in (0, 1]
+        key: Column to hash for sampling (e.g. user_id), uniform row sampling if None
+        chunksize: Rows per chunk of the sampling pass
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError(f"Sampling fraction must be in (0, 1], got {fraction}")
+
+    sample, group_ids = load_sample(filename, fraction, key, chunksize)
+    print(f"🎲 抽样 {len(sample)} 行 (fraction={fraction}, {'按 ' + key + ' 哈希' if key else '均匀随机'})")
+    # Filtering by label happens after sampling: keep the group ids aligned
+    sample['_group'] = group_ids
+    sample = preprocess_eleme_data(sample)
+    group_ids = sample.pop('_group').to_numpy()
+
+    states = verify_states(sample, partial_states(sample, ANALYSIS_MODULES), ANALYSIS_MODULES)
+    group_states = [partial_states(sample[group_ids == group], ANALYSIS_MODULES)
+                    for group in range(APPROX_GROUPS) if (group_ids == group).any()]
+
+    by_user = key == 'user_id'
+    results = []
+    for name, finalize in FINALIZERS.items():
+        result = finalize(scale_state(states[name], 1 / fraction, 1 / fraction if by_user else 1))
+        replicates = [finalize(scale_state(group_state[name], APPROX_GROUPS / fraction,
+                                           APPROX_GROUPS / fraction if by_user else 1))[name]
+                      for group_state in group_states]
+        intervals = confidence_intervals(result[name], replicates)
+        if not by_user:
+            lower_bounds = [path for path in flatten_numbers(result[name]) if is_distinct_path(path)]
+            intervals = {path: interval for path, interval in intervals.items() if not is_distinct_path(path)}
+            result[name]['lower_bounds'] = lower_bounds
+        result[name]['confidence_intervals'] = intervals
+        results.append(result)
+    return tuple(results)
@@ -8,6 +8,8 @@
 @Version: 2.0
 """
 
+import datetime
+import json
 import os
 import sys
 
@@ -39,12 +41,214 @@ def get_input_filename() -> str:
 # 向后兼容：模块加载时的默认值（注意：在 Jupyter 中设置环境变量后此值不会自动更新，请使用 get_input_filename()）
 INPUT_FILENAME = get_input_filename()
 
+def get_cli_option(name: str, env_name: str = None, default=None):
+    """
+    获取 --name=value 形式的命令行参数，其次使用环境变量 env_name，最后返回 default
+
+    与 get_input_filename 一样每次调用都重新读取，便于在 Notebook 中动态修改
+    """
+    prefix = f'--{name}='
+    for arg in sys.argv:
+        if arg.startswith(prefix):
+            return arg.split('=', 1)[1]
+    if env_name:
+        return os.environ.get(env_name, default)
+    return default
+
+def has_cli_flag(name: str, env_name: str = None) -> bool:
+    """
+    判断是否传入了 --name 开关，或环境变量 env_name 取值为 1/true
+    """
+    if f'--{name}' in sys.argv:
+        return True
+    return bool(env_name) and os.environ.get(env_name, '0') in ('1', 'true', 'True')
+
+# Data Source: "csv" 直接解析 DATA_PATH 下的原始文件，"parquet" 读取 ingest 生成的数据集
+# 使用示例：python src/scripts/generate_dashboard.py --source=parquet
+def get_data_source() -> str:
+    return get_cli_option('source', 'DATA_SOURCE', 'csv')
+
 # Output File
 OUTPUT_JSON_FILENAME = "dashboard_data.json"
 
 # Dask Settings
 PARTITIONS = 8
 
+# CSV Parser: "c" 为 pandas 默认的单线程 C 解析器，"pyarrow" 使用 pyarrow 多线程 CSV 解析器（同一套类型 schema），
+# "scan" 将文件按换行对齐切分为 SCAN_RANGE_BYTES 大小的字节区间，由 --workers 个进程并行以 C 解析器解析（data_loader.scan_csv）
+# 使用示例：python src/scripts/generate_dashboard.py --parser=pyarrow
+#           python src/scripts/generate_dashboard.py --parser=scan --workers=4
+def get_csv_parser() -> str:
+    return get_cli_option('parser', 'CSV_PARSER', 'c')
+
+# Analysis Engine: "pandas" 为默认的融合聚合引擎；"polars" 将预处理与各模块声明的派生列、聚合翻译为
+# Polars 惰性查询，在原始 CSV / Parquet 上多线程流式执行（需安装 polars）；"duckdb" 将其翻译为 SQL，
+# 在嵌入式 DuckDB 中执行，超出内存时溢写到 data/processed/duckdb_tmp（需安装 duckdb）
+# 使用示例：python src/scripts/generate_dashboard.py --engine=polars
+#           python src/scripts/generate_dashboard.py --engine=duckdb
+def get_engine() -> str:
+    return get_cli_option('engine', 'ANALYSIS_ENGINE', 'pandas')
+
+# ID 字典编码：哈希 ID 列（user_id / item_id / shop_id / geohash 等）在加载后映射为整数编码，
+# 字典持久化在 data/processed/id_dictionary（只追加，编码跨运行、跨文件稳定），仅展示时解码（如 Item_xxxxxx）
+# 使用示例：python src/scripts/generate_dashboard.py --no-id-encoding   # 保留字符串 ID
+ID_ENCODED_COLUMNS = ["user_id", "shop_id", "item_id", "shop_aoi_id", "shop_geohash_6", "shop_geohash_12",
+                      "brand_id", "geohash12"]
+
+def use_id_encoding() -> bool:
+    return not has_cli_flag('no-id-encoding', 'NO_ID_ENCODING')
+
+# OLAP Cube：分组键都在以下低基数维度中的可加聚合（曝光、点击、价格与 CVR 之和等）按各自的分组键
+# 各预聚合一个小 cuboid（而不是所有维度的全组合），构建一次后仪表盘直接由 cube 计算，不再扫描明细数据
+# 不支持 --filter：其他引擎先过滤再预处理（avg_price / visit_city 填充值、RFM 分档随之变化），cube 按全量数据预处理
+# 使用示例：python src/scripts/build_cube.py --input-file=D1_0.csv
+#           python src/scripts/generate_dashboard.py --cube
+CUBE_DIMENSIONS = ["hour_extracted", "time_period", "weekdays", "is_weekend", "visit_city", "category_1_id",
+                   "price_bin", "rank_bin", "is_supervip", "gender", "segment"]
+
+# 结果缓存：各分析模块的结果按 输入指纹 + 过滤条件 + 配置（城市 / 品类映射、分箱、RFM 与草图参数）+ 分析模式
+# + 模块源码版本 的哈希缓存在 data/processed/result_cache，输入未变时重跑直接读取结果；
+# 总大小超过上限时按最近使用时间（LRU）淘汰
+# 使用示例：python src/scripts/generate_dashboard.py --no-cache   # 不读写缓存
+#           python src/scripts/generate_dashboard.py --refresh    # 重新计算并覆盖缓存
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def get_result_cache_max_bytes() -> int:
+    return int(get_cli_option('result-cache-max-bytes', 'RESULT_CACHE_MAX_BYTES', RESULT_CACHE_MAX_BYTES))
+
+# Worker Pool: processes/threads used to read and analyze several input files concurrently
+# 使用示例：python src/scripts/generate_dashboard.py --input-file="D1_*.csv.gz" --workers=4
+def get_max_workers() -> int:
+    return int(get_cli_option('workers', 'MAX_WORKERS', os.cpu_count() or 1))
+
+# Streaming Settings: rows per chunk of `generate_dashboard.py --stream`
+STREAM_CHUNKSIZE = 500_000
+
+# Byte-range Scanner: target size of the newline-aligned ranges data_loader.scan_csv
+# hands to each worker process (bounds per-worker memory)
+SCAN_RANGE_BYTES = 64 * 1024 * 1024
+
+# Approximate Mode: 按比例抽样运行分析模块，计数按 1/fraction 放大，并给出置信区间
+# 使用示例：python src/scripts/generate_dashboard.py --approx=0.01 [--approx-key=user_id]
+#   --approx-key 按该列哈希抽样（同一用户的所有行同进同出，--approx-key=user_id 时活跃用户数按比例放大且无偏），缺省为均匀随机抽样
+#   其他抽样方式下用户数（active_users / users）不放大，作为下界列在各模块的 lower_bounds 中
+def get_approx_fraction():
+    fraction = get_cli_option('approx', 'APPROX_FRACTION')
+    return float(fraction) if fraction else None
+
+def get_approx_key():
+    return get_cli_option('approx-key', 'APPROX_KEY')
+
+# 随机分组 (random groups) 方差估计的组数，以及均匀抽样的随机种子
+APPROX_GROUPS = 10
+APPROX_SEED = 42
+
+# 精确 / 草图口径：内存模式（默认、--workers、polars / duckdb / cube、近似抽样）精确计算去重用户数；
+# 流式 (--stream)、增量 (--incremental) 与 Dask 模式使用 HyperLogLog 草图，状态大小与数据量无关
+# 使用示例：python src/scripts/generate_dashboard.py --sketches    # 内存模式也使用草图
+def use_sketches() -> bool:
+    return any(has_cli_flag(*flag) for flag in [('sketches', 'USE_SKETCHES'), ('stream', 'STREAM'),
+                                                ('incremental', 'INCREMENTAL')])
+
+# HyperLogLog 去重计数精度：2^p 个寄存器，相对误差约 1.04 / sqrt(2^p)（p=14: 16KB, 约 0.8%）
+# 使用示例：python src/scripts/generate_dashboard.py --hll-precision=12
+HLL_PRECISION = 14
+
+def get_hll_precision() -> int:
+    return int(get_cli_option('hll-precision', 'HLL_PRECISION', HLL_PRECISION))
+
+# t-digest 分位数草图压缩参数：质心数约为 compression / 2，越大越精确（用于 RFM 三分位切点、品类价格分位数）
+TDIGEST_COMPRESSION = 200
+
+def get_tdigest_compression() -> int:
+    return int(get_cli_option('tdigest-compression', 'TDIGEST_COMPRESSION', TDIGEST_COMPRESSION))
+
+# Top-K (Space-Saving) 摘要保留的最大 key 数：商品 / 店铺 / 品牌 / 城市排行只保留最重的 key，
+# 未保留 key 的计数上界约为 总数 / capacity；第二遍只对候选 key 精确计数
+# 注意：内存上界只对逐块构建摘要的模式生效（--stream / --incremental / Dask）；
+# 内存模式（含 --workers）先对整个数据帧做完整 groupby，再截断为摘要
+TOPK_CAPACITY = 10000
+
+def get_topk_capacity() -> int:
+    return int(get_cli_option('topk-capacity', 'TOPK_CAPACITY', TOPK_CAPACITY))
+
+# 增量模式 (--incremental --watch) 轮询 DATA_PATH 新文件的间隔（秒）
+WATCH_INTERVAL = 60
+
+def get_watch_interval() -> float:
+    return float(get_cli_option('watch-interval', 'WATCH_INTERVAL', WATCH_INTERVAL))
+
+# RFM 打分方式：
+#   sketch: 由 t-digest 估计 ord_30 / total_amt_30 的三分位切点，按值向量化打分（内存与数据量无关，分块 / 分区可并行，
+#           切点随分块方式略有变化）
+#   exact:  全局 rank(method='first') + qcut（原口径，相同取值的行可能落入不同分档）
+#   None:   草图模式（见 use_sketches）与 Dask 用 sketch，内存模式用 exact
+# 使用示例：python src/scripts/generate_dashboard.py --stream --rfm-scoring=exact
+RFM_SCORING = None
+
+def get_rfm_scoring(sketches: bool = None) -> str:
+    """sketches: 是否草图模式，默认 use_sketches()"""
+    scoring = get_cli_option('rfm-scoring', 'RFM_SCORING', RFM_SCORING)
+    if scoring is None:
+        scoring = "sketch" if (use_sketches() if sketches is None else sketches) else "exact"
+    if scoring not in ("sketch", "exact"):
+        raise ValueError(f"Unknown RFM scoring: {scoring} (expected sketch or exact)")
+    return scoring
+
+# Parquet Dataset (built by src/scripts/ingest.py under PROCESSED_PATH)
+PARQUET_DATASET = "impressions"
+# Hive partition keys: "day" is derived from `times` (UTC date) during ingest
+PARTITION_COLUMNS = ["day", "visit_city"]
+# Rows buffered per partition before a row group is flushed (bounds ingest memory)
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+# Zone maps: per row group min / max of these columns, indexed at ingest in ZONE_MAPS_FILE of the
+# dataset so filtered loads skip partitions and row groups without opening their files
+ZONE_MAP_COLUMNS = ["times", "avg_price", "rank_7"]
+ZONE_MAPS_FILE = "_zone_maps.json"
+
+# 数据过滤：只分析满足条件的行，可重复传入，多个条件取交集
+#   运算符 = != > >= < <=，"|" 分隔多个取值表示 in；day 为 UTC 日期 (YYYY-MM-DD)
+#   Parquet 数据源按分区与 zone map 跳过无关文件和行组，CSV 数据源在解析后过滤
+# 使用示例：python src/scripts/generate_dashboard.py --filter visit_city=2
+#           python src/scripts/generate_dashboard.py --source=parquet --filter "weekdays=5|6" --filter "day>=2022-04-01"
+#   环境变量 FILTERS 以 ";" 分隔多个条件，如 FILTERS="visit_city=2;weekdays=5|6"
+FILTER_OPERATORS = ["!=", ">=", "<=", "=", ">", "<"]
+
+def parse_filter_value(column: str, text: str):
+    """Typed value of a filter: dates for day, numbers where they parse, strings otherwise."""
+    if column == "day":
+        return datetime.date.fromisoformat(text)
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+def parse_filter(text: str) -> tuple:
+    """ "visit_city=2" -> ("visit_city", "=", 2), "weekdays=5|6" -> ("weekdays", "in", [5, 6]) """
+    for op in FILTER_OPERATORS:
+        if op in text:
+            column, value = (part.strip() for part in text.split(op, 1))
+            if column not in COLUMN_NAMES and column != "day":
+                raise ValueError(f"Unknown filter column: {column}")
+            if op == "=" and "|" in value:
+                return column, "in", [parse_filter_value(column, v) for v in value.split("|")]
+            return column, op, parse_filter_value(column, value)
+    raise ValueError(f"Invalid filter: {text} (expected e.g. visit_city=2)")
+
+def get_filters() -> list:
+    """Filter predicates as pyarrow-style (column, op, value) tuples, [] without --filter."""
+    texts = []
+    for i, arg in enumerate(sys.argv):
+        if arg.startswith('--filter='):
+            texts.append(arg.split('=', 1)[1])
+        elif arg == '--filter' and i + 1 < len(sys.argv):
+            texts.append(sys.argv[i + 1])
+    if not texts and os.environ.get('FILTERS'):
+        texts = os.environ['FILTERS'].split(';')
+    return [parse_filter(text) for text in texts if text.strip()]
+
 # Column Names (Based on requirement doc and data sample)
 COLUMN_NAMES = [
     "label",
@@ -88,6 +292,118 @@ COLUMN_NAMES = [
     "geohash12"
 ]
 
+# Column Schema: compact dtypes enforced by both the pandas and the Dask loader.
+# Nullable "Int32" is used for id columns that can be empty in the raw data
+# (e.g. visit_city, see preprocess_eleme_data); hashed ids and *_list history
+# columns stay strings. Aggregations over float32 columns must upcast to float64.
+COLUMN_DTYPES = {
+    "label": "int8",
+    "user_id": str,
+    "gender": "category",
+    "visit_city": "Int32",
+    "avg_price": "float32",
+    "is_supervip": "int8",
+    "ctr_30": "float32",
+    "ord_30": "float32",
+    "total_amt_30": "float32",
+    "shop_id": str,
+    "item_id": str,
+    "city_id": "Int32",
+    "district_id": "Int32",
+    "shop_aoi_id": str,
+    "shop_geohash_6": str,
+    "shop_geohash_12": str,
+    "brand_id": str,
+    "category_1_id": "Int32",
+    "merge_standard_food_id": "Int32",
+    "rank_7": "Int32",
+    "rank_30": "Int32",
+    "rank_90": "Int32",
+    "shop_id_list": str,
+    "item_id_list": str,
+    "category_1_id_list": str,
+    "merge_standard_food_id_list": str,
+    "brand_id_list": str,
+    "price_list": str,
+    "shop_aoi_id_list": str,
+    "shop_geohash6_list": str,
+    "timediff_list": str,
+    "hours_list": str,
+    "time_type_list": str,
+    "weekdays_list": str,
+    "times": "int64",
+    "hours": "int16",
+    "time_type": "category",
+    "weekdays": "int8",
+    "geohash12": str
+}
+
+# *_list 历史列：以 LIST_DELIMITER 分隔的每用户历史序列，
+# 由 ragged.parse_list_column 解析为 offsets + 定长类型 values (字符串元素做字典编码)
+LIST_DELIMITER = ";"
+LIST_VALUE_TYPES = {
+    "shop_id_list": "string",
+    "item_id_list": "string",
+    "category_1_id_list": "int32",
+    "merge_standard_food_id_list": "int32",
+    "brand_id_list": "string",
+    "price_list": "float32",
+    "shop_aoi_id_list": "string",
+    "shop_geohash6_list": "string",
+    "timediff_list": "int32",
+    "hours_list": "int8",
+    "time_type_list": "string",
+    "weekdays_list": "int8"
+}
+
+# 每批解析的行数，限制 split 产生的中间 list<string> 数组大小
+LIST_PARSE_CHUNKSIZE = 1_000_000
+
+def get_column_dtypes(columns=None) -> dict:
+    """
+    Get the read_csv dtype mapping, restricted to the given columns.
+
+    Args:
+        columns: Column names to include, defaults to all COLUMN_NAMES
+    """
+    columns = COLUMN_NAMES if columns is None else columns
+    return {col: COLUMN_DTYPES[col] for col in columns}
+
+# RFM 用户分群规则表 (analysis_modules.user.assign_segments)
+# SEGMENTS: 分群名称 (分类编码的类别)、展示名称、简称与颜色，顺序即平均消费图的展示顺序
+# SEGMENT_RULES: 按顺序匹配，首条满足的规则决定分群；when 为 {列: 允许取值} 的与条件
+# SEGMENT_DEFAULT: 未命中任何规则时的分群
+# 可通过 --segment-rules=rules.json (或环境变量 SEGMENT_RULES_FILE) 覆盖，
+# JSON 中可包含 segments / rules / default 任意键
+SEGMENTS = [
+    {"name": "super_vip", "label": "👑 超级VIP用户", "short_label": "超级VIP用户", "color": "#faad14"},
+    {"name": "high_potential", "label": "💎 潜力优质用户", "short_label": "潜力优质用户", "color": "#1890ff"},
+    {"name": "active", "label": "💰 大众活跃用户", "short_label": "大众活跃用户", "color": "#52c41a"},
+    {"name": "regular", "label": "👤 一般用户", "short_label": "一般用户", "color": "#8c8c8c"},
+    {"name": "churn_risk", "label": "🔄 流失风险用户", "short_label": "流失风险用户", "color": "#f5222d"}
+]
+
+SEGMENT_RULES = [
+    {"segment": "super_vip", "when": {"is_supervip": [1], "m_score": [3]}},
+    {"segment": "high_potential", "when": {"m_score": [3], "f_score": [2, 3]}},
+    {"segment": "active", "when": {"m_score": [2]}},
+    {"segment": "active", "when": {"f_score": [3]}},
+    {"segment": "churn_risk", "when": {"m_score": [1], "f_score": [1]}}
+]
+
+SEGMENT_DEFAULT = "regular"
+
+def get_segment_rules() -> dict:
+    """
+    获取分群规则表 {segments, rules, default}，优先使用 --segment-rules= 指定的 JSON 文件
+    """
+    table = {"segments": SEGMENTS, "rules": SEGMENT_RULES, "default": SEGMENT_DEFAULT}
+    path = get_cli_option('segment-rules', 'SEGMENT_RULES_FILE')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            table.update(json.load(f))
+    return table
+
 # Mappings (Mock data for visualization purposes as real mappings are not provided)
 CITY_MAPPING = {
     2: "北京",
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Pre-aggregated OLAP cube of the analysis modules' additive measures over the
+              low-cardinality dimensions (CUBE_DIMENSIONS), built once under PROCESSED_PATH;
+              dashboards are answered from it without a scan
+@Version: 1.1
+"""
+
+import glob
+import json
+import os
+import pickle
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .config import (PROCESSED_PATH, COLUMN_NAMES, CUBE_DIMENSIONS, get_data_source, use_id_encoding)
+from .data_loader import load_data
+from .frame_cache import get_input_fingerprint
+from .id_encoding import encode_ids, get_dictionary_token
+from .incremental import get_state_settings, write_atomic
+from .preprocess import preprocess_eleme_data
+from .analysis_modules import ANALYSIS_COLUMNS, ANALYSIS_MODULES, finalize_states
+from .analysis_modules.engine import (build_states, derive_columns, module_aggregations, run_aggregations,
+                                      verify_states)
+from .analysis_modules.sketches import SpaceSaving
+
+# One directory per input: manifest.json, cuboid-<i>.arrow (group keys + measures), sketches.pkl
+CUBE_PATH = os.path.join(PROCESSED_PATH, "cube")
+# Aggregation funcs that add up over the cube cells
+ADDITIVE_FUNCS = ('sum', 'count', 'size')
+
+
+def is_additive(agg) -> bool:
+    """Whether an aggregation can be answered from the cube: grouped by dimensions, additive outputs only."""
+    return set(agg.by) <= set(CUBE_DIMENSIONS) and all(func in ADDITIVE_FUNCS for _, func in agg.aggs.values())
+
+
+def measure_name(col: str, func: str) -> str:
+    """Cube column of an additive (column, func) pair, named like the engine's query outputs."""
+    return f"{col}:{func}"
+
+
+def get_cuboids(aggregations: list, columns=None) -> dict:
+    """
+    Group keys and measures of the cuboids answering the additive aggregations.
+
+    Additive aggregations sharing their group keys share a cuboid, with
+    the union of their (column, func) pairs; aggregations over columns
+    missing from columns are left out, like run_aggregations skips them.
+
+    Returns:
+        {group keys: [(column, func)]}
+    """
+    cuboids = {}
+    for agg in aggregations:
+        needed = list(agg.by) + [col for col, _ in agg.aggs.values() if col is not None]
+        if is_additive(agg) and (columns is None or set(needed) <= set(columns)):
+            pairs = cuboids.setdefault(tuple(agg.by), [])
+            pairs.extend(pair for pair in agg.aggs.values() if pair not in pairs)
+    return cuboids
+
+
+def build_cuboid(frame: pd.DataFrame, by: tuple, pairs: list) -> pd.DataFrame:
+    """One row per non-empty combination of the by columns (nulls included), one column per measure."""
+    named = {measure_name(col, func): (col, func) for col, func in pairs if func != 'size'}
+    if not by:
+        cuboid = pd.DataFrame({name: [getattr(frame[col], func)()] for name, (col, func) in named.items()})
+        cuboid[measure_name(None, 'size')] = len(frame)
+        return cuboid
+    grouped = frame.groupby(list(by), observed=True, dropna=False, sort=False)
+    cuboid = grouped.agg(**named) if named else grouped.size().to_frame()[[]]
+    cuboid[measure_name(None, 'size')] = grouped.size()
+    return cuboid.reset_index()
+
+
+def get_cube_dir(filename) -> str:
+    name = "".join(c if c.isalnum() else "_" for c in str(filename))
+    return os.path.join(CUBE_PATH, f"{get_data_source()}-{name}")
+
+
+def get_cube_settings(filename) -> dict:
+    """Inputs and settings the cube depends on; any change makes it stale."""
+    return {
+        **get_state_settings(),
+        'inputs': get_input_fingerprint(filename),
+        'source': get_data_source(),
+        'dimensions': CUBE_DIMENSIONS,
+        'cuboids': [list(by) for by in get_cuboids(module_aggregations(ANALYSIS_MODULES))],
+        # Top-K keys of the sketches are id codes of these dictionaries
+        'id_dictionary': get_dictionary_token() if use_id_encoding() else None
+    }
+
+
+def build_cube(filename) -> str:
+    """
+    Scan the input once and materialize its cube.
+
+    Written to the input's directory under CUBE_PATH:
+        cuboid-<i>.arrow: one cuboid per group key set of the additive
+                          aggregations (see get_cuboids), with a row per
+                          non-empty combination of its keys and the
+                          measures of those aggregations only, so the
+                          cube stays at a few hundred cells instead of
+                          one per combination of all dimensions;
+                          zstd-compressed Arrow, categorical keys kept
+        sketches.pkl: results of the other aggregations (distinct users,
+                      price percentiles, top items / shops / brands) over
+                      the whole input, with exact top-K
+        manifest.json: settings, rows and the group keys and cells of each cuboid
+
+    Dimensions and measures are derived with the full input's
+    preprocessing (avg_price / visit_city fill values) and RFM scoring.
+
+    Returns:
+        The cube directory
+    """
+    columns = [col for col in COLUMN_NAMES if col in set(ANALYSIS_COLUMNS) | set(CUBE_DIMENSIONS)]
+    df = encode_ids(preprocess_eleme_data(load_data(filename, usecols=columns)))
+    frame = derive_columns(df, *[module.DERIVED_COLUMNS for module in ANALYSIS_MODULES])
+    del df
+
+    print("🧊 构建 OLAP cube...")
+    aggregations = module_aggregations(ANALYSIS_MODULES)
+    cuboids = {by: build_cuboid(frame, by, pairs) for by, pairs in get_cuboids(aggregations, frame.columns).items()}
+
+    # Everything else is kept as whole-input results, verified like the in-memory engine
+    sketches = run_aggregations(frame, [agg for agg in aggregations if not is_additive(agg)])
+    sketches = verify_states(frame, {'cube': sketches}, ANALYSIS_MODULES)['cube']
+
+    cube_dir = get_cube_dir(filename)
+    os.makedirs(cube_dir, exist_ok=True)
+    entries = []
+    for i, (by, cuboid) in enumerate(cuboids.items()):
+        name = f"cuboid-{i}.arrow"
+        tmp_path = os.path.join(cube_dir, f"{name}.tmp")
+        feather.write_feather(pa.Table.from_pandas(cuboid, preserve_index=False), tmp_path, compression='zstd')
+        os.replace(tmp_path, os.path.join(cube_dir, name))
+        entries.append({'by': list(by), 'file': name, 'cells': len(cuboid)})
+    # Drop the cuboids of an earlier layout
+    for path in glob.glob(os.path.join(cube_dir, "*.arrow")):
+        if os.path.basename(path) not in {entry['file'] for entry in entries}:
+            os.remove(path)
+    write_atomic(os.path.join(cube_dir, "sketches.pkl"), pickle.dumps(sketches))
+    cells = sum(entry['cells'] for entry in entries)
+    manifest = {'settings': get_cube_settings(filename), 'rows': len(frame), 'cells': cells, 'cuboids': entries}
+    write_atomic(os.path.join(cube_dir, "manifest.json"), json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+    print(f"✅ cube: {len(frame)} 行 -> {len(entries)} 个 cuboid, 共 {cells} 个单元格 ({cube_dir})")
+    return cube_dir
+
+
+def load_cube(filename):
+    """
+    The input's cuboids and sketches, or None when there is none or it is stale.
+
+    Returns:
+        ({group keys: cuboid DataFrame}, {aggregation name: result}) or None
+    """
+    cube_dir = get_cube_dir(filename)
+    manifest_path = os.path.join(cube_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    # JSON round trip so tuples / lists in the settings compare equal
+    if manifest['settings'] != json.loads(json.dumps(get_cube_settings(filename))):
+        print("⚠️ 输入或配置已变化，cube 需要重建")
+        return None
+    cuboids = {tuple(entry['by']): feather.read_table(os.path.join(cube_dir, entry['file'])).to_pandas()
+               for entry in manifest['cuboids']}
+    with open(os.path.join(cube_dir, "sketches.pkl"), 'rb') as f:
+        sketches = pickle.load(f)
+    return cuboids, sketches
+
+
+def query_cube(cube: pd.DataFrame, agg):
+    """
+    Result of an additive aggregation from the cells of its cuboid, as run_aggregations returns it.
+
+    Cells are re-aggregated by the aggregation's keys: sums, counts and
+    sizes of the cells add up to those of their rows.
+    """
+    columns = {out: measure_name(None if func == 'size' else col, func) for out, (col, func) in agg.aggs.items()}
+    if not agg.by:
+        return {out: cube[col].sum() for out, col in columns.items()}
+    # observed=False keeps the empty bins of categorical keys (price / rank bins)
+    table = cube.groupby(list(agg.by), observed=False)[list(dict.fromkeys(columns.values()))].sum()
+    result = pd.DataFrame({out: table[col] for out, col in columns.items()})
+    if agg.top:
+        return SpaceSaving.from_table(result, agg.by, agg.aggs, *agg.top)
+    return result
+
+
+def run_cube(filename) -> tuple:
+    """
+    Answer the full dashboard from the input's cube, building it first when it is missing or stale.
+
+    Every additive aggregation (see is_additive) is read from its cuboid
+    and the whole-input sketches complete the dashboard, which then
+    matches a scan of the input.
+
+    There are no filtered slices: the other engines apply --filter before
+    preprocessing, so the avg_price / visit_city fill values and the RFM
+    terciles are those of the matching rows, while the cube cells hold
+    the whole input's (see generate_dashboard.py, which refuses --cube
+    with --filter).
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    loaded = load_cube(filename)
+    if loaded is None:
+        build_cube(filename)
+        loaded = load_cube(filename)
+    cuboids, sketches = loaded
+
+    results = {}
+    for agg in module_aggregations(ANALYSIS_MODULES):
+        if is_additive(agg):
+            # No cuboid when the input did not have the aggregation's columns, like run_aggregations skips it
+            if tuple(agg.by) in cuboids:
+                results[agg.name] = query_cube(cuboids[tuple(agg.by)], agg)
+        elif agg.name in sketches:
+            results[agg.name] = sketches[agg.name]
+    return finalize_states(build_states(ANALYSIS_MODULES, results))
@@ -10,15 +10,226 @@
 
 import dask.dataframe as dd
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pyarrow.csv as pacsv
+import contextlib
+import datetime
+import functools
+import glob
+import io
+import json
+import operator
 import os
-from .config import DATA_PATH, PARTITIONS, COLUMN_NAMES
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .config import (DATA_PATH, PROCESSED_PATH, PARTITIONS, COLUMN_NAMES, COLUMN_DTYPES, PARQUET_DATASET,
+                     SCAN_RANGE_BYTES, ZONE_MAPS_FILE, get_column_dtypes, get_data_source, get_max_workers,
+                     get_csv_parser)
+from .analysis_modules import ANALYSIS_COLUMNS
+from .analysis_modules.aggregate import merge_states
 
-def load_data_dask(filename: str):
-    """Load large dataset using Dask."""
-    path = os.path.join(DATA_PATH, filename)
-    print(f"Loading with Dask: {path}")
+# Arrow equivalents of the COLUMN_DTYPES entries (categoricals are stored as plain strings)
+ARROW_TYPES = {
+    "int8": pa.int8(),
+    "int16": pa.int16(),
+    "int64": pa.int64(),
+    "Int32": pa.int32(),
+    "float32": pa.float32(),
+    "category": pa.string(),
+    str: pa.string(),
+}
+
+def get_arrow_schema(columns=None) -> pa.Schema:
+    """Arrow schema of the typed column schema, restricted to the given columns."""
+    return pa.schema([(col, ARROW_TYPES[dtype]) for col, dtype in get_column_dtypes(columns).items()])
+
+def get_partitioning() -> ds.Partitioning:
+    """Hive partitioning of the Parquet dataset (day / visit_city)."""
+    return ds.partitioning(pa.schema([("day", pa.date32()), ("visit_city", pa.int32())]), flavor="hive")
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast non-string columns of df to their COLUMN_DTYPES dtype (e.g. restore categoricals)."""
+    dtypes = {col: COLUMN_DTYPES[col] for col in df.columns
+              if col in COLUMN_DTYPES and COLUMN_DTYPES[col] is not str}
+    return df.astype(dtypes)
+
+# Compression of raw input files, by file suffix
+COMPRESSION_BY_SUFFIX = {".gz": "gzip", ".zip": "zip"}
+
+def resolve_input_files(filename) -> list:
+    """
+    Resolve input names relative to DATA_PATH into a list of file paths.
+
+    Args:
+        filename: A file name, a glob pattern ("D1_*.csv.gz"), a comma separated
+                  string of those, or a list of them. .gz and single-member .zip
+                  files are read directly without extracting them.
+    """
+    names = filename.split(',') if isinstance(filename, str) else list(filename)
+    paths = []
+    for name in names:
+        pattern = os.path.join(DATA_PATH, name.strip())
+        paths.extend(sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])
+    if not paths:
+        raise FileNotFoundError(f"No input files match {filename}")
+    return paths
+
+@contextlib.contextmanager
+def open_raw_file(path):
+    """
+    Input for the Arrow CSV reader: .gz is detected from the extension, .zip is read from its first member.
+
+    A context manager: the member stream and its archive are closed on exit.
+    """
+    if isinstance(path, str) and path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive, archive.open(archive.namelist()[0]) as member:
+            yield member
+    else:
+        yield path
+
+def arrow_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Convert an Arrow table of raw columns to pandas with the typed schema."""
+    # Keep nullable ints nullable instead of falling back to float64
+    return apply_schema(table.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get))
+
+def read_csv_arrow(path: str, usecols, nrows=None) -> pa.Table:
+    """
+    Parse one raw file with pyarrow's multithreaded CSV reader and the typed schema.
+
+    Args:
+        path: File path (.gz / .zip are decompressed on the fly)
+        usecols: Columns to parse
+        nrows: If provided, stop after this many rows (read batch by batch)
+    """
+    read_options = pacsv.ReadOptions(column_names=COLUMN_NAMES, use_threads=True)
+    convert_options = pacsv.ConvertOptions(column_types=get_arrow_schema(usecols),
+                                           include_columns=usecols,
+                                           strings_can_be_null=True)
+    if not nrows:
+        with open_raw_file(path) as source:
+            return pacsv.read_csv(source, read_options=read_options, convert_options=convert_options)
+
+    batches = []
+    rows = 0
+    with open_raw_file(path) as source:
+        for batch in pacsv.open_csv(source, read_options=read_options, convert_options=convert_options):
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= nrows:
+                break
+    return pa.Table.from_batches(batches, schema=get_arrow_schema(usecols)).slice(0, nrows)
+
+def read_csv_file(path, usecols, nrows=None) -> pd.DataFrame:
+    """
+    Parse one (possibly .gz/.zip compressed) raw file or file object with the typed schema and the configured parser.
+
+    The byte ranges of --parser=scan are parsed here with the C parser.
+    """
+    if get_csv_parser() == "pyarrow":
+        return arrow_to_pandas(read_csv_arrow(path, usecols, nrows=nrows))
+    return pd.read_csv(path, names=COLUMN_NAMES, header=None, usecols=usecols,
+                       dtype=get_column_dtypes(usecols), nrows=nrows)
+
+def split_byte_ranges(path: str, range_bytes: int = SCAN_RANGE_BYTES) -> list:
+    """
+    Split a raw file into newline-aligned (start, end) byte ranges of about range_bytes.
+
+    Every range starts at the beginning of a line and ends after a newline
+    (or at EOF), so each one parses on its own. Compressed files cannot be
+    split and come back as a single range.
+    """
+    size = os.path.getsize(path)
+    if COMPRESSION_BY_SUFFIX.get(os.path.splitext(path)[1]):
+        return [(0, size)]
+
+    bounds = [0]
+    with open(path, 'rb') as f:
+        while bounds[-1] + range_bytes < size:
+            # Finish the line that crosses the nominal boundary
+            f.seek(bounds[-1] + range_bytes - 1)
+            f.readline()
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def scan_byte_range(path: str, start: int, end: int, usecols, reducer):
+    """Worker task of scan_csv: parse one byte range with the typed schema and reduce it."""
+    if COMPRESSION_BY_SUFFIX.get(os.path.splitext(path)[1]):
+        return reducer(read_csv_file(path, usecols))
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return reducer(read_csv_file(io.BytesIO(data), usecols))
+
+def scan_csv(filename, reducer, usecols=None, combine=merge_states, workers=None, range_bytes=SCAN_RANGE_BYTES):
+    """
+    Parallel map-reduce over the raw CSV files without a Dask scheduler.
+
+    The files are split into newline-aligned byte ranges. Each range is
+    parsed in a worker process and reduced right there with reducer(df),
+    so only the small partial results travel back to the parent, where
+    they are folded with combine in file / range order.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (see resolve_input_files)
+        reducer: Picklable function (module level, or functools.partial of one)
+                 mapping a parsed DataFrame to a partial result, e.g. partial_metrics
+        usecols: Columns to parse, defaults to the columns the analysis modules need
+        combine: Function merging two partial results, defaults to merge_states
+        workers: Worker processes, defaults to config.get_max_workers()
+        range_bytes: Target byte range size, bounds the memory of each worker
+
+    Returns:
+        The combined result of all ranges
+    """
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    workers = workers or get_max_workers()
+    tasks = [(path, start, end) for path in resolve_input_files(filename)
+             for start, end in split_byte_ranges(path, range_bytes)]
+    print(f"Scanning {len(tasks)} byte ranges with {workers} worker(s)")
+
+    if workers <= 1 or len(tasks) == 1:
+        return functools.reduce(combine, (scan_byte_range(*task, usecols, reducer) for task in tasks))
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        paths, starts, ends = zip(*tasks)
+        partials = pool.map(scan_byte_range, paths, starts, ends,
+                            [usecols] * len(tasks), [reducer] * len(tasks))
+        return functools.reduce(combine, partials)
+
+def frame_list(df: pd.DataFrame) -> list:
+    """Reducer of scan_csv keeping the parsed frame (combined with operator.add into a list)."""
+    return [df]
+
+def load_data_dask(filename, usecols=None):
+    """
+    Load large dataset using Dask.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (see resolve_input_files)
+        usecols: Columns to parse, defaults to the columns the analysis modules need
+    """
+    paths = resolve_input_files(filename)
+    print(f"Loading with Dask: {', '.join(paths)}")
     # Assuming CSV has no header based on column definition usage
-    df = dd.read_csv(path, names=COLUMN_NAMES, header=None, blocksize="128MB")
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    # Dask infers compression from the first path only, so read each kind separately
+    groups = {}
+    for path in paths:
+        groups.setdefault(COMPRESSION_BY_SUFFIX.get(os.path.splitext(path)[1]), []).append(path)
+    frames = [
+        # Explicit dtypes: no sampling-based inference, predictable partition sizes.
+        # Compressed files cannot be split into byte blocks: one partition per file.
+        dd.read_csv(group, names=COLUMN_NAMES, header=None,
+                    blocksize=None if compression else "128MB", compression=compression,
+                    usecols=usecols, dtype=get_column_dtypes(usecols))
+        for compression, group in groups.items()
+    ]
+    df = frames[0] if len(frames) == 1 else dd.concat(frames)
     return df
 
 def to_pandas(df_dask):
@@ -26,28 +237,208 @@ def to_pandas(df_dask):
     print("Converting Dask DataFrame to pandas…")
     return df_dask.compute()
 
-def load_data_pandas(filename: str, sample_rows=None):
+def load_data_pandas(filename, sample_rows=None, usecols=None):
     """
     Load dataset using pandas directly (for smaller files or sampling).
     
     Args:
-        filename: Name of the file in DATA_PATH
+        filename: File name(s) or glob pattern in DATA_PATH (see resolve_input_files)
         sample_rows: If provided, only read this many rows (nrows)
+        usecols: Columns to parse, defaults to the columns the analysis modules need.
+                 Pass COLUMN_NAMES to load every column.
     """
-    path = os.path.join(DATA_PATH, filename)
-    print(f"Loading with Pandas: {path}")
+    usecols = list(usecols or ANALYSIS_COLUMNS)
     
     try:
-        if sample_rows:
-            df = pd.read_csv(path, names=COLUMN_NAMES, header=None, nrows=sample_rows)
+        paths = resolve_input_files(filename)
+        print(f"Loading with Pandas: {', '.join(paths)}")
+
+        if get_csv_parser() == "scan" and not sample_rows:
+            # Newline-aligned byte ranges parsed by the C parser on a process pool (see scan_csv)
+            frames = scan_csv(filename, frame_list, usecols=usecols, combine=operator.add)
+            # Per-range categoricals have different categories, restore them after concat
+            df = apply_schema(pd.concat(frames, ignore_index=True))
+        elif len(paths) == 1:
+            df = read_csv_file(paths[0], usecols, nrows=sample_rows)
         else:
-            df = pd.read_csv(path, names=COLUMN_NAMES, header=None)
+            # Decompress and parse the files concurrently. Threads rather than
+            # processes: zlib and the C parser release the GIL, and the parsed
+            # frames are not copied back from workers.
+            with ThreadPoolExecutor(max_workers=get_max_workers()) as pool:
+                frames = list(pool.map(lambda path: read_csv_file(path, usecols, nrows=sample_rows), paths))
+            # Per-file categoricals have different categories, restore them after concat
+            df = apply_schema(pd.concat(frames, ignore_index=True))
+            if sample_rows:
+                df = df.head(sample_rows)
         
         print(f"Loaded {len(df)} rows.")
         return df
-    except FileNotFoundError:
-        print(f"Error: File not found at {path}")
+    except FileNotFoundError as e:
+        print(f"Error: File not found: {e}")
         raise
     except Exception as e:
         print(f"Error loading data: {e}")
         raise
+
+def load_data_arrow(filename, usecols=None) -> pa.Table:
+    """
+    Load dataset as an Arrow table with pyarrow's multithreaded CSV reader.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (see resolve_input_files)
+        usecols: Columns to parse, defaults to the columns the analysis modules need
+    """
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    paths = resolve_input_files(filename)
+    print(f"Loading with Arrow: {', '.join(paths)}")
+    # Each read already uses all cores, so files are read one after another
+    table = pa.concat_tables([read_csv_arrow(path, usecols) for path in paths])
+    print(f"Loaded {table.num_rows} rows.")
+    return table
+
+def load_data_pandas_chunks(filename, chunksize: int, usecols=None):
+    """
+    Iterate over the dataset in chunks of `chunksize` rows (bounded memory).
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (see resolve_input_files),
+                  files are read one after another
+        chunksize: Rows per chunk
+        usecols: Columns to parse, defaults to the columns the analysis modules need
+
+    Yields:
+        pandas DataFrame chunks
+    """
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    for path in resolve_input_files(filename):
+        print(f"Streaming with Pandas: {path} (chunksize={chunksize})")
+        with pd.read_csv(path, names=COLUMN_NAMES, header=None, usecols=usecols,
+                         dtype=get_column_dtypes(usecols), chunksize=chunksize) as reader:
+            yield from reader
+
+# Comparison of each filter operator (see config.get_filters)
+FILTER_OPS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+def get_filter_columns(filters) -> list:
+    """Raw columns the filter predicates read (day is derived from times outside the Parquet dataset)."""
+    return list(dict.fromkeys('times' if col == 'day' else col for col, _, _ in filters or []))
+
+def filter_mask(df: pd.DataFrame, filters) -> pd.Series:
+    """Rows of df matching all (column, op, value) predicates; missing values never match."""
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if col == 'day' and 'day' not in df.columns:
+            column = pd.to_datetime(df['times'], unit='s').dt.normalize()
+            value = [pd.Timestamp(v) for v in value] if op == 'in' else pd.Timestamp(value)
+        else:
+            column = df[col]
+        matched = column.isin(value) if op == 'in' else FILTER_OPS[op](column, value)
+        mask &= matched.fillna(False).astype(bool) & column.notna()
+    return mask
+
+def range_may_match(low, high, op: str, value) -> bool:
+    """Whether a zone with values in [low, high] can hold a row matching the predicate."""
+    if op == 'in':
+        return any(low <= v <= high for v in value)
+    if op == '=':
+        return low <= value <= high
+    if op == '!=':
+        return not (low == high == value)
+    if op in ('>', '>='):
+        return FILTER_OPS[op](high, value)
+    return FILTER_OPS[op](low, value)
+
+def zone_may_match(zone: dict, filters) -> bool:
+    """Whether a row group of the zone map index can hold matching rows (unknown bounds always can)."""
+    for col, op, value in filters:
+        if col in zone['partition']:
+            low = high = zone['partition'][col]
+            if col == 'day' and low is not None:
+                low = high = datetime.date.fromisoformat(low)
+        elif col in zone['min']:
+            low, high = zone['min'][col], zone['max'][col]
+        else:
+            continue
+        if low is not None and not range_may_match(low, high, op, value):
+            return False
+    return True
+
+def prune_zone_maps(path: str, dataset: ds.FileSystemDataset, filters) -> ds.FileSystemDataset:
+    """
+    Dataset of only the row groups whose zone maps can match the filters
+    (see ingest.write_zone_maps); the whole dataset without an index.
+    """
+    zone_maps_path = os.path.join(path, ZONE_MAPS_FILE)
+    if not os.path.exists(zone_maps_path):
+        return dataset
+    with open(zone_maps_path) as f:
+        zones = json.load(f)['zones']
+
+    row_groups = {}
+    for zone in zones:
+        if zone_may_match(zone, filters):
+            row_groups.setdefault(os.path.normpath(os.path.join(path, zone['path'])), []).append(zone['row_group'])
+    fragments = [fragment.subset(row_group_ids=row_groups[os.path.normpath(fragment.path)])
+                 for fragment in dataset.get_fragments() if os.path.normpath(fragment.path) in row_groups]
+    print(f"Zone maps: reading {sum(map(len, row_groups.values()))} of {len(zones)} row groups "
+          f"in {len(fragments)} files")
+    return ds.FileSystemDataset(fragments, dataset.schema, dataset.format, dataset.filesystem)
+
+def load_data_parquet(usecols=None, filters=None):
+    """
+    Load the partitioned Parquet dataset written by the ingest stage.
+
+    Only the requested columns are read, and filters are pushed down to the
+    scan: partitions (day / visit_city) and row groups whose zone maps
+    cannot match are skipped without opening their files (see
+    prune_zone_maps), and the remaining rows are filtered by the scan.
+
+    Args:
+        usecols: Columns to read, defaults to the columns the analysis modules need
+        filters: pyarrow/pandas style predicates, e.g. [("visit_city", "=", 2)]
+    """
+    path = os.path.join(PROCESSED_PATH, PARQUET_DATASET)
+    print(f"Loading Parquet dataset: {path}")
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+
+    if not os.path.isdir(path):
+        print(f"Error: Parquet dataset not found at {path}, run src/scripts/ingest.py first")
+        raise FileNotFoundError(path)
+
+    dataset = ds.dataset(path, format="parquet", partitioning=get_partitioning())
+    if filters:
+        dataset = prune_zone_maps(path, dataset, filters)
+    expression = pq.filters_to_expression(filters) if filters else None
+    table = dataset.to_table(columns=usecols, filter=expression)
+    df = arrow_to_pandas(table)
+
+    print(f"Loaded {len(df)} rows.")
+    return df
+
+def load_data(filename: str, usecols=None, filters=None):
+    """
+    Load data from the configured source (see config.get_data_source).
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (ignored for the Parquet source)
+        usecols: Columns to load, defaults to the columns the analysis modules need
+        filters: (column, op, value) predicates (see config.get_filters); the Parquet
+                 source skips what cannot match, CSV files are filtered after parsing
+    """
+    if get_data_source() == "parquet":
+        return load_data_parquet(usecols=usecols, filters=filters)
+    if not filters:
+        return load_data_pandas(filename, usecols=usecols)
+
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    df = load_data_pandas(filename, usecols=usecols + [col for col in get_filter_columns(filters) if col not in usecols])
+    df = df.loc[filter_mask(df, filters), [col for col in df.columns if col in usecols]].reset_index(drop=True)
+    print(f"Filtered to {len(df)} rows.")
+    return df
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: DuckDB engine: preprocess_eleme_data and the analysis modules' declared derived
+              columns and aggregations as SQL over the raw CSV or Parquet files, run in-process
+              by DuckDB (vectorized, multi-core, spilling to disk beyond memory)
+@Version: 1.0
+"""
+
+import datetime
+import math
+import os
+
+import duckdb
+
+from .config import (COLUMN_NAMES, COLUMN_DTYPES, PROCESSED_PATH, PARQUET_DATASET, get_data_source, get_filters,
+                     get_rfm_scoring, get_segment_rules)
+from .data_loader import COMPRESSION_BY_SUFFIX, get_filter_columns, read_csv_arrow, resolve_input_files
+from .analysis_modules import ANALYSIS_COLUMNS, ANALYSIS_MODULES, finalize_states
+from .analysis_modules.derived import PRICE_BINS, PRICE_LABELS, RANK_BINS, RANK_LABELS, PERIOD_BY_HOUR
+from .analysis_modules.engine import build_states, collect_results, module_aggregations, plan_queries
+from .analysis_modules.rfm import RFM_COLUMNS, SCORE_COLUMNS, QuantileRfmScorer
+from .analysis_modules.sketches import TDigest
+
+# SQL equivalents of the COLUMN_DTYPES entries (categoricals are read as plain strings)
+SQL_TYPES = {
+    "int8": "TINYINT",
+    "int16": "SMALLINT",
+    "int64": "BIGINT",
+    "Int32": "INTEGER",
+    "float32": "FLOAT",
+    "category": "VARCHAR",
+    str: "VARCHAR",
+}
+
+# Spill directory for data larger than memory
+DUCKDB_TEMP_PATH = os.path.join(PROCESSED_PATH, "duckdb_tmp")
+
+def quote(name: str) -> str:
+    """SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+def literal(value) -> str:
+    """SQL literal of a Python string, date or number."""
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, datetime.date):
+        return f"DATE '{value.isoformat()}'"
+    return repr(value)
+
+def filter_sql(filters, day_column: bool) -> str:
+    """WHERE condition of the (column, op, value) filter predicates (see config.get_filters)."""
+    conditions = []
+    for col, op, value in filters:
+        if col == 'day':
+            column = "CAST(day AS DATE)" if day_column else "CAST(make_timestamp(times * 1000000) AS DATE)"
+        else:
+            column = quote(col)
+        if op == 'in':
+            conditions.append(f"{column} IN ({', '.join(literal(v) for v in value)})")
+        else:
+            conditions.append(f"{column} {'<>' if op == '!=' else op} {literal(value)}")
+    return " AND ".join(conditions) or "true"
+
+def get_columns(con, relation: str) -> dict:
+    """{column: SQL type} of a table or view."""
+    rel = con.sql(f"SELECT * FROM {relation} LIMIT 0")
+    return {col: str(sql_type) for col, sql_type in zip(rel.columns, rel.types)}
+
+def raw_sql(con, filename, usecols: list, filters=None) -> str:
+    """
+    SELECT over the configured source (see config.get_data_source) with the
+    typed schema and the filter predicates, which DuckDB pushes into the
+    scans (Parquet partitions and row groups that cannot match are skipped).
+    """
+    filters = filters or []
+    columns = {col: SQL_TYPES[COLUMN_DTYPES[col]] for col in usecols}
+    select = ", ".join(f"CAST({quote(col)} AS {sql_type}) AS {quote(col)}" for col, sql_type in columns.items())
+    if get_data_source() == "parquet":
+        path = os.path.join(PROCESSED_PATH, PARQUET_DATASET)
+        if not os.path.isdir(path):
+            print(f"Error: Parquet dataset not found at {path}, run src/scripts/ingest.py first")
+            raise FileNotFoundError(path)
+        # Partition columns (day / visit_city) come from the hive paths
+        return f"SELECT {select} FROM read_parquet({literal(os.path.join(path, '**', '*.parquet'))}, " \
+               f"hive_partitioning = true) WHERE {filter_sql(filters, True)}"
+
+    schema = "{" + ", ".join(f"{literal(col)}: {literal(SQL_TYPES[COLUMN_DTYPES[col]])}" for col in COLUMN_NAMES) + "}"
+    parts = []
+    for i, path in enumerate(resolve_input_files(filename)):
+        if path.endswith('.zip'):
+            # DuckDB cannot read zip archives: the Arrow reader parses them
+            con.register(f"zip_input_{i}", read_csv_arrow(path, list(dict.fromkeys(usecols + get_filter_columns(filters)))))
+            parts.append(f"SELECT {select} FROM zip_input_{i} WHERE {filter_sql(filters, False)}")
+        else:
+            compression = COMPRESSION_BY_SUFFIX.get(os.path.splitext(path)[1], 'none')
+            parts.append(f"SELECT {select} FROM read_csv({literal(path)}, header = false, auto_detect = false, "
+                         f"columns = {schema}, compression = {literal(compression)}) WHERE {filter_sql(filters, False)}")
+    return " UNION ALL ".join(parts)
+
+def preprocess_sql(columns: list) -> str:
+    """
+    preprocess_eleme_data as SQL over the `raw` view: the same missing
+    value fills, datetime column and label filter.
+    """
+    replace = []
+    # Fill visit_city NULLs with 0 (Unknown)
+    if 'visit_city' in columns:
+        replace.append("CAST(COALESCE(visit_city, 0) AS INTEGER) AS visit_city")
+    # Fill average price NULLs with the mean of all rows (before the label filter)
+    if 'avg_price' in columns:
+        replace.append("COALESCE(CAST(avg_price AS DOUBLE), (SELECT avg(CAST(avg_price AS DOUBLE)) FROM raw)) AS avg_price")
+    select = f"* REPLACE ({', '.join(replace)})" if replace else "*"
+    # Convert Unix timestamp to datetime
+    if 'times' in columns:
+        select += ", make_timestamp(times * 1000000) AS datetime"
+    # Ensure label is 0 or 1
+    return f"SELECT {select} FROM raw WHERE label IN (0, 1)"
+
+def connect(filename, usecols=None, filters=None):
+    """
+    In-process DuckDB connection over the input files, also for ad-hoc SQL (see scripts/query.py).
+
+    Views / tables:
+        raw: the typed raw columns of the input files
+        impressions: preprocess_eleme_data output, materialized once (in file
+                     order, compressed, spilled to DUCKDB_TEMP_PATH beyond memory)
+                     so the dashboard queries do not parse the files again
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (ignored for the Parquet source)
+        usecols: Raw columns, defaults to the columns the analysis modules need
+        filters: (column, op, value) predicates restricting raw (see config.get_filters)
+    """
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    os.makedirs(DUCKDB_TEMP_PATH, exist_ok=True)
+    con = duckdb.connect(config={'temp_directory': DUCKDB_TEMP_PATH, 'preserve_insertion_order': True})
+    con.execute(f"CREATE VIEW raw AS {raw_sql(con, filename, usecols, filters)}")
+    con.execute(f"CREATE TEMP TABLE impressions AS {preprocess_sql(usecols)}")
+    return con
+
+def cut(column: str, bins: list, labels: list) -> str:
+    """pd.cut: labels of the right-closed bins, NULL outside them."""
+    cases = []
+    for low, high, label in zip(bins[:-1], bins[1:], labels):
+        upper = "" if math.isinf(high) else f" AND {column} <= {literal(high)}"
+        cases.append(f"WHEN {column} > {literal(low)}{upper} THEN {literal(label)}")
+    return f"CASE {' '.join(cases)} END"
+
+def extract_hour(con, relation: str, columns: dict) -> str:
+    if 'datetime' in columns:
+        return "hour(datetime)"
+    if 'hours' in columns:
+        return "hours"
+    return "0"
+
+def time_period(con, relation: str, columns: dict) -> str:
+    cases = " ".join(f"WHEN {hour} THEN {literal(period)}" for hour, period in enumerate(PERIOD_BY_HOUR[:24]))
+    return f"CASE hour_extracted {cases} ELSE {literal(PERIOD_BY_HOUR[24])} END"
+
+def rfm_scores(con, relation: str, columns: dict) -> tuple:
+    """
+    score_rfm as SQL. Statistics queries run first: the value counts of the
+    RFM columns (their t-digests) for sketch scoring, their non-null counts
+    for exact scoring, which ranks rows in file order (row_index) like
+    rank(method='first').
+    """
+    names = list(RFM_COLUMNS.values())
+    if get_rfm_scoring() == 'sketch':
+        digests = {}
+        for col in names:
+            counts = con.sql(f"SELECT CAST({col} AS DOUBLE) AS v, count(*) AS n FROM {relation} "
+                             f"WHERE {col} IS NOT NULL AND NOT isnan({col}) GROUP BY 1 ORDER BY 1").df()
+            digests[col] = TDigest.from_counts(counts['v'], counts['n'])
+        scorer = QuantileRfmScorer(digests)
+        if any(count <= 1 for count in scorer.counts.values()):
+            return "1.0", "1.0"
+        # searchsorted(cuts, side='left') + 1: one plus the number of cut points below the value
+        return tuple(f"CASE WHEN {col} IS NULL THEN NULL ELSE 1.0 + CAST(CAST({col} AS DOUBLE) > {literal(float(cuts[0]))} AS DOUBLE) "
+                     f"+ CAST(CAST({col} AS DOUBLE) > {literal(float(cuts[1]))} AS DOUBLE) END"
+                     for col, cuts in ((col, scorer.cuts[col]) for col in names))
+
+    counts = con.sql(f"SELECT {', '.join(f'count({col})' for col in names)} FROM {relation}").fetchone()
+    # Same fallback as score_rfm when there is too little data for 3 bins
+    if any(n <= 1 for n in counts):
+        return "1.0", "1.0"
+    # qcut(q=3) bin edges of the ranks 1..n (NULLs sort last, after every ranked row)
+    scores = []
+    for col, n in zip(names, counts):
+        rank = f"row_number() OVER (ORDER BY {col} NULLS LAST, row_index)"
+        scores.append(f"CASE WHEN {col} IS NULL THEN NULL WHEN {rank} <= {1 + (n - 1) / 3!r} THEN 1.0 "
+                      f"WHEN {rank} <= {1 + 2 * (n - 1) / 3!r} THEN 2.0 ELSE 3.0 END")
+    return tuple(scores)
+
+def assign_segments(con, relation: str, columns: dict) -> str:
+    """user.assign_segments as SQL: the first matching rule of the segment rule table wins."""
+    table = get_segment_rules()
+    cases = []
+    for rule in table['rules']:
+        condition = " AND ".join(f"{quote(col)} IN ({', '.join(literal(v) for v in values)})"
+                                 for col, values in rule['when'].items()) or "true"
+        cases.append(f"WHEN {condition} THEN {literal(rule['segment'])}")
+    return f"CASE {' '.join(cases)} ELSE {literal(table['default'])} END" if cases else literal(table['default'])
+
+# SQL expressions of the registered derived columns (derived.DERIVED and the module
+# specific ones), functions of (connection, relation so far, its {column: type})
+SQL_DERIVED = {
+    'label64': lambda con, relation, columns: "CAST(label AS BIGINT)",
+    'price64': lambda con, relation, columns: "CAST(avg_price AS DOUBLE)",
+    'amt64': lambda con, relation, columns: "CAST(total_amt_30 AS DOUBLE)",
+    'ord64': lambda con, relation, columns: "CAST(ord_30 AS DOUBLE)",
+    'cvr': lambda con, relation, columns:
+        "CASE WHEN ctr_30 > 0 THEN CAST(ord_30 AS DOUBLE) / CAST(ctr_30 AS DOUBLE) ELSE 0.0 END",
+    'user_cvr': lambda con, relation, columns:
+        "CASE WHEN ctr_30 > 0 THEN CAST(ord_30 AS DOUBLE) / CAST(ctr_30 AS DOUBLE) END",
+    'hour_extracted': extract_hour,
+    'is_weekend': lambda con, relation, columns:
+        "COALESCE(weekdays IN (5, 6), false)" if 'weekdays' in columns else None,
+    'time_period': time_period,
+    'price_bin': lambda con, relation, columns: cut('avg_price', PRICE_BINS, PRICE_LABELS),
+    'rank_bin': lambda con, relation, columns: cut('rank_7', RANK_BINS, RANK_LABELS),
+    SCORE_COLUMNS: rfm_scores,
+    'segment': assign_segments,
+}
+
+def create_analysis_table(con, *registries) -> dict:
+    """
+    engine.derive_columns in SQL: materialize `analysis`, impressions plus the
+    derived columns of the registries, each with its SQL_DERIVED expression.
+
+    Returns:
+        {column: SQL type} of the analysis table
+    """
+    sql = "SELECT *, rowid AS row_index FROM impressions"
+    con.execute(f"CREATE TEMP VIEW analysis_0 AS {sql}")
+    relation, step = "analysis_0", 0
+    for registry in registries:
+        for names in registry:
+            columns = get_columns(con, relation)
+            derived = names if isinstance(names, tuple) else (names,)
+            if all(name in columns for name in derived):
+                continue
+            exprs = SQL_DERIVED[names](con, relation, columns)
+            if exprs is None:
+                continue
+            exprs = exprs if isinstance(exprs, tuple) else (exprs,)
+            step += 1
+            select = ", ".join(f"{expr} AS {quote(name)}" for name, expr in zip(derived, exprs))
+            con.execute(f"CREATE TEMP VIEW analysis_{step} AS SELECT *, {select} FROM {relation}")
+            relation = f"analysis_{step}"
+    con.execute(f"CREATE TEMP TABLE analysis AS SELECT * EXCLUDE (row_index) FROM {relation}")
+    return get_columns(con, "analysis")
+
+def agg_sql(col: str, func: str, columns: dict) -> str:
+    """SQL of an engine aggregation func, with pandas' result types."""
+    if func == 'size':
+        return "count(*)"
+    if func == 'count':
+        return f"count({quote(col)})"
+    if func == 'sum':
+        # Sums of no rows are 0 as in pandas; integer sums are HUGEINT in DuckDB
+        if columns[col] in ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'BOOLEAN'):
+            return f"CAST(COALESCE(sum({quote(col)}), 0) AS BIGINT)"
+        return f"COALESCE(sum({quote(col)}), 0.0)"
+    return f"{func}({quote(col)})"
+
+def run_queries(con, queries: dict, columns: dict) -> dict:
+    """
+    Answer engine.plan_queries over the analysis table.
+
+    Returns:
+        {query key: pandas DataFrame} for engine.collect_results
+    """
+    frames = {}
+    for key, (kind, by, payload) in queries.items():
+        keys = [quote(col) for col in by]
+        where = " AND ".join(f"{col} IS NOT NULL" for col in keys)
+        if kind == 'distinct':
+            sql = f"SELECT DISTINCT {', '.join(keys + [quote(payload)])} FROM analysis"
+        elif kind == 'counts':
+            value = f"CAST({quote(payload)} AS DOUBLE)"
+            where = " AND ".join(filter(None, [where, f"{value} IS NOT NULL AND NOT isnan({value})"]))
+            sql = f"SELECT {', '.join(keys)}{', ' if keys else ''}{value} AS {quote(payload)}, count(*) AS len " \
+                  f"FROM analysis WHERE {where} GROUP BY ALL"
+        else:
+            select = ", ".join(keys + [f"{agg_sql(col, func, columns)} AS {quote(f'{col}:{func}')}" for col, func in payload])
+            sql = f"SELECT {select} FROM analysis" + (f" WHERE {where} GROUP BY ALL" if keys else "")
+        if kind == 'distinct' and keys:
+            sql += f" WHERE {where}"
+        frames[key] = con.sql(sql).df()
+    return frames
+
+def run_duckdb(filename) -> tuple:
+    """
+    Run the full dashboard (preprocessing and all ANALYSIS_MODULES) as SQL on an in-process DuckDB.
+
+    The input is parsed once into the impressions table; the modules'
+    declared DERIVED_COLUMNS become the analysis table and their
+    AGGREGATIONS one query each (see engine.plan_queries). Only the grouped
+    results reach pandas, where each module builds and finalizes its
+    state, so the JSON matches the pandas engine.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    print("🦆 DuckDB SQL 执行...")
+    con = connect(filename, filters=get_filters())
+    try:
+        columns = create_analysis_table(con, *[module.DERIVED_COLUMNS for module in ANALYSIS_MODULES])
+        aggregations = module_aggregations(ANALYSIS_MODULES)
+        frames = run_queries(con, plan_queries(aggregations, list(columns)), columns)
+    finally:
+        con.close()
+    return finalize_states(build_states(ANALYSIS_MODULES, collect_results(aggregations, frames)))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Memory-mapped Arrow IPC (Feather) cache of the preprocessed frame,
+              shared by all generate_* scripts
+@Version: 1.1
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .config import PROCESSED_PATH, PARQUET_DATASET, get_data_source, get_filters, has_cli_flag, use_id_encoding
+from .data_loader import load_data, resolve_input_files
+from .id_encoding import encode_ids, get_dictionary_token, restore_codes
+from .preprocess import preprocess_eleme_data, PREPROCESS_VERSION
+from .analysis_modules import ANALYSIS_COLUMNS
+
+# Bytes hashed at the head, middle and tail of each input file
+FINGERPRINT_BLOCK = 1024 * 1024
+
+def fingerprint_file(path: str) -> dict:
+    """
+    Cheap content fingerprint of a file: size, mtime and a hash of sampled blocks.
+
+    Hashing the head, middle and tail instead of the whole file keeps the
+    check fast on multi-GB inputs while still catching rewritten files.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for offset in (0, stat.st_size // 2, max(stat.st_size - FINGERPRINT_BLOCK, 0)):
+            f.seek(offset)
+            digest.update(f.read(FINGERPRINT_BLOCK))
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+
+def get_input_paths(filename) -> list:
+    """Files the configured data source reads for filename (raw CSVs or the Parquet dataset files)."""
+    if get_data_source() == "parquet":
+        return sorted(glob.glob(os.path.join(PROCESSED_PATH, PARQUET_DATASET, "**", "*.parquet"), recursive=True))
+    return resolve_input_files(filename)
+
+def get_input_fingerprint(filename) -> list:
+    """Fingerprints of all input files behind filename."""
+    return [fingerprint_file(path) for path in get_input_paths(filename)]
+
+def get_cache_path(filename) -> str:
+    """Cache file of the preprocessed frame for the current inputs and preprocess version."""
+    key = json.dumps({
+        'inputs': get_input_fingerprint(filename),
+        'source': get_data_source(),
+        'columns': ANALYSIS_COLUMNS,
+        'preprocess_version': PREPROCESS_VERSION,
+        'filters': get_filters(),
+        # Cached codes are only valid with the dictionaries that issued them
+        'id_dictionary': get_dictionary_token() if use_id_encoding() else None
+    }, sort_keys=True, default=str)
+    # Filter sets are part of the name: write_cache only replaces stale caches of the same slice
+    name = str(filename) + "".join(f"_{col}_{op}_{value}" for col, op, value in get_filters())
+    name = "".join(c if c.isalnum() else "_" for c in name)
+    return os.path.join(PROCESSED_PATH, f"preprocessed-{name}-{hashlib.sha1(key.encode()).hexdigest()[:16]}.arrow")
+
+def project(columns: list, usecols) -> list:
+    """Cached columns matching usecols, plus the derived `datetime` when its source `times` is requested."""
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    if 'times' in usecols:
+        usecols.append('datetime')
+    return [col for col in usecols if col in columns]
+
+def write_cache(df: pd.DataFrame, path: str):
+    """Write the frame uncompressed (memory-mappable) and drop stale caches of the same input."""
+    prefix = path.rsplit('-', 1)[0]
+    for stale in glob.glob(prefix + "-*.arrow"):
+        os.remove(stale)
+    os.makedirs(PROCESSED_PATH, exist_ok=True)
+    tmp_path = path + ".tmp"
+    feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+def load_preprocessed(filename, usecols=None) -> pd.DataFrame:
+    """
+    Load the preprocessed frame, parsing and preprocessing only on a cache miss.
+
+    The cache holds preprocess_eleme_data output for ANALYSIS_COLUMNS under
+    PROCESSED_PATH, with the id columns dictionary encoded (see
+    id_encoding.encode_ids). On a hit it is memory-mapped, and numeric
+    columns without nulls are handed to pandas zero-copy, so running the
+    generate_* scripts back to back pays the parse cost once. Rows are
+    restricted to the --filter predicates (see config.get_filters) before
+    preprocessing, each filter set has its own cache.
+    Pass --no-frame-cache (NO_FRAME_CACHE=1) to bypass it.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH
+        usecols: Raw columns needed, defaults to the columns the analysis modules need
+    """
+    if has_cli_flag('no-frame-cache', 'NO_FRAME_CACHE'):
+        return encode_ids(preprocess_eleme_data(load_data(filename, usecols=usecols, filters=get_filters())))
+
+    path = get_cache_path(filename)
+    if os.path.exists(path):
+        print(f"Loading preprocessed cache: {path}")
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        table = table.select(project(table.column_names, usecols))
+        df = restore_codes(table.to_pandas(split_blocks=True))
+        print(f"Loaded {len(df)} rows.")
+        return df
+
+    df = encode_ids(preprocess_eleme_data(load_data(filename, usecols=ANALYSIS_COLUMNS, filters=get_filters())))
+    write_cache(df, path)
+    print(f"Preprocessed cache written: {path}")
+    return df[project(df.columns, usecols)]
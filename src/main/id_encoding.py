@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Dictionary encoding of the hashed id columns (user_id, item_id, shop_id, geohashes)
+              into integer codes, with persistent append-only dictionaries under PROCESSED_PATH
+              so codes stay stable across runs and input files
+@Version: 1.1
+"""
+
+import glob
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .config import PROCESSED_PATH, ID_ENCODED_COLUMNS, use_id_encoding
+
+# One directory of segment files per encoded column
+ID_DICTIONARY_PATH = os.path.join(PROCESSED_PATH, "id_dictionary")
+# Random token of the dictionary directory: codes of one dictionary mean nothing in another
+ID_DICTIONARY_TOKEN = "dictionary.token"
+
+class IdDictionary:
+    """
+    Append-only dictionary of one id column: code i stands for values[i].
+
+    Each append writes a segment file holding only the new values, so a
+    code once handed out never changes. The 64-bit hash of every value
+    (as sketches.hash_series hashes the strings) is stored next to it, so
+    HyperLogLog sketches over codes count exactly like over the ids.
+    Several processes may encode at the same time: segment numbers are
+    claimed with an exclusive create (see append), and segments appended
+    by other processes are reloaded when needed.
+    """
+
+    def __init__(self, column: str):
+        self.column = column
+        self.path = os.path.join(ID_DICTIONARY_PATH, column)
+        self.segments = 0
+        self.values = pd.Index([], dtype=str)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def reload(self):
+        """Read the segments written since the last load (by this or other processes)."""
+        segments = sorted(glob.glob(os.path.join(self.path, "*.arrow")))[self.segments:]
+        if not segments:
+            return
+        table = pa.concat_tables([feather.read_table(path) for path in segments])
+        values = pd.Index(table['value'].to_pandas())
+        self.values = self.values.append(values) if len(self.values) else values
+        self.hashes = np.concatenate([self.hashes, table['hash'].to_numpy()])
+        self.segments += len(segments)
+
+    def append(self, values: pd.Index) -> np.ndarray:
+        """
+        Codes of values, adding the ones not in the dictionary yet as one segment.
+
+        The segment is written to a temporary file, then published under the
+        next segment number with os.link, which fails when that file exists
+        (an exclusive create, like O_EXCL): if another process appended
+        first, its segments are reloaded and only the values still missing
+        are written, under the next free number. A segment is never
+        overwritten, so codes other processes handed out stay valid.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        while True:
+            codes = self.values.get_indexer(values)
+            unseen = codes < 0
+            if not unseen.any():
+                return codes
+            new = values[unseen]
+            hashes = pd.util.hash_pandas_object(pd.Series(new), index=False).to_numpy()
+            path = os.path.join(self.path, f"{self.segments:06d}.arrow")
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            feather.write_feather(pa.table({'value': pa.array(new, type=pa.string()), 'hash': hashes}), tmp_path)
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                self.reload()
+                continue
+            finally:
+                os.remove(tmp_path)
+            start = len(self.values)
+            self.segments += 1
+            self.values = self.values.append(pd.Index(new))
+            self.hashes = np.concatenate([self.hashes, hashes])
+            codes[unseen] = np.arange(start, len(self.values))
+            return codes
+
+    def encode(self, series: pd.Series) -> pd.Series:
+        """
+        Codes of the ids in series, adding unseen ids to the dictionary.
+
+        int32 codes (int64 beyond 2^31 ids); missing ids stay missing in a
+        nullable Int32 / Int64 column.
+        """
+        inverse, uniques = pd.factorize(series)
+        codes = self.append(uniques)
+        dtype = np.int32 if len(self.values) < 2 ** 31 else np.int64
+        codes = codes.astype(dtype)[inverse]
+        missing = inverse < 0
+        if missing.any():
+            codes = pd.arrays.IntegerArray(codes, missing)
+        return pd.Series(codes, index=series.index, name=series.name)
+
+    def ensure(self, codes: np.ndarray) -> np.ndarray:
+        """codes, after reloading the segments of other processes if some are newer than this dictionary."""
+        if len(codes) and codes.max() >= len(self.values):
+            self.reload()
+        return codes
+
+    def decode(self, codes) -> pd.Index:
+        """Ids of the codes."""
+        codes = self.ensure(np.asarray(codes, dtype=np.int64))
+        return self.values[codes]
+
+# Loaded dictionaries of this process, by column
+_dictionaries = {}
+
+def get_dictionary(column: str) -> IdDictionary:
+    if column not in _dictionaries:
+        _dictionaries[column] = IdDictionary(column)
+    return _dictionaries[column]
+
+def get_dictionary_token() -> str:
+    """Token of the dictionary directory (created with it), for caches of encoded frames."""
+    path = os.path.join(ID_DICTIONARY_PATH, ID_DICTIONARY_TOKEN)
+    if not os.path.exists(path):
+        os.makedirs(ID_DICTIONARY_PATH, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        try:
+            # Exclusive create: the first process to create the token wins
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path) as f:
+        return f.read().strip()
+
+def is_encoded(series: pd.Series) -> bool:
+    """Whether series holds dictionary codes of an id column."""
+    return series.name in ID_ENCODED_COLUMNS and pd.api.types.is_integer_dtype(series.dtype)
+
+def encode_ids(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replace the ID_ENCODED_COLUMNS of df with their dictionary codes
+    (unchanged with --no-id-encoding). Groupbys, nunique and sketches then
+    run on integer keys, and the frame holds no id strings.
+    """
+    if not use_id_encoding():
+        return df
+    columns = {col: get_dictionary(col).encode(df[col]) for col in ID_ENCODED_COLUMNS
+               if col in df.columns and not is_encoded(df[col])}
+    return df.assign(**columns)
+
+def restore_codes(df: pd.DataFrame) -> pd.DataFrame:
+    """Code columns with missing ids read back from Arrow (float64 in pandas) as nullable codes."""
+    columns = {col: df[col].astype('Int64') for col in ID_ENCODED_COLUMNS
+               if col in df.columns and pd.api.types.is_float_dtype(df[col].dtype)}
+    return df.assign(**columns) if columns else df
+
+def decode_ids(column: str, keys) -> pd.Index:
+    """Ids of group keys of column for display: codes are decoded, string keys pass through."""
+    keys = pd.Index(keys)
+    if column in ID_ENCODED_COLUMNS and pd.api.types.is_integer_dtype(keys.dtype):
+        return get_dictionary(column).decode(keys)
+    return keys
+
+def hash_codes(series: pd.Series) -> np.ndarray:
+    """Hashes of the ids behind the non-null codes of series (see sketches.hash_series)."""
+    dictionary = get_dictionary(series.name)
+    codes = dictionary.ensure(series.dropna().to_numpy(dtype=np.int64))
+    return dictionary.hashes[codes]
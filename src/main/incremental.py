@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Incremental append mode: the analysis modules' partial states are persisted
+              under PROCESSED_PATH with the input files already processed, and new files
+              are streamed and merged into them
+@Version: 1.0
+"""
+
+import json
+import os
+import pickle
+import time
+
+from .config import (PROCESSED_PATH, get_hll_precision, get_max_workers, get_rfm_scoring, get_segment_rules,
+                     get_tdigest_compression, get_topk_capacity)
+from .data_loader import resolve_input_files
+from .frame_cache import fingerprint_file
+from .preprocess import PREPROCESS_VERSION
+from .streaming import collect_stats, stream_states
+from .analysis_modules import finalize_states
+from .analysis_modules.aggregate import merge_states
+
+# Persisted states: manifest.json (processed files, settings) + states.pkl
+STATE_PATH = os.path.join(PROCESSED_PATH, "incremental")
+# Bump whenever the layout of the module states changes; forces a rebuild
+STATE_VERSION = 2
+
+
+def get_state_settings() -> dict:
+    """Settings the persisted states depend on; any change forces a rebuild."""
+    return {
+        'state_version': STATE_VERSION,
+        'preprocess_version': PREPROCESS_VERSION,
+        'rfm_scoring': get_rfm_scoring(),
+        'hll_precision': get_hll_precision(),
+        'tdigest_compression': get_tdigest_compression(),
+        'topk_capacity': get_topk_capacity(),
+        'segment_rules': get_segment_rules()
+    }
+
+
+def load_manifest():
+    """Manifest of the persisted states, or None when there is none or it was built with other settings."""
+    manifest_path = os.path.join(STATE_PATH, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    # JSON round trip so tuples / lists in the settings compare equal
+    if manifest['settings'] != json.loads(json.dumps(get_state_settings())):
+        print("⚠️ 增量状态的配置已变化，重新全量计算")
+        return None
+    return manifest
+
+
+def load_store():
+    """
+    Persisted states, or None (see load_manifest).
+
+    Returns:
+        {'files': [fingerprint], 'states': {module name: state}, 'stats': global statistics}
+    """
+    manifest = load_manifest()
+    if manifest is None:
+        return None
+    with open(os.path.join(STATE_PATH, "states.pkl"), 'rb') as f:
+        store = pickle.load(f)
+    store['files'] = manifest['files']
+    return store
+
+
+def write_atomic(path: str, data: bytes):
+    """Write data to path through a temporary file, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_store(files: list, states: dict, stats: dict):
+    """Write the states, then the manifest, so a manifest never lists files missing from the states."""
+    os.makedirs(STATE_PATH, exist_ok=True)
+    stats = {key: stats[key] for key in ('price_sum', 'price_count', 'rfm_stats')}
+    write_atomic(os.path.join(STATE_PATH, "states.pkl"),
+                 pickle.dumps({'states': states, 'stats': stats}, protocol=5))
+    manifest = {'settings': get_state_settings(), 'files': files, 'updated_at': time.time()}
+    write_atomic(os.path.join(STATE_PATH, "manifest.json"),
+                 json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+
+
+def find_new_files(paths: list, store) -> list:
+    """
+    Input files not processed yet (all of them without a store).
+
+    Raises:
+        ValueError: if an already processed file has changed (its rows cannot be taken back out)
+    """
+    if store is None:
+        return paths
+    processed = {entry['path']: entry for entry in store['files']}
+    new_paths = []
+    for path in paths:
+        entry = processed.get(os.path.abspath(path))
+        if entry is None:
+            new_paths.append(path)
+        elif fingerprint_file(path) != entry:
+            raise ValueError(f"{path} changed since it was processed")
+    return new_paths
+
+
+def run_incremental(filename, chunksize: int, workers: int = None, rebuild: bool = False):
+    """
+    Update the persisted states with the input files not processed yet and finalize them.
+
+    New files are streamed like run_streaming, with the global statistics
+    (price mean, RFM terciles) of all data processed so far; rows already
+    processed keep the RFM scores they got then. Top-K summaries are
+    verified over the new files only, so their counts stay exact for keys
+    the history never dropped and are upper bounds otherwise.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (e.g. "D1_*.csv")
+        chunksize: Rows per chunk
+        workers: Worker processes, defaults to config.get_max_workers()
+        rebuild: Ignore the persisted states and process every file again
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    paths = resolve_input_files(filename)
+    workers = workers or get_max_workers()
+    store = None if rebuild else load_store()
+    try:
+        new_paths = find_new_files(paths, store)
+    except ValueError as e:
+        print(f"⚠️ {e}，重新全量计算")
+        store, new_paths = None, paths
+
+    if not new_paths:
+        print("✅ 没有新的输入文件，直接使用已保存的聚合状态")
+        return finalize_states(store['states'])
+
+    print(f"➕ 增量处理 {len(new_paths)} 个新文件" + (f" (已处理 {len(store['files'])} 个)" if store else ""))
+    fingerprints = [fingerprint_file(path) for path in new_paths]
+    stats = collect_stats(new_paths, chunksize, workers, base=store['stats'] if store else None)
+    states = stream_states(new_paths, chunksize, workers, stats)
+    if store:
+        states = {name: merge_states(store['states'][name], state) for name, state in states.items()}
+
+    save_store((store['files'] if store else []) + fingerprints, states, stats)
+    return finalize_states(states)
+
+
+def has_new_files(filename) -> bool:
+    """Whether filename resolves to input files not in the persisted states."""
+    try:
+        paths = resolve_input_files(filename)
+    except FileNotFoundError:
+        return False
+    manifest = load_manifest()
+    if manifest is None:
+        return True
+    processed = {entry['path'] for entry in manifest['files']}
+    return any(os.path.abspath(path) not in processed for path in paths)
+
+
+def watch(filename, chunksize: int, interval: float, on_update):
+    """
+    Poll DATA_PATH every interval seconds and run run_incremental when new files match filename.
+
+    Args:
+        on_update: Called with the (metrics_res, user_res, prod_res, beh_res) of every update
+    """
+    print(f"👀 监听新文件 {filename} (每 {interval:g} 秒，Ctrl+C 退出)")
+    try:
+        while True:
+            if has_new_files(filename):
+                on_update(run_incremental(filename, chunksize))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n👋 停止监听")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: One-time CSV -> partitioned Parquet ingest (day / visit_city)
+@Version: 1.1
+"""
+
+import glob
+import json
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .config import (DATA_PATH, PROCESSED_PATH, COLUMN_NAMES, PARQUET_DATASET, PARQUET_ROW_GROUP_SIZE,
+                     ZONE_MAP_COLUMNS, ZONE_MAPS_FILE)
+from .data_loader import get_arrow_schema, get_partitioning, open_raw_file
+
+SECONDS_PER_DAY = 86400
+
+def find_raw_files(pattern: str) -> list:
+    """Raw CSV files (plain, .gz or .zip) in DATA_PATH matching the glob pattern."""
+    return sorted(glob.glob(os.path.join(DATA_PATH, pattern)))
+
+def iter_batches(paths, columns):
+    """
+    Stream typed record batches from the CSV files, adding the `day` partition key.
+
+    Compressed files (.gz / .zip) are decompressed on the fly.
+    """
+    read_options = pacsv.ReadOptions(column_names=COLUMN_NAMES, block_size=64 << 20)
+    convert_options = pacsv.ConvertOptions(column_types=get_arrow_schema(columns),
+                                           include_columns=columns,
+                                           strings_can_be_null=True)
+    for path in paths:
+        print(f"Ingesting: {path}")
+        with open_raw_file(path) as source:
+            reader = pacsv.open_csv(source, read_options=read_options, convert_options=convert_options)
+            for batch in reader:
+                days = pc.cast(pc.cast(pc.divide(batch.column("times"), SECONDS_PER_DAY), pa.int32()), pa.date32())
+                yield pa.RecordBatch.from_arrays(batch.columns + [days], names=batch.schema.names + ["day"])
+
+def partition_values(path: str) -> dict:
+    """Hive partition values of a dataset file path ("day=2022-04-01/visit_city=2/..."), None for nulls."""
+    values = {}
+    for part in path.split(os.sep)[:-1]:
+        if "=" in part:
+            key, value = part.split("=", 1)
+            values[key] = None if value == "__HIVE_DEFAULT_PARTITION__" else (int(value) if key == "visit_city" else value)
+    return values
+
+def write_zone_maps(output_dir: str) -> str:
+    """
+    Index the min / max of ZONE_MAP_COLUMNS of every row group (from the
+    Parquet footers) with the partition values of its file, see
+    data_loader.prune_zone_maps.
+
+    Returns:
+        Path of the zone map index
+    """
+    zones = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "**", "*.parquet"), recursive=True)):
+        relpath = os.path.relpath(path, output_dir)
+        metadata = pq.read_metadata(path)
+        columns = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            zone = {"path": relpath, "row_group": i, "rows": row_group.num_rows,
+                    "partition": partition_values(relpath), "min": {}, "max": {}}
+            for col in ZONE_MAP_COLUMNS:
+                stats = row_group.column(columns[col]).statistics if col in columns else None
+                if stats is not None and stats.has_min_max:
+                    zone["min"][col], zone["max"][col] = stats.min, stats.max
+            zones.append(zone)
+
+    zone_maps_path = os.path.join(output_dir, ZONE_MAPS_FILE)
+    with open(zone_maps_path, "w") as f:
+        json.dump({"columns": ZONE_MAP_COLUMNS, "zones": zones}, f)
+    return zone_maps_path
+
+def convert_csv_to_parquet(pattern: str = "D1_[0-9].csv*", columns=None) -> str:
+    """
+    Convert raw CSV files into the Parquet dataset under PROCESSED_PATH.
+
+    The dataset is hive-partitioned by day and visit_city and written with
+    row-group statistics, indexed as zone maps (see write_zone_maps), so
+    readers can prune partitions and row groups. An existing dataset is
+    rebuilt from scratch.
+
+    Args:
+        pattern: Glob pattern of the raw files in DATA_PATH
+        columns: Columns to keep, defaults to all COLUMN_NAMES
+
+    Returns:
+        Path of the written dataset
+    """
+    paths = find_raw_files(pattern)
+    if not paths:
+        raise FileNotFoundError(f"No raw files match {os.path.join(DATA_PATH, pattern)}")
+
+    columns = list(columns or COLUMN_NAMES)
+    if "times" not in columns:
+        raise ValueError("`times` is required to derive the day partition")
+
+    output_dir = os.path.join(PROCESSED_PATH, PARQUET_DATASET)
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+
+    schema = get_arrow_schema(columns).append(pa.field("day", pa.date32()))
+    batches = pa.RecordBatchReader.from_batches(schema, iter_batches(paths, columns))
+    file_options = ds.ParquetFileFormat().make_write_options(compression="zstd", write_statistics=True)
+
+    ds.write_dataset(
+        batches,
+        output_dir,
+        format="parquet",
+        partitioning=get_partitioning(),
+        file_options=file_options,
+        basename_template="part-{i}.parquet",
+        min_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+        max_rows_per_group=PARQUET_ROW_GROUP_SIZE * 16,
+    )
+    write_zone_maps(output_dir)
+    return output_dir
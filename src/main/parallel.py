@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Parallel in-memory execution of the analysis modules: the preprocessed frame is
+              placed once in shared memory as an Arrow IPC stream, worker processes attach to it
+              zero-copy and reduce row slices to the modules' partial states
+@Version: 1.0
+"""
+
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import pandas as pd
+import pyarrow as pa
+
+from .config import get_max_workers, get_rfm_scoring, use_sketches
+from .id_encoding import restore_codes
+from .analysis_modules import ANALYSIS_MODULES, analyze_all, finalize_states
+from .analysis_modules.aggregate import merge_states
+from .analysis_modules.dask_engine import merge_module_states, partition_states
+from .analysis_modules.engine import count_candidates, topk_candidates, verify_topk
+from .analysis_modules.rfm import partial_rfm_stats
+
+# Frames smaller than this are analyzed inline: process start-up would dominate
+PARALLEL_MIN_ROWS = 100_000
+
+# Shared frame of a worker process: {'shm': SharedMemory, 'table': pa.Table}, see attach_frame
+_shared = {}
+
+def share_frame(df: pd.DataFrame) -> shared_memory.SharedMemory:
+    """Write df as an Arrow IPC stream into a new shared memory block (the caller closes and unlinks it)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    shm = shared_memory.SharedMemory(create=True, size=sink.size())
+    buffer = pa.py_buffer(shm.buf)
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(buffer), table.schema) as writer:
+        writer.write_table(table)
+    # Release the export of shm.buf, SharedMemory.close() refuses to close while it exists
+    del buffer, writer
+    return shm
+
+def attach_frame(name: str):
+    """Worker initializer: map the shared frame, its Arrow buffers point into the shared memory."""
+    shm = shared_memory.SharedMemory(name=name)
+    _shared['shm'] = shm
+    _shared['table'] = pa.ipc.open_stream(pa.py_buffer(shm.buf)).read_all()
+
+def slice_frame(start: int, stop: int) -> pd.DataFrame:
+    """Rows [start, stop) of the shared frame (numeric columns without nulls stay zero-copy)."""
+    return restore_codes(_shared['table'].slice(start, stop - start).to_pandas(split_blocks=True))
+
+def slice_states(start: int, stop: int, stats: dict, offsets: dict = None, sketches: bool = False) -> dict:
+    """Worker task: fused partial states of the analysis modules over one slice, with global RFM scores."""
+    return partition_states(slice_frame(start, stop), ANALYSIS_MODULES, stats, offsets, sketches)
+
+def slice_counts(start: int, stop: int, candidates: dict) -> dict:
+    """Worker task: exact counts of the top-K candidate keys in one slice."""
+    return count_candidates(slice_frame(start, stop), candidates, ANALYSIS_MODULES)
+
+def split_rows(rows: int, parts: int) -> list:
+    """[(start, stop)] bounds of at most parts contiguous slices of equal size."""
+    step = -(-rows // parts)
+    return [(start, min(start + step, rows)) for start in range(0, rows, step)]
+
+def slice_rfm_stats(df: pd.DataFrame, bounds: list):
+    """
+    Global RFM statistics of df for scoring the slices like score_rfm scores the whole frame.
+
+    Returns:
+        (statistics, per slice statistics of the slices before it for exact scoring, else None)
+    """
+    scoring = get_rfm_scoring()
+    if scoring == 'sketch':
+        # One digest of the whole frame: the same cut points as score_rfm
+        return partial_rfm_stats(df, scoring), [None] * len(bounds)
+
+    stats, offsets = None, []
+    for start, stop in bounds:
+        offsets.append(stats)
+        stats = merge_states(stats, partial_rfm_stats(df.iloc[start:stop], scoring))
+    return stats, offsets
+
+def analyze_parallel(df: pd.DataFrame, workers: int = None) -> tuple:
+    """
+    analyze_all over a preprocessed pandas frame on a process pool.
+
+    The frame is copied once into shared memory; every worker attaches to
+    it when it starts and converts only its slice of rows to pandas. Each
+    slice is reduced to the fused partial states of all analysis modules,
+    so every worker shares the derived columns and groupbys of the modules
+    like the serial engine, and only the small states travel back to be
+    merged. RFM terciles are scored with statistics of the whole frame and
+    top-K summaries are made exact by a second pass over their candidate
+    keys, as for Dask partitions (see dask_engine.dask_partial_states).
+    Outside the sketch modes (config.use_sketches) distinct counts,
+    percentiles and RFM scores are exact and top-K ties are ordered by key,
+    so the results do not depend on the number of workers (see
+    src/test/check_workers.py).
+
+    Args:
+        df: Preprocessed data (see preprocess_eleme_data)
+        workers: Worker processes, defaults to config.get_max_workers();
+                 a single worker or a frame under PARALLEL_MIN_ROWS runs analyze_all inline
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    workers = workers or get_max_workers()
+    if workers <= 1 or len(df) < PARALLEL_MIN_ROWS:
+        return analyze_all(df)
+
+    bounds = split_rows(len(df), workers)
+    starts, stops = zip(*bounds)
+    stats, offsets = slice_rfm_stats(df, bounds)
+    shm = share_frame(df)
+    print(f"⚡ {len(bounds)} 个进程并行分析 (共享内存 {shm.size / 1024 ** 2:.1f} MB)")
+    try:
+        with ProcessPoolExecutor(max_workers=len(bounds), initializer=attach_frame, initargs=(shm.name,)) as pool:
+            states = functools.reduce(merge_module_states,
+                                      pool.map(slice_states, starts, stops, [stats] * len(bounds), offsets,
+                                               [use_sketches()] * len(bounds)))
+
+            candidates = topk_candidates(states)
+            if candidates:
+                counts = functools.reduce(merge_states,
+                                          pool.map(slice_counts, starts, stops, [candidates] * len(bounds)))
+                states = verify_topk(states, candidates, counts)
+    finally:
+        shm.close()
+        shm.unlink()
+    return finalize_states(states)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Polars engine: preprocess_eleme_data and the analysis modules' declared derived
+              columns and aggregations as Polars LazyFrame plans over the raw CSV or Parquet
+              files, run by Polars' multithreaded streaming engine
+@Version: 1.2
+"""
+
+import os
+
+import polars as pl
+
+from .config import (COLUMN_NAMES, COLUMN_DTYPES, PROCESSED_PATH, PARQUET_DATASET, get_data_source, get_filters,
+                     get_rfm_scoring, get_segment_rules)
+from .data_loader import COMPRESSION_BY_SUFFIX, FILTER_OPS, get_filter_columns, read_csv_arrow, resolve_input_files
+from .analysis_modules import ANALYSIS_COLUMNS, ANALYSIS_MODULES, finalize_states
+from .analysis_modules.derived import PRICE_BINS, PRICE_LABELS, RANK_BINS, RANK_LABELS, PERIOD_BY_HOUR
+from .analysis_modules.engine import build_states, collect_results, module_aggregations, plan_queries
+from .analysis_modules.rfm import RFM_COLUMNS, SCORE_COLUMNS, QuantileRfmScorer
+from .analysis_modules.sketches import TDigest
+
+# Polars equivalents of the COLUMN_DTYPES entries (categoricals are read as plain strings)
+POLARS_TYPES = {
+    "int8": pl.Int8,
+    "int16": pl.Int16,
+    "int64": pl.Int64,
+    "Int32": pl.Int32,
+    "float32": pl.Float32,
+    "category": pl.String,
+    str: pl.String,
+}
+
+def get_polars_schema(columns=None) -> dict:
+    """Polars schema of the typed column schema, restricted to the given columns."""
+    return {col: POLARS_TYPES[COLUMN_DTYPES[col]] for col in (columns or COLUMN_NAMES)}
+
+def filter_expr(filters, names: list) -> pl.Expr:
+    """Expression of the (column, op, value) filter predicates (see config.get_filters)."""
+    expr = pl.lit(True)
+    for col, op, value in filters:
+        if col == 'day' and 'day' not in names:
+            column = pl.from_epoch('times', time_unit='s').dt.date()
+        else:
+            column = pl.col(col).cast(pl.Date) if col == 'day' else pl.col(col)
+        expr = expr & (column.is_in(value) if op == 'in' else FILTER_OPS[op](column, value))
+    return expr
+
+def scan_input(filename, usecols=None, filters=None) -> pl.LazyFrame:
+    """
+    Lazy scan of the configured source (see config.get_data_source) with the typed schema.
+
+    Only the columns the plan ends up using are parsed (projection
+    pushdown). Compressed CSVs cannot be scanned lazily; they are parsed by
+    the Arrow reader and enter the plan as tables. Filter predicates are
+    pushed into the scans, so Parquet partitions and row groups that
+    cannot match are skipped.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH (ignored for the Parquet source)
+        usecols: Columns to read, defaults to the columns the analysis modules need
+        filters: (column, op, value) predicates (see config.get_filters)
+    """
+    usecols = list(usecols or ANALYSIS_COLUMNS)
+    filters = filters or []
+    if get_data_source() == "parquet":
+        path = os.path.join(PROCESSED_PATH, PARQUET_DATASET)
+        if not os.path.isdir(path):
+            print(f"Error: Parquet dataset not found at {path}, run src/scripts/ingest.py first")
+            raise FileNotFoundError(path)
+        # Partition columns (day / visit_city) come from the hive paths
+        lf = pl.scan_parquet(os.path.join(path, "**", "*.parquet"), hive_partitioning=True)
+        return lf.filter(filter_expr(filters, lf.collect_schema().names())) \
+            .select(usecols).cast(get_polars_schema(usecols))
+
+    frames = []
+    for path in resolve_input_files(filename):
+        if COMPRESSION_BY_SUFFIX.get(os.path.splitext(path)[1]):
+            frame = pl.from_arrow(read_csv_arrow(path, list(dict.fromkeys(usecols + get_filter_columns(filters))))).lazy()
+        else:
+            frame = pl.scan_csv(path, has_header=False, schema=get_polars_schema())
+        frames.append(frame.filter(filter_expr(filters, [])).select(usecols))
+    return pl.concat(frames)
+
+def preprocess_lazy(lf: pl.LazyFrame, avg_price_mean=None) -> pl.LazyFrame:
+    """
+    preprocess_eleme_data as a lazy plan: the same missing value fills,
+    datetime column and label filter.
+    """
+    names = lf.collect_schema().names()
+    columns = []
+    # Fill visit_city nulls with 0 (Unknown)
+    if 'visit_city' in names:
+        columns.append(pl.col('visit_city').fill_null(0).cast(pl.Int32))
+    # Fill average price nulls with the mean of all rows (before the label filter)
+    if 'avg_price' in names:
+        price = pl.col('avg_price').cast(pl.Float64)
+        columns.append(price.fill_null(price.mean() if avg_price_mean is None else avg_price_mean))
+    # Convert Unix timestamp to datetime
+    if 'times' in names:
+        columns.append(pl.from_epoch('times', time_unit='s').alias('datetime'))
+    # Ensure label is 0 or 1
+    return lf.with_columns(columns).filter(pl.col('label').is_in([0, 1]))
+
+def cut(column: str, bins: list, labels: list) -> pl.Expr:
+    """pd.cut: labels of the right-closed bins, null outside them."""
+    expr = pl
+    for low, high, label in zip(bins[:-1], bins[1:], labels):
+        expr = expr.when((pl.col(column) > low) & (pl.col(column) <= high)).then(pl.lit(label))
+    return expr.otherwise(pl.lit(None, dtype=pl.String))
+
+def extract_hour(lf: pl.LazyFrame) -> pl.Expr:
+    names = lf.collect_schema().names()
+    if 'datetime' in names:
+        return pl.col('datetime').dt.hour()
+    if 'hours' in names:
+        return pl.col('hours')
+    return pl.lit(0)
+
+def rfm_scores(lf: pl.LazyFrame) -> tuple:
+    """
+    score_rfm as expressions. A statistics collect runs first: the value
+    counts of the RFM columns (their t-digests) for sketch scoring, their
+    non-null counts for exact scoring, which ranks rows in file order like
+    rank(method='first').
+    """
+    columns = list(RFM_COLUMNS.values())
+    if get_rfm_scoring() == 'sketch':
+        stats = pl.collect_all([lf.select(pl.col(col).cast(pl.Float64).fill_nan(None)).drop_nulls()
+                                .group_by(col).len().sort(col) for col in columns], engine='streaming')
+        scorer = QuantileRfmScorer({col: TDigest.from_counts(counts[col], counts['len'])
+                                    for col, counts in zip(columns, stats)})
+        if any(count <= 1 for count in scorer.counts.values()):
+            return pl.lit(1.0), pl.lit(1.0)
+        # searchsorted(cuts, side='left') + 1: one plus the number of cut points below the value
+        return tuple(pl.when(pl.col(col).is_null()).then(None)
+                     .otherwise(1.0 + (pl.col(col).cast(pl.Float64) > cuts[0]).cast(pl.Float64)
+                                + (pl.col(col).cast(pl.Float64) > cuts[1]).cast(pl.Float64))
+                     for col, cuts in ((col, scorer.cuts[col]) for col in columns))
+
+    counts = lf.select([pl.col(col).count() for col in columns]).collect(engine='streaming').row(0)
+    # Same fallback as score_rfm when there is too little data for 3 bins
+    if any(n <= 1 for n in counts):
+        return pl.lit(1.0), pl.lit(1.0)
+    # qcut(q=3) bin edges of the ranks 1..n
+    scores = []
+    for col, n in zip(columns, counts):
+        rank = pl.col(col).rank('ordinal')
+        scores.append(pl.when(rank.is_null()).then(None).when(rank <= 1 + (n - 1) / 3).then(1.0)
+                      .when(rank <= 1 + 2 * (n - 1) / 3).then(2.0).otherwise(3.0))
+    return tuple(scores)
+
+def assign_segments(lf: pl.LazyFrame) -> pl.Expr:
+    """user.assign_segments as an expression: the first matching rule of the segment rule table wins."""
+    table = get_segment_rules()
+    schema = lf.collect_schema()
+    expr = pl
+    for rule in table['rules']:
+        condition = pl.lit(True)
+        for col, values in rule['when'].items():
+            # Allowed values in the column's type, as isin compares 3 and 3.0 equal
+            condition = condition & pl.col(col).is_in(pl.Series(values).cast(schema[col]))
+        expr = expr.when(condition).then(pl.lit(rule['segment']))
+    return expr.otherwise(pl.lit(table['default'])) if table['rules'] else pl.lit(table['default'])
+
+# Polars expressions of the registered derived columns (derived.DERIVED and the
+# module specific ones), functions of the lazy frame built so far like the pandas ones
+POLARS_DERIVED = {
+    'label64': lambda lf: pl.col('label').cast(pl.Int64),
+    'price64': lambda lf: pl.col('avg_price').cast(pl.Float64),
+    'amt64': lambda lf: pl.col('total_amt_30').cast(pl.Float64),
+    'ord64': lambda lf: pl.col('ord_30').cast(pl.Float64),
+    'cvr': lambda lf: pl.when(pl.col('ctr_30') > 0)
+        .then(pl.col('ord_30').cast(pl.Float64) / pl.col('ctr_30').cast(pl.Float64)).otherwise(0.0),
+    'user_cvr': lambda lf: pl.when(pl.col('ctr_30') > 0)
+        .then(pl.col('ord_30').cast(pl.Float64) / pl.col('ctr_30').cast(pl.Float64)),
+    'hour_extracted': extract_hour,
+    'is_weekend': lambda lf: pl.col('weekdays').is_in([5, 6]).fill_null(False)
+        if 'weekdays' in lf.collect_schema().names() else None,
+    'time_period': lambda lf: pl.col('hour_extracted')
+        .replace_strict(list(range(24)), PERIOD_BY_HOUR[:24].tolist(), default=PERIOD_BY_HOUR[24]),
+    'price_bin': lambda lf: cut('avg_price', PRICE_BINS, PRICE_LABELS),
+    'rank_bin': lambda lf: cut('rank_7', RANK_BINS, RANK_LABELS),
+    SCORE_COLUMNS: rfm_scores,
+    'segment': assign_segments,
+}
+
+def derive_lazy(lf: pl.LazyFrame, *registries) -> pl.LazyFrame:
+    """engine.derive_columns on a lazy frame, with the POLARS_DERIVED expression of each registered name."""
+    for registry in registries:
+        for names in registry:
+            columns = names if isinstance(names, tuple) else (names,)
+            if all(name in lf.collect_schema().names() for name in columns):
+                continue
+            exprs = POLARS_DERIVED[names](lf)
+            if exprs is None:
+                continue
+            exprs = exprs if isinstance(exprs, tuple) else (exprs,)
+            lf = lf.with_columns([expr.alias(name) for name, expr in zip(columns, exprs)])
+    return lf
+
+def agg_expr(col: str, func: str) -> pl.Expr:
+    """Polars expression of an engine aggregation func, with pandas' result types."""
+    if func == 'size':
+        return pl.len().cast(pl.Int64)
+    if func == 'count':
+        return pl.col(col).count().cast(pl.Int64)
+    return getattr(pl.col(col), func)()
+
+def run_queries(lf: pl.LazyFrame, queries: dict) -> dict:
+    """
+    Answer engine.plan_queries over a lazy frame.
+
+    All queries are collected together, so the scan is shared (common
+    subplan elimination) and every groupby runs on the streaming engine.
+
+    Returns:
+        {query key: pandas DataFrame} for engine.collect_results
+    """
+    plans = []
+    for kind, by, payload in queries.values():
+        by = list(by)
+        keyed = lf.filter(pl.all_horizontal(pl.col(by).is_not_null())) if by else lf
+        if kind == 'distinct':
+            plans.append(keyed.select(by + [payload]).unique())
+        elif kind == 'counts':
+            plans.append(keyed.select(by + [pl.col(payload).cast(pl.Float64).fill_nan(None)])
+                         .drop_nulls(payload).group_by(by + [payload]).len().with_columns(pl.col('len').cast(pl.Int64)))
+        else:
+            exprs = [agg_expr(col, func).alias(f"{col}:{func}") for col, func in payload]
+            plans.append(keyed.group_by(by).agg(exprs) if by else keyed.select(exprs))
+    return {key: frame.to_pandas() for key, frame in zip(queries, pl.collect_all(plans, engine='streaming'))}
+
+def run_polars(filename) -> tuple:
+    """
+    Run the full dashboard (preprocessing and all ANALYSIS_MODULES) as Polars lazy plans.
+
+    The modules' declared DERIVED_COLUMNS and AGGREGATIONS are translated
+    to one plan per aggregation over the shared scan; only the grouped
+    results reach pandas, where each module builds and finalizes its state,
+    so the JSON matches the pandas engine.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    print("🐻‍❄️ Polars 惰性查询执行...")
+    lf = preprocess_lazy(scan_input(filename, filters=get_filters()))
+    lf = derive_lazy(lf, *[module.DERIVED_COLUMNS for module in ANALYSIS_MODULES])
+
+    aggregations = module_aggregations(ANALYSIS_MODULES)
+    frames = run_queries(lf, plan_queries(aggregations, lf.collect_schema().names()))
+    return finalize_states(build_states(ANALYSIS_MODULES, collect_results(aggregations, frames)))
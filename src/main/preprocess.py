@@ -12,6 +12,9 @@ import pandas as pd
 import dask.dataframe as dd
 import numpy as np
 
+# Bump whenever preprocess_eleme_data output changes; invalidates cached preprocessed frames
+PREPROCESS_VERSION = 1
+
 def preprocess(df):
     """Legacy Dask preprocess function."""
     df = df.dropna()
@@ -19,47 +22,66 @@ def preprocess(df):
     # df = df[df['value'] > 0] # Old logic
     return df
 
-def preprocess_eleme_data(df: pd.DataFrame) -> pd.DataFrame:
+def preprocess_eleme_data(df: pd.DataFrame, avg_price_mean=None, verbose=True) -> pd.DataFrame:
     """
     Preprocess the Ele.me recommendation dataset.
     
     1. Type conversion
     2. Missing value handling
     3. Feature extraction
+
+    Args:
+        df: Raw data (or one chunk of it)
+        avg_price_mean: Fill value for missing avg_price; defaults to the mean of df.
+                        Streaming runs pass the global mean from a statistics pass.
+        verbose: Print progress messages
+
+    A Dask DataFrame is preprocessed lazily partition by partition, with the
+    avg_price fill value taken from the whole dataset.
     """
-    print("Preprocessing data...")
+    if isinstance(df, dd.DataFrame):
+        if avg_price_mean is None and 'avg_price' in df.columns:
+            avg_price_mean = df['avg_price'].astype('float64').mean()
+        return df.map_partitions(preprocess_eleme_data, avg_price_mean=avg_price_mean, verbose=False)
+
+    if verbose:
+        print("Preprocessing data...")
     
-    # Create a copy to avoid SettingWithCopyWarning
-    df = df.copy()
+    # New columns are collected and assigned at once: the input frame is never
+    # modified, and with copy-on-write the untouched columns are not copied
+    columns = {}
     
     # 1. Ensure numeric types for critical columns
     numeric_cols = ['label', 'avg_price', 'ctr_30', 'ord_30', 'total_amt_30', 'rank_7', 'visit_city']
     for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            columns[col] = pd.to_numeric(df[col], errors='coerce')
             
     # 2. Handle Missing Values
     # Fill visit_city NaNs with 0 (Unknown)
     if 'visit_city' in df.columns:
-        df['visit_city'] = df['visit_city'].fillna(0).astype(int)
+        columns['visit_city'] = columns.get('visit_city', df['visit_city']).fillna(0).astype('int32')
         
     # Fill average price NaNs with mean
     if 'avg_price' in df.columns:
-        mean_price = df['avg_price'].mean()
-        df['avg_price'] = df['avg_price'].fillna(mean_price)
+        price = columns.get('avg_price', df['avg_price'])
+        mean_price = price.astype('float64').mean() if avg_price_mean is None else avg_price_mean
+        columns['avg_price'] = price.fillna(mean_price)
         
     # 3. Feature Extraction
     if 'times' in df.columns:
         # Convert Unix timestamp to datetime
-        df['datetime'] = pd.to_datetime(df['times'], unit='s')
+        columns['datetime'] = pd.to_datetime(df['times'], unit='s')
         
         # Verify/Overwrite hour and weekday if needed (using existing columns if accurate)
         # df['extracted_hour'] = df['datetime'].dt.hour
         # df['extracted_weekday'] = df['datetime'].dt.weekday
+    df = df.assign(**columns)
         
     # 4. Data Consistency
     # Ensure label is 0 or 1
     df = df[df['label'].isin([0, 1])]
     
-    print("Preprocessing complete.")
+    if verbose:
+        print("Preprocessing complete.")
     return df
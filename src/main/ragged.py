@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Vectorized ragged-array parsing of the delimited *_list history columns
+@Version: 1.1
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .config import LIST_DELIMITER, LIST_VALUE_TYPES, LIST_PARSE_CHUNKSIZE
+
+@dataclass
+class RaggedArray:
+    """
+    One list column as flat arrays: row i holds values[offsets[i]:offsets[i + 1]].
+
+    Numeric lists keep their typed values. String lists store int32 codes
+    into `dictionary` (an Arrow string array), so no Python string objects
+    are created for the elements.
+    """
+    offsets: np.ndarray
+    values: np.ndarray
+    dictionary: pa.Array = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def decode(self, codes: np.ndarray) -> pa.Array:
+        """Strings of dictionary codes (-1, e.g. the last value of an empty row, becomes null)."""
+        codes = pa.array(codes, mask=codes < 0)
+        return self.dictionary.take(codes)
+
+def to_arrow(column) -> pa.ChunkedArray:
+    """Arrow string column of a pandas Series or an Arrow (chunked) array, in LIST_PARSE_CHUNKSIZE pieces."""
+    if isinstance(column, pd.Series):
+        column = pa.array(column, type=pa.string(), from_pandas=True)
+    if isinstance(column, pa.Array):
+        column = pa.chunked_array([column])
+    pieces = []
+    for chunk in column.chunks:
+        pieces.extend(chunk.slice(start, LIST_PARSE_CHUNKSIZE) for start in range(0, len(chunk), LIST_PARSE_CHUNKSIZE))
+    return pa.chunked_array(pieces, type=pa.string())
+
+def parse_list_column(column, value_type: str = "string", delimiter: str = LIST_DELIMITER) -> RaggedArray:
+    """
+    Split a delimited list column into a RaggedArray without per-row Python work.
+
+    Each chunk is split with Arrow's vectorized split kernel; missing and
+    empty strings become empty rows, and empty elements (a trailing or
+    doubled delimiter) are skipped.
+
+    Args:
+        column: pandas Series or Arrow (chunked) string array
+        value_type: Element type ("string" or a numpy/Arrow numeric type name)
+        delimiter: Element separator
+
+    >>> ragged = parse_list_column(pd.Series(["1;2;", ";", None, "3;;4"]), "int32")
+    >>> ragged.offsets.tolist(), ragged.values.tolist()
+    ([0, 2, 2, 2, 4], [1, 2, 3, 4])
+    """
+    lengths, values = [], []
+    for chunk in to_arrow(column).chunks:
+        lists = pc.split_pattern(chunk, delimiter)
+        flat = pc.list_flatten(lists)
+        keep = pc.not_equal(flat, "").to_numpy(zero_copy_only=False)
+        parents = pc.list_parent_indices(lists).to_numpy()
+        lengths.append(np.bincount(parents[keep], minlength=len(chunk)))
+        values.append(flat.filter(keep))
+
+    offsets = np.zeros(sum(len(part) for part in lengths) + 1, dtype=np.int64)
+    if lengths:
+        np.cumsum(np.concatenate(lengths), out=offsets[1:])
+    values = pa.chunked_array(values, type=pa.string())
+
+    if value_type == "string":
+        encoded = values.dictionary_encode().combine_chunks()
+        return RaggedArray(offsets, encoded.indices.to_numpy(zero_copy_only=False), encoded.dictionary)
+    return RaggedArray(offsets, values.cast(pa.from_numpy_dtype(np.dtype(value_type))).to_numpy())
+
+def parse_list_columns(df, columns=None) -> dict:
+    """
+    Parse the *_list columns of a frame or Arrow table into RaggedArrays.
+
+    Args:
+        df: pandas DataFrame or Arrow table holding the columns
+        columns: Columns to parse, defaults to the LIST_VALUE_TYPES columns present
+
+    Returns:
+        {column: RaggedArray}
+    """
+    names = df.column_names if isinstance(df, pa.Table) else df.columns
+    columns = [col for col in LIST_VALUE_TYPES if col in names] if columns is None else columns
+    return {col: parse_list_column(df[col], LIST_VALUE_TYPES[col]) for col in columns}
+
+def row_totals(ragged: RaggedArray, values: np.ndarray) -> np.ndarray:
+    """Per-row sums of an array aligned with ragged.values (prefix sums, so empty rows give 0)."""
+    totals = np.zeros(len(values) + 1, dtype=values.dtype)
+    np.cumsum(values, out=totals[1:])
+    return totals[ragged.offsets[1:]] - totals[ragged.offsets[:-1]]
+
+def list_lengths(ragged: RaggedArray) -> np.ndarray:
+    """Number of elements per row."""
+    return np.diff(ragged.offsets)
+
+def list_sums(ragged: RaggedArray) -> np.ndarray:
+    """Per-row sum of a numeric list (int64 / float64 accumulators, 0 for empty rows)."""
+    accumulator = np.float64 if np.issubdtype(ragged.values.dtype, np.floating) else np.int64
+    return row_totals(ragged, ragged.values.astype(accumulator))
+
+def list_last(ragged: RaggedArray, fill_value=None) -> np.ndarray:
+    """
+    Last element per row (the most recent entry of the history).
+
+    Empty rows get fill_value: NaN for float lists, -1 otherwise (for string
+    lists the result holds dictionary codes, see RaggedArray.decode).
+    """
+    if fill_value is None:
+        fill_value = np.nan if np.issubdtype(ragged.values.dtype, np.floating) else -1
+    lengths = list_lengths(ragged)
+    last = ragged.values[np.maximum(ragged.offsets[1:] - 1, 0)] if len(ragged.values) else np.zeros(len(ragged), ragged.values.dtype)
+    return np.where(lengths > 0, last, fill_value)
+
+def list_contains(ragged: RaggedArray, value) -> np.ndarray:
+    """Boolean mask of the rows whose list contains value."""
+    if ragged.dictionary is not None:
+        value = pc.index(ragged.dictionary, pa.scalar(str(value))).as_py()
+        if value < 0:
+            return np.zeros(len(ragged), dtype=bool)
+    return row_totals(ragged, (ragged.values == value).astype(np.int64)) > 0
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Content-addressed cache of the analysis modules' results under PROCESSED_PATH,
+              keyed by the input fingerprint, filters, configuration, analysis mode and module
+              source version, with size-bounded LRU eviction; reruns on unchanged inputs skip
+              loading and analysis entirely
+@Version: 1.1
+"""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+from .config import (PROCESSED_PATH, CITY_MAPPING, CATEGORY_MAPPING, STREAM_CHUNKSIZE, get_approx_fraction,
+                     get_approx_key, get_cli_option, get_data_source, get_engine, get_filters, get_max_workers,
+                     get_result_cache_max_bytes, has_cli_flag, use_id_encoding, use_sketches)
+from .frame_cache import get_input_fingerprint
+from .incremental import get_state_settings, write_atomic
+from .analysis_modules.derived import PRICE_BINS, PRICE_LABELS, RANK_BINS, RANK_LABELS
+
+# One pickle of a module result per key: <module>-<key>.pkl
+RESULT_CACHE_PATH = os.path.join(PROCESSED_PATH, "result_cache")
+# Sources every module result depends on besides the module's own (relative to src/main)
+SHARED_SOURCES = ["config.py", "data_loader.py", "ingest.py", "ragged.py", "id_encoding.py", "frame_cache.py",
+                  "preprocess.py", "analysis_modules/derived.py", "analysis_modules/engine.py",
+                  "analysis_modules/aggregate.py", "analysis_modules/rfm.py", "analysis_modules/sketches.py"]
+# Source of the engine that computes the results, by analysis mode
+MODE_SOURCES = {'pandas': "parallel.py", 'polars': "polars_engine.py", 'duckdb': "duckdb_engine.py",
+                'stream': "streaming.py", 'approx': "approx.py", 'cube': "cube.py"}
+
+
+def use_result_cache() -> bool:
+    return not has_cli_flag('no-cache', 'NO_RESULT_CACHE')
+
+
+def get_mode() -> str:
+    """Analysis mode of generate_dashboard.py (see MODE_SOURCES); the generate_* scripts run in 'pandas'."""
+    if get_approx_fraction():
+        return 'approx'
+    if has_cli_flag('cube', 'USE_CUBE'):
+        return 'cube'
+    if get_engine() in ('polars', 'duckdb'):
+        return get_engine()
+    if has_cli_flag('stream', 'STREAM'):
+        return 'stream'
+    return 'pandas'
+
+
+def source_version(*paths) -> str:
+    """Hash of the given source files (relative to src/main)."""
+    digest = hashlib.blake2b(digest_size=16)
+    root = os.path.dirname(os.path.abspath(__file__))
+    for path in paths:
+        with open(os.path.join(root, path), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def module_name(module) -> str:
+    return module.__name__.rsplit('.', 1)[-1]
+
+
+def get_cache_settings(filename, mode: str) -> dict:
+    """Everything but the module source that module results depend on."""
+    return {
+        **get_state_settings(),
+        'inputs': get_input_fingerprint(filename),
+        'source': get_data_source(),
+        'filters': get_filters(),
+        'mode': mode,
+        'approx': [get_approx_fraction(), get_approx_key()] if mode == 'approx' else None,
+        # Sketch merges (t-digest percentiles) depend on how the rows were split
+        'sketches': use_sketches(),
+        'workers': get_max_workers(),
+        'chunksize': int(get_cli_option('chunksize', 'CHUNKSIZE', STREAM_CHUNKSIZE)) if mode == 'stream' else None,
+        # HyperLogLog hashes differ for id codes and ids (see sketches.hash_series)
+        'id_encoding': use_id_encoding(),
+        'city_mapping': CITY_MAPPING,
+        'category_mapping': CATEGORY_MAPPING,
+        'bins': [PRICE_BINS, PRICE_LABELS, RANK_BINS, RANK_LABELS]
+    }
+
+
+def get_result_paths(filename, modules, mode: str = 'pandas') -> dict:
+    """Cache file of each module's result for the current inputs, settings and sources, by module name."""
+    settings = json.dumps(get_cache_settings(filename, mode), sort_keys=True, default=str)
+    engine = source_version(*SHARED_SOURCES, MODE_SOURCES[mode])
+    paths = {}
+    for module in modules:
+        name = module_name(module)
+        key = hashlib.sha1(f"{settings}|{engine}|{source_version(f'analysis_modules/{name}.py')}".encode()).hexdigest()
+        paths[name] = os.path.join(RESULT_CACHE_PATH, f"{name}-{key[:24]}.pkl")
+    return paths
+
+
+def load_results(paths: dict):
+    """
+    Cached results of all modules in paths, or None unless every one is cached.
+
+    Hits are touched, so eviction drops the least recently used results first.
+    """
+    if has_cli_flag('refresh', 'REFRESH_RESULT_CACHE') or not all(os.path.exists(path) for path in paths.values()):
+        return None
+    results = {}
+    for name, path in paths.items():
+        with open(path, 'rb') as f:
+            results[name] = pickle.load(f)
+        os.utime(path)
+    return results
+
+
+def evict(max_bytes: int):
+    """Drop the least recently used results until the cache fits in max_bytes."""
+    entries = []
+    for path in glob.glob(os.path.join(RESULT_CACHE_PATH, "*.pkl")):
+        stat = os.stat(path)
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+def store_results(paths: dict, results: dict):
+    """Cache the results of the modules in paths, then bound the cache size (see config.RESULT_CACHE_MAX_BYTES)."""
+    os.makedirs(RESULT_CACHE_PATH, exist_ok=True)
+    for name, path in paths.items():
+        write_atomic(path, pickle.dumps(results[name]))
+    evict(get_result_cache_max_bytes())
+
+
+def cached_results(filename, modules, analyze, mode: str = 'pandas') -> tuple:
+    """
+    Results of modules on filename, from the cache when every one is cached.
+
+    On a miss analyze() computes them (a tuple in the order of modules) and
+    they are cached. Keys hash the input fingerprint (see
+    frame_cache.get_input_fingerprint), data source, --filter predicates,
+    sketch / RFM / segment settings, workers, stream chunk size, id
+    encoding, city and category mappings, price and rank bins, the
+    analysis mode and the sources of the module and of the code loading
+    and computing it, so any change recomputes. Pass --no-cache
+    (NO_RESULT_CACHE=1) to bypass the cache, --refresh
+    (REFRESH_RESULT_CACHE=1) to recompute and overwrite it.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH
+        modules: Analysis modules (e.g. ``metrics``, ``user``)
+        analyze: Callable computing the modules' results on a miss
+        mode: Analysis mode computing the results (see get_mode)
+
+    Returns:
+        Results of modules, in order
+    """
+    if not use_result_cache():
+        return tuple(analyze())
+
+    paths = get_result_paths(filename, modules, mode)
+    results = load_results(paths)
+    if results is not None:
+        print(f"⚡ 命中结果缓存: {', '.join(results)}")
+        return tuple(results.values())
+
+    computed = tuple(analyze())
+    store_results(paths, dict(zip(paths, computed)))
+    return computed
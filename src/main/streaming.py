@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Chunked streaming execution of the analysis modules with bounded memory
+@Version: 1.5
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .config import get_max_workers, get_rfm_scoring
+from .data_loader import load_data_pandas_chunks, resolve_input_files
+from .preprocess import preprocess_eleme_data
+from .analysis_modules import ANALYSIS_COLUMNS, ANALYSIS_MODULES, finalize_states
+from .analysis_modules.aggregate import merge_states
+from .analysis_modules.engine import count_candidates, partial_states, topk_candidates, verify_topk
+from .analysis_modules.rfm import RFM_COLUMNS, make_rfm_scorer, partial_rfm_stats
+
+# Columns read by the statistics pass
+STATS_COLUMNS = ['label', 'avg_price'] + list(RFM_COLUMNS.values())
+
+def run_on_pool(func, args_list: list, workers: int) -> list:
+    """Run func over args_list on a process pool (inline for a single task or worker)."""
+    if len(args_list) == 1 or workers <= 1:
+        return [func(*args) for args in args_list]
+    with ProcessPoolExecutor(max_workers=min(workers, len(args_list))) as pool:
+        return list(pool.map(func, *zip(*args_list)))
+
+def collect_file_stats(path: str, chunksize: int, scoring: str) -> dict:
+    """
+    Statistics pass over one input file.
+
+    Returns:
+        price_sum / price_count: avg_price totals over all rows (the NaN fill of
+                                 preprocess_eleme_data happens before the label filter)
+        rfm_stats: partial_rfm_stats of the rows kept by preprocessing
+    """
+    price_sum, price_count = 0.0, 0
+    rfm_stats = None
+
+    for chunk in load_data_pandas_chunks(path, chunksize, usecols=STATS_COLUMNS):
+        price = chunk['avg_price'].astype('float64')
+        price_sum += price.sum()
+        price_count += price.count()
+
+        kept = chunk[chunk['label'].isin([0, 1])]
+        rfm_stats = merge_states(rfm_stats, partial_rfm_stats(kept, scoring))
+
+    return {'price_sum': price_sum, 'price_count': price_count, 'rfm_stats': rfm_stats}
+
+def collect_stats(paths: list, chunksize: int, workers: int = 1, base: dict = None) -> dict:
+    """
+    Cheap first pass for the preprocessing / scoring steps that need global statistics.
+
+    Args:
+        base: Statistics of data processed before paths (see incremental), merged in
+
+    Returns:
+        price_sum / price_count: avg_price totals
+        avg_price_mean: global mean used to fill missing prices
+        rfm_stats: global RFM statistics (t-digests or value counts, see rfm.partial_rfm_stats)
+        offsets: per file, RFM statistics of the files before it (exact scoring only)
+    """
+    print("📏 统计预扫描...")
+    # Resolved here so worker processes agree on it
+    scoring = get_rfm_scoring()
+    file_stats = run_on_pool(collect_file_stats, [(path, chunksize, scoring) for path in paths], workers)
+
+    base = base or {'price_sum': 0.0, 'price_count': 0, 'rfm_stats': None}
+    price_sum = base['price_sum'] + sum(stats['price_sum'] for stats in file_stats)
+    price_count = base['price_count'] + sum(stats['price_count'] for stats in file_stats)
+    rfm_stats = base['rfm_stats']
+    offsets = []
+    for stats in file_stats:
+        offsets.append(rfm_stats if scoring == 'exact' else None)
+        rfm_stats = merge_states(rfm_stats, stats['rfm_stats'])
+
+    return {
+        'price_sum': price_sum,
+        'price_count': price_count,
+        'avg_price_mean': price_sum / price_count if price_count > 0 else float('nan'),
+        'rfm_stats': rfm_stats,
+        'offsets': offsets
+    }
+
+def stream_file(path: str, chunksize: int, avg_price_mean: float, rfm_stats: dict, offsets: dict = None) -> dict:
+    """
+    Reduce one input file chunk by chunk to the partial states of the analysis modules.
+    """
+    scorer = make_rfm_scorer(rfm_stats, offsets)
+    states = {}
+
+    rows = 0
+    for chunk in load_data_pandas_chunks(path, chunksize, usecols=ANALYSIS_COLUMNS):
+        chunk = preprocess_eleme_data(chunk, avg_price_mean=avg_price_mean, verbose=False)
+        f_score, m_score = scorer.score(chunk)
+        # One fused pass per chunk; the global RFM scores replace the per-chunk ones
+        chunk_states = partial_states(chunk.assign(f_score=f_score, m_score=m_score), ANALYSIS_MODULES)
+        for name, state in chunk_states.items():
+            states[name] = merge_states(states.get(name), state)
+        rows += len(chunk)
+        print(f"  {path}: 已处理 {rows} 行")
+    return states
+
+def count_file_candidates(path: str, chunksize: int, avg_price_mean: float, candidates: dict) -> dict:
+    """
+    Exact counts of the top-K candidate keys in one input file (see engine.count_candidates).
+    """
+    counts = None
+    for chunk in load_data_pandas_chunks(path, chunksize, usecols=ANALYSIS_COLUMNS):
+        chunk = preprocess_eleme_data(chunk, avg_price_mean=avg_price_mean, verbose=False)
+        counts = merge_states(counts, count_candidates(chunk, candidates, ANALYSIS_MODULES))
+    return counts
+
+def stream_states(paths: list, chunksize: int, workers: int, stats: dict) -> dict:
+    """
+    Merged partial states of the analysis modules over paths, with exact top-K.
+
+    Args:
+        stats: collect_stats of paths
+
+    Returns:
+        {module name: merged partial state}
+    """
+    print("🔁 分块分析...")
+    file_states = run_on_pool(
+        stream_file,
+        [(path, chunksize, stats['avg_price_mean'], stats['rfm_stats'], offsets)
+         for path, offsets in zip(paths, stats['offsets'])],
+        workers
+    )
+
+    states = {}
+    for file_state in file_states:
+        for name, state in file_state.items():
+            states[name] = merge_states(states.get(name), state)
+
+    candidates = topk_candidates(states)
+    if candidates:
+        print("🔎 Top-K 候选精确计数...")
+        file_counts = run_on_pool(
+            count_file_candidates,
+            [(path, chunksize, stats['avg_price_mean'], candidates) for path in paths],
+            workers
+        )
+        counts = None
+        for file_count in file_counts:
+            counts = merge_states(counts, file_count)
+        states = verify_topk(states, candidates, counts)
+    return states
+
+def run_streaming(filename, chunksize: int, workers: int = None):
+    """
+    Run metrics / user / product / behavior analysis chunk by chunk.
+
+    Each chunk is preprocessed with the global statistics, reduced to the
+    modules' partial states and merged, so memory is bounded by the chunk
+    size plus the (small) aggregate states. Several input files (globs,
+    lists, .gz/.zip) are decompressed and analyzed concurrently, one file
+    per worker process, and only their partial states are sent back.
+    Top-K summaries that dropped keys get a last pass counting only their
+    candidate keys exactly.
+    The results have the same structure as the in-memory
+    calculate_metrics / analyze_* functions.
+
+    Args:
+        filename: File name(s) or glob pattern in DATA_PATH
+        chunksize: Rows per chunk
+        workers: Worker processes, defaults to config.get_max_workers()
+
+    Returns:
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    paths = resolve_input_files(filename)
+    workers = workers or get_max_workers()
+    stats = collect_stats(paths, chunksize, workers)
+    return finalize_states(stream_states(paths, chunksize, workers, stats))
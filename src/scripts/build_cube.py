@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Build the pre-aggregated OLAP cube of an input (one scan), for generate_dashboard.py --cube
+@Usage:
+    python src/scripts/build_cube.py --input-file=D1_0.csv
+    python src/scripts/build_cube.py --source=parquet
+    python src/scripts/generate_dashboard.py --input-file=D1_0.csv --cube
+@Version: 1.0
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.config import get_input_filename
+from main.cube import build_cube
+
+
+def main():
+    print(f"🧊 构建 OLAP cube: {get_input_filename()}")
+
+    try:
+        cube_dir = build_cube(get_input_filename())
+    except Exception as e:
+        print(f"❌ 构建失败: {e}")
+        return
+
+    print(f"✅ cube 已生成: {cube_dir}")
+
+
+if __name__ == "__main__":
+    main()
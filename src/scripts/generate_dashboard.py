@@ -5,7 +5,16 @@
 @Author: Jupiter.Lin
 @CreateDate: 2026-01-24
 @Description: Main script to generate dashboard JSON data (split into multiple files)
-@Version: 3.0
+              --stream --chunksize=N: chunked streaming mode with bounded memory
+              --approx=F [--approx-key=COL]: approximate mode on a sample, with confidence intervals
+              --incremental [--rebuild] [--watch]: merge only new input files into the persisted states
+              --workers=N: in-memory analysis of row slices on N processes over a shared-memory frame
+              --engine=polars: preprocessing and analysis as Polars lazy queries over the raw files
+              --engine=duckdb: preprocessing and analysis as SQL on an in-process DuckDB over the raw files
+              --filter visit_city=2: dashboard of the matching rows only (in-memory, polars and duckdb engines)
+              --cube: dashboard answered from the pre-aggregated OLAP cube (no --filter, see cube.run_cube)
+              --no-cache / --refresh: bypass / recompute the cached module results (result_cache)
+@Version: 3.10
 """
 
 import sys
@@ -18,13 +27,15 @@ import numpy as np
 # Add src to sys.path to import main packages
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 
-from main.config import get_input_filename, OUTPUT_PATH
-from main.data_loader import load_data_pandas
-from main.preprocess import preprocess_eleme_data
-from main.analysis_modules.metrics import calculate_metrics
-from main.analysis_modules.user import analyze_user
-from main.analysis_modules.product import analyze_product
-from main.analysis_modules.behavior import analyze_behavior
+from main.config import (get_input_filename, get_cli_option, has_cli_flag, get_approx_fraction, get_approx_key,
+                         get_engine, get_filters, get_watch_interval, OUTPUT_PATH, STREAM_CHUNKSIZE)
+from main.frame_cache import load_preprocessed
+from main.streaming import run_streaming
+from main.approx import run_approx
+from main.incremental import run_incremental, watch
+from main.parallel import analyze_parallel
+from main.result_cache import get_mode, get_result_paths, load_results, store_results, use_result_cache
+from main.analysis_modules import ANALYSIS_MODULES
 from main.analysis_modules.summary import generate_summary
 
 
@@ -113,33 +124,22 @@ def save_json(data, filename):
     print(f"  ✓ 生成: {filename}")
 
 
-def main():
-    print("🚀 开始生成仪表盘数据...")
-    
-    # 1. 加载数据
-    try:
-        df = load_data_pandas(get_input_filename())
-    except Exception as e:
-        print(f"❌ 数据加载失败: {e}")
-        return
+def save_results(results):
+    """
+    生成汇总并保存所有 JSON 文件
 
-    # 2. 数据预处理
-    df_clean = preprocess_eleme_data(df)
-    
-    # 3. 执行分析
-    print("📊 运行分析模块...")
+    参数：
+    ------
+    results : tuple
+        (metrics_res, user_res, prod_res, beh_res)
+    """
+    metrics_res, user_res, prod_res, beh_res = results
+    sum_res = generate_summary(metrics_res, user_res)
     
     # 创建输出目录
     if not os.path.exists(OUTPUT_PATH):
         os.makedirs(OUTPUT_PATH)
     
-    # 计算各模块数据
-    metrics_res = calculate_metrics(df_clean)
-    user_res = analyze_user(df_clean)
-    prod_res = analyze_product(df_clean)
-    beh_res = analyze_behavior(df_clean)
-    sum_res = generate_summary(metrics_res, user_res)
-    
     # 4. 保存为独立的JSON文件
     print("\n💾 保存分析结果...")
     save_json(metrics_res, 'metrics.json')
@@ -161,5 +161,115 @@ def main():
     print(f"📂 输出目录: {OUTPUT_PATH}")
 
 
+def main():
+    print("🚀 开始生成仪表盘数据...")
+
+    # 数据过滤 (--filter): Parquet 数据源只读取可能匹配的分区与行组
+    # 使用示例: python src/scripts/generate_dashboard.py --source=parquet --filter visit_city=2
+    try:
+        filters = get_filters()
+    except ValueError as e:
+        print(f"❌ 过滤条件无效: {e}")
+        return
+    if filters:
+        # cube 的单元格按全量数据预处理 (avg_price / visit_city 填充值、RFM 分档)，无法复现其他引擎“先过滤再预处理”的结果
+        if any(has_cli_flag(*flag) for flag in [('incremental', 'INCREMENTAL'), ('stream', 'STREAM'), ('cube', 'USE_CUBE')]) \
+                or get_approx_fraction():
+            print("❌ --filter 不支持增量 / 近似 / 流式 / cube 模式")
+            return
+        print(f"🔍 过滤条件: {filters}")
+
+    # 结果缓存: 输入、过滤条件、配置与模块源码均未变化时直接读取上次的模块结果 (增量模式自行合并状态，不缓存)
+    # 使用示例: python src/scripts/generate_dashboard.py --refresh
+    cache_paths = None
+    if use_result_cache() and not has_cli_flag('incremental', 'INCREMENTAL'):
+        try:
+            cache_paths = get_result_paths(get_input_filename(), ANALYSIS_MODULES, get_mode())
+        except Exception as e:
+            print(f"❌ 数据加载失败: {e}")
+            return
+        cached = load_results(cache_paths)
+        if cached is not None:
+            print(f"⚡ 命中结果缓存，跳过加载与分析: {', '.join(cached)}")
+            save_results(tuple(cached.values()))
+            return
+    
+    if has_cli_flag('incremental', 'INCREMENTAL'):
+        # 1-3. 增量模式: 只流式处理新文件，并合并进 PROCESSED_PATH 下保存的聚合状态
+        # 使用示例: python src/scripts/generate_dashboard.py --incremental --input-file="D1_*.csv" [--watch]
+        chunksize = int(get_cli_option('chunksize', 'CHUNKSIZE', STREAM_CHUNKSIZE))
+        try:
+            if has_cli_flag('watch', 'WATCH'):
+                # 轮询 DATA_PATH，有新文件时自动增量更新并重新输出 JSON
+                watch(get_input_filename(), chunksize, get_watch_interval(), save_results)
+                return
+            results = run_incremental(get_input_filename(), chunksize, rebuild=has_cli_flag('rebuild', 'REBUILD'))
+        except Exception as e:
+            print(f"❌ 增量分析失败: {e}")
+            return
+    elif get_approx_fraction():
+        # 1-3. 近似模式: 单遍抽样后运行分析，计数按比例放大，每个模块附带 confidence_intervals
+        # 使用示例: python src/scripts/generate_dashboard.py --approx=0.01 --approx-key=user_id
+        try:
+            results = run_approx(get_input_filename(), get_approx_fraction(), key=get_approx_key())
+        except Exception as e:
+            print(f"❌ 近似分析失败: {e}")
+            return
+    elif has_cli_flag('cube', 'USE_CUBE'):
+        # 1-3. OLAP cube: 由预聚合 cube 计算 (缺失或过期时先扫描一次构建)，重复生成仪表盘不再扫描明细
+        # 使用示例: python src/scripts/generate_dashboard.py --cube
+        try:
+            from main.cube import run_cube
+            results = run_cube(get_input_filename())
+        except Exception as e:
+            print(f"❌ cube 分析失败: {e}")
+            return
+    elif get_engine() == 'polars':
+        # 1-3. Polars 引擎: 预处理与各模块聚合作为惰性查询在原始文件上多线程流式执行 (可选依赖，按需导入)
+        # 使用示例: python src/scripts/generate_dashboard.py --engine=polars
+        try:
+            from main.polars_engine import run_polars
+            results = run_polars(get_input_filename())
+        except Exception as e:
+            print(f"❌ Polars 分析失败: {e}")
+            return
+    elif get_engine() == 'duckdb':
+        # 1-3. DuckDB 引擎: 预处理与各模块聚合作为 SQL 在嵌入式 DuckDB 中执行，超出内存时溢写磁盘 (可选依赖，按需导入)
+        # 使用示例: python src/scripts/generate_dashboard.py --engine=duckdb
+        try:
+            from main.duckdb_engine import run_duckdb
+            results = run_duckdb(get_input_filename())
+        except Exception as e:
+            print(f"❌ DuckDB 分析失败: {e}")
+            return
+    elif has_cli_flag('stream', 'STREAM'):
+        # 1-3. 流式模式: 分块加载、预处理并执行分析，内存占用由 chunksize 决定
+        # 使用示例: python src/scripts/generate_dashboard.py --stream --chunksize=500000
+        chunksize = int(get_cli_option('chunksize', 'CHUNKSIZE', STREAM_CHUNKSIZE))
+        try:
+            results = run_streaming(get_input_filename(), chunksize)
+        except Exception as e:
+            print(f"❌ 流式分析失败: {e}")
+            return
+    else:
+        # 1-2. 加载预处理后的数据 (命中缓存时内存映射读取，跳过解析与预处理)
+        try:
+            df_clean = load_preprocessed(get_input_filename())
+        except Exception as e:
+            print(f"❌ 数据加载失败: {e}")
+            return
+
+        # 3. 执行分析
+        print("📊 运行分析模块...")
+
+        # 计算各模块数据 (融合引擎: 各模块共享派生列与分组聚合，一次完成；
+        # 多核时数据放入共享内存，各进程按行切片并行计算后合并，--workers=1 为单进程)
+        results = analyze_parallel(df_clean)
+
+    if cache_paths:
+        store_results(cache_paths, dict(zip(cache_paths, results)))
+    save_results(results)
+
+
 if __name__ == "__main__":
     main()
@@ -5,7 +5,7 @@
 @Author: Jupiter.Lin
 @CreateDate: 2026-01-25
 @Description: Generate product analysis data independently
-@Version: 1.0
+@Version: 1.1
 """
 
 import sys
@@ -16,9 +16,10 @@ import pandas as pd
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 
 from main.config import get_input_filename, OUTPUT_PATH
-from main.data_loader import load_data_pandas
-from main.preprocess import preprocess_eleme_data
-from main.analysis_modules.product import analyze_product
+from main.frame_cache import load_preprocessed
+from main.result_cache import cached_results
+from main.analysis_modules import product
+from main.analysis_modules.product import analyze_product, REQUIRED_COLUMNS
 
 
 def convert_to_json_serializable(o):
@@ -32,10 +33,10 @@ def convert_to_json_serializable(o):
 def main():
     print("🍔 生成商品分析数据...")
     
-    df = load_data_pandas(get_input_filename())
-    df_clean = preprocess_eleme_data(df)
-    
-    prod_res = analyze_product(df_clean)
+    # 命中结果缓存时跳过加载与分析 (--no-cache / --refresh)
+    filename = get_input_filename()
+    prod_res, = cached_results(filename, [product],
+                               lambda: [analyze_product(load_preprocessed(filename, usecols=REQUIRED_COLUMNS))])
     
     if not os.path.exists(OUTPUT_PATH):
         os.makedirs(OUTPUT_PATH)
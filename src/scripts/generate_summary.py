@@ -5,7 +5,7 @@
 @Author: Jupiter.Lin
 @CreateDate: 2026-01-25
 @Description: Generate summary table data independently
-@Version: 1.0
+@Version: 1.1
 """
 
 import sys
@@ -16,8 +16,9 @@ import pandas as pd
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 
 from main.config import get_input_filename, OUTPUT_PATH
-from main.data_loader import load_data_pandas
-from main.preprocess import preprocess_eleme_data
+from main.frame_cache import load_preprocessed
+from main.result_cache import cached_results
+from main.analysis_modules import get_required_columns, metrics, user
 from main.analysis_modules.metrics import calculate_metrics
 from main.analysis_modules.user import analyze_user
 from main.analysis_modules.summary import generate_summary
@@ -34,11 +35,14 @@ def convert_to_json_serializable(o):
 def main():
     print("📋 生成汇总表数据...")
     
-    df = load_data_pandas(get_input_filename())
-    df_clean = preprocess_eleme_data(df)
-    
-    metrics_res = calculate_metrics(df_clean)
-    user_res = analyze_user(df_clean)
+    # 命中结果缓存时跳过加载与分析 (--no-cache / --refresh)
+    filename = get_input_filename()
+
+    def analyze():
+        df_clean = load_preprocessed(filename, usecols=get_required_columns(metrics, user))
+        return calculate_metrics(df_clean), analyze_user(df_clean)
+
+    metrics_res, user_res = cached_results(filename, [metrics, user], analyze)
     sum_res = generate_summary(metrics_res, user_res)
     
     if not os.path.exists(OUTPUT_PATH):
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Convert raw CSV files into the partitioned Parquet dataset
+@Usage:
+    python src/scripts/ingest.py                          # data/raw/D1_[0-9].csv*
+    python src/scripts/ingest.py --pattern=D1_0_top_10k.csv
+    python src/scripts/generate_dashboard.py --source=parquet
+@Version: 1.0
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.config import get_cli_option
+from main.ingest import convert_csv_to_parquet
+
+
+def main():
+    pattern = get_cli_option('pattern', 'INGEST_PATTERN', 'D1_[0-9].csv*')
+    print(f"📦 转换原始CSV为Parquet数据集: {pattern}")
+
+    try:
+        output_dir = convert_csv_to_parquet(pattern)
+    except Exception as e:
+        print(f"❌ 转换失败: {e}")
+        return
+
+    print(f"✅ Parquet数据集已生成: {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: Ad-hoc SQL over the input files on an in-process DuckDB
+              Tables: raw (typed raw columns), impressions (preprocessed),
+                      analysis (impressions plus the modules' derived columns, with --analysis)
+@Usage:
+    python src/scripts/query.py --sql="SELECT visit_city, avg(label) FROM impressions GROUP BY 1 ORDER BY 2 DESC LIMIT 10"
+    python src/scripts/query.py --analysis --sql="SELECT segment, count(*) FROM analysis GROUP BY 1"
+    python src/scripts/query.py --input-file=BIG.csv --sql="..." --output=result.csv
+    python src/scripts/query.py --filter visit_city=2 --sql="SELECT count(*) FROM impressions"
+@Version: 1.0
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.config import get_cli_option, get_filters, get_input_filename, has_cli_flag, COLUMN_NAMES, OUTPUT_PATH
+
+
+def main():
+    sql = get_cli_option('sql', 'QUERY_SQL', None)
+    if not sql:
+        print("❌ 请通过 --sql=\"SELECT ...\" 指定查询")
+        return
+
+    try:
+        from main.duckdb_engine import connect, create_analysis_table
+        from main.analysis_modules import ANALYSIS_MODULES
+        # All raw columns are available for ad-hoc queries
+        con = connect(get_input_filename(), usecols=COLUMN_NAMES, filters=get_filters())
+        if has_cli_flag('analysis', 'QUERY_ANALYSIS'):
+            create_analysis_table(con, *[module.DERIVED_COLUMNS for module in ANALYSIS_MODULES])
+        result = con.sql(sql).df()
+        con.close()
+    except Exception as e:
+        print(f"❌ 查询失败: {e}")
+        return
+
+    output = get_cli_option('output', 'QUERY_OUTPUT', None)
+    if output:
+        path = os.path.join(OUTPUT_PATH, output)
+        result.to_csv(path, index=False)
+        print(f"✅ 查询结果已保存: {path} ({len(result)} 行)")
+    else:
+        print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
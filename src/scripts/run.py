@@ -4,37 +4,61 @@
 """
 @Author: Jupiter.Lin
 @CreateDate: 2025-11-29
-@Description: 启动脚本
-@Version: 1.0
+@Description: 启动脚本：在 Dask 集群上对全量数据运行分析模块。
+              预处理后的数据先 persist 到集群内存，分析在各 worker 上按分区聚合，最多三次 dask.compute
+              （RFM 分档统计、主图、Top-K 候选校验，见 dask_engine.dask_partial_states）共用这些分区，
+              CSV 只读取、预处理一次；只有聚合后的小结果回到本地输出 JSON（不再 compute 整个数据集）。
+              输入超出集群内存时加 --no-persist：不占用集群内存，但每次 compute 都重新读取并预处理 CSV。
+@Usage:
+    python src/scripts/run.py --input-file=D1_0.csv
+    python src/scripts/run.py --input-file="D1_*.csv" --no-persist
+@Version: 2.1
 """
 
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.config import get_input_filename, has_cli_flag, OUTPUT_PATH
 from main.dask_cluster import init_cluster
-from main.data_loader import load_data_dask, to_pandas
-from main.preprocess import preprocess
-from main.analysis import analyze
-from main.visualize import plot_daily
+from main.data_loader import load_data_dask
+from main.preprocess import preprocess_eleme_data
+from main.analysis_modules import analyze_all
+from main.analysis_modules.summary import generate_summary
+from generate_dashboard import save_json
 
-if __name__ == "__main__":
+
+def main():
     # 1. 启动 Dask 多核集群
     client = init_cluster()
 
-    # 2. Dask 加载大数据
-    df_dask = load_data_dask("example_large.csv")
+    # 2. Dask 加载大数据（惰性）
+    df_dask = load_data_dask(get_input_filename())
 
-    # 3. 数据预处理（仍然用 Dask）
-    df_dask_clean = preprocess(df_dask)
+    # 3. 数据预处理（仍然用 Dask，按分区执行），persist 后各次 compute 不再重复读取 CSV 与计算 avg_price 均值
+    df_dask_clean = preprocess_eleme_data(df_dask)
+    if not has_cli_flag('no-persist', 'NO_PERSIST'):
+        df_dask_clean = df_dask_clean.persist()
 
-    # 4. 转换为 pandas（用于深度分析与画图）
-    df = to_pandas(df_dask_clean)
+    # 4. 分析：各分区在 worker 上归约为聚合状态，只取回合并后的结果
+    print("📊 运行分析模块 (Dask)...")
+    metrics_res, user_res, prod_res, beh_res = analyze_all(df_dask_clean)
+    sum_res = generate_summary(metrics_res, user_res)
 
-    # 5. 分析
-    summary, daily = analyze(df)
-
-    print(summary)
-    print(daily.head())
-
-    # 6. 绘图
-    plot_daily(daily)
+    # 5. 保存结果
+    if not os.path.exists(OUTPUT_PATH):
+        os.makedirs(OUTPUT_PATH)
+    print("\n💾 保存分析结果...")
+    save_json(metrics_res, 'metrics.json')
+    save_json(user_res, 'user.json')
+    save_json(prod_res, 'product.json')
+    save_json(beh_res, 'behavior.json')
+    save_json(sum_res, 'summary.json')
 
+    client.close()
+    print(f"\n✅ 所有数据文件生成成功!")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: 对比 CSV 解析后端的吞吐量 (MB/s)：pandas C 解析器 / pandas python 引擎 / pyarrow 多线程解析器。
+              同一个文件、同一套类型 schema 与列裁剪，依次计时。
+@Usage:
+    python src/test/benchmark_csv_parser.py                               # data/raw/D1_0.csv
+    python src/test/benchmark_csv_parser.py --input-file=D1_0_top_10k.csv --with-python
+@Version: 1.0
+"""
+
+import os
+import sys
+from time import perf_counter
+
+import pandas as pd
+import psutil
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.config import DATA_PATH, COLUMN_NAMES, get_cli_option, get_column_dtypes, has_cli_flag
+from main.analysis_modules import ANALYSIS_COLUMNS
+from main.data_loader import read_csv_arrow, arrow_to_pandas
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def parse_pandas(path, engine):
+    return pd.read_csv(path, names=COLUMN_NAMES, header=None, usecols=ANALYSIS_COLUMNS,
+                       dtype=get_column_dtypes(ANALYSIS_COLUMNS), engine=engine)
+
+
+def main():
+    path = os.path.join(DATA_PATH, get_cli_option('input-file', 'INPUT_FILENAME', 'D1_0.csv'))
+    if not os.path.exists(path):
+        print(f"文件不存在: {path}", file=sys.stderr)
+        sys.exit(1)
+
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    print(f"文件: {path}  大小: {size_mb:.2f} MB  CPU: {os.cpu_count()}  列数: {len(ANALYSIS_COLUMNS)}")
+
+    backends = [
+        ("pandas c", lambda: parse_pandas(path, "c")),
+        ("pyarrow -> Arrow table", lambda: read_csv_arrow(path, ANALYSIS_COLUMNS)),
+        ("pyarrow -> pandas", lambda: arrow_to_pandas(read_csv_arrow(path, ANALYSIS_COLUMNS))),
+    ]
+    if has_cli_flag('with-python'):
+        # python 引擎非常慢，仅在显式要求时对比
+        backends.append(("pandas python", lambda: parse_pandas(path, "python")))
+
+    print(f"{'backend':<24}{'seconds':>10}{'MB/s':>10}{'rows':>14}{'RSS(MB)':>10}")
+    for name, parse in backends:
+        t0 = perf_counter()
+        result = parse()
+        elapsed = perf_counter() - t0
+        rows = result.num_rows if hasattr(result, 'num_rows') else len(result)
+        print(f"{name:<24}{elapsed:>10.2f}{size_mb / elapsed:>10.1f}{rows:>14}{rss_mb():>10.0f}")
+        del result
+
+
+if __name__ == "__main__":
+    main()
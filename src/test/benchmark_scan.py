@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: 字节区间并行扫描器 (data_loader.scan_csv) 与 Dask 的耗时对比。
+              以核心指标为例：第一遍扫描求 avg_price 均值，第二遍在各 worker 内预处理并归约为 partial_metrics，
+              结果与内存模式 calculate_metrics 对比校验。
+@Usage:
+    python src/test/benchmark_scan.py                               # 默认输入文件 (config.get_input_filename)
+    python src/test/benchmark_scan.py --input-file=D1_0.csv --workers=8 --range-mb=128
+@Version: 1.1
+"""
+
+import functools
+import os
+import sys
+from time import perf_counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.config import get_cli_option, get_input_filename, get_max_workers
+from main.data_loader import scan_csv, load_data_pandas, load_data_dask
+from main.preprocess import preprocess_eleme_data
+from main.analysis_modules.metrics import REQUIRED_COLUMNS, partial_metrics, finalize_metrics, calculate_metrics
+
+
+def price_stats(df):
+    price = df['avg_price'].astype('float64')
+    return {'price_sum': price.sum(), 'price_count': price.count()}
+
+
+def metrics_state(df, avg_price_mean):
+    return partial_metrics(preprocess_eleme_data(df, avg_price_mean=avg_price_mean, verbose=False))
+
+
+def run_scan(filename, workers, range_bytes):
+    stats = scan_csv(filename, price_stats, usecols=['avg_price'], workers=workers, range_bytes=range_bytes)
+    mean = stats['price_sum'] / stats['price_count']
+    reducer = functools.partial(metrics_state, avg_price_mean=mean)
+    return finalize_metrics(scan_csv(filename, reducer, usecols=REQUIRED_COLUMNS, workers=workers, range_bytes=range_bytes))
+
+
+def run_dask(filename):
+    df = load_data_dask(filename, usecols=REQUIRED_COLUMNS)
+    return int(df['label'].sum().compute()), len(df)
+
+
+def main():
+    filename = get_input_filename()
+    workers = get_max_workers()
+    range_bytes = int(float(get_cli_option('range-mb', None, 64)) * 1024 * 1024)
+
+    t0 = perf_counter()
+    expected = calculate_metrics(preprocess_eleme_data(load_data_pandas(filename, usecols=REQUIRED_COLUMNS), verbose=False))
+    print(f"pandas 单进程: {perf_counter() - t0:.2f}s")
+
+    timings = {}
+    for n in sorted({1, workers}):
+        t0 = perf_counter()
+        result = run_scan(filename, n, range_bytes)
+        timings[n] = perf_counter() - t0
+        status = "✅ 一致" if result == expected else "❌ 不一致"
+        print(f"scan_csv workers={n}: {timings[n]:.2f}s  {status}")
+    if workers > 1:
+        print(f"加速比: {timings[1] / timings[workers]:.2f}x ({workers} workers)")
+
+    t0 = perf_counter()
+    run_dask(filename)
+    print(f"Dask (默认调度器): {perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
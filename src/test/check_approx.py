@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: 近似模式置信区间检查：
+              1. 排行榜（top_products / top_shops / top_brands）的点击数与 CTR 按商品标签对齐，
+                 而不是按列表位置（各重复样本的排名不同）；
+              2. CTR / 转化率等百分比的区间都在 [0, 100] 内，其余区间下界不小于 0。
+@Usage:
+    python src/test/check_approx.py                                  # config 中的默认输入文件
+    python src/test/check_approx.py --input-file=BIG.csv --approx=0.1
+@Version: 1.0
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.approx import flatten_numbers, is_percent_path, run_approx
+from main.config import get_approx_fraction, get_approx_key, get_input_filename
+
+LEADERBOARDS = {'top_products': 'items', 'top_shops': 'shops', 'top_brands': 'brands'}
+
+
+def check_alignment() -> list:
+    """The same leaderboard in two orders must flatten to the same leaves."""
+    board = {'items': ['Item_a', 'Item_b'], 'clicks': [120, 80], 'ctr': [4.0, 3.0]}
+    swapped = {'items': ['Item_b', 'Item_a'], 'clicks': [80, 120], 'ctr': [3.0, 4.0]}
+    if flatten_numbers({'top_products': board}) != flatten_numbers({'top_products': swapped}):
+        return ["排行榜按位置而不是按标签展开"]
+    return []
+
+
+def check_intervals(name: str, result: dict) -> list:
+    errors = []
+    for path, (low, high) in result.get('confidence_intervals', {}).items():
+        if low < 0 or (is_percent_path(path) and high > 100):
+            errors.append(f"{name}: {path} 区间越界 [{low}, {high}]")
+        chart = path.split('.')[0]
+        if chart in LEADERBOARDS and path.split('.')[2] not in result[chart][LEADERBOARDS[chart]]:
+            errors.append(f"{name}: {path} 未按 {LEADERBOARDS[chart]} 标签对齐")
+    ctr_paths = [path for path in result.get('confidence_intervals', {}) if '.ctr.' in path or path.endswith('_ctr')]
+    print(f"   {name}: {len(result.get('confidence_intervals', {}))} 个区间, 其中 CTR {len(ctr_paths)} 个")
+    return errors
+
+
+def main():
+    fraction = get_approx_fraction() or 0.1
+    errors = check_alignment()
+    results = run_approx(get_input_filename(), fraction, key=get_approx_key())
+    for result in results:
+        for name, module_result in result.items():
+            errors += check_intervals(name, module_result)
+
+    for error in errors[:20]:
+        print(f"❌ {error}")
+    if errors:
+        print(f"❌ 置信区间检查失败: {len(errors)} 处")
+        sys.exit(1)
+    print("✅ 置信区间检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: HyperLogLog 去重计数回归检查：与精确 nunique 对比相对误差。
+              覆盖随机 id、按 user_id 哈希抽样后的 id（与 approx.sample_chunk 同一哈希，
+              未加盐时会集中到少数寄存器导致严重低估）以及分组计数与合并。
+@Usage:
+    python src/test/check_sketches.py
+    python src/test/check_sketches.py --hll-precision=12
+@Version: 1.0
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main.config import get_hll_precision
+from main.analysis_modules.sketches import HyperLogLog, GroupedHyperLogLog, DistinctCount, GroupedDistinctCount
+
+
+def check(name: str, estimate: float, exact: int, tolerance: float) -> bool:
+    error = abs(estimate - exact) / exact
+    ok = error <= tolerance
+    print(f"{'✅' if ok else '❌'} {name:<36}{exact:>10}{estimate:>12.0f}{error:>10.2%}")
+    return ok
+
+
+def main():
+    # 5 个标准误差（1.04 / sqrt(2^p)）作为容忍上限
+    tolerance = 5 * 1.04 / np.sqrt(2 ** get_hll_precision())
+    rng = np.random.default_rng(0)
+    ids = pd.Series(rng.integers(0, 10 ** 9, 200_000)).astype(str)
+
+    # 与 approx.sample_chunk 相同：保留哈希 / 2^64 < fraction 的 id
+    u = pd.util.hash_pandas_object(ids, index=False).to_numpy() / 2.0 ** 64
+    sampled = ids[u < 0.1]
+
+    frame = pd.DataFrame({'city': rng.integers(0, 8, len(ids)), 'user_id': ids})
+    halves = [frame.iloc[:len(frame) // 2], frame.iloc[len(frame) // 2:]]
+    grouped = GroupedHyperLogLog.from_frame(halves[0], ['city'], 'user_id') \
+        + GroupedHyperLogLog.from_frame(halves[1], ['city'], 'user_id')
+    exact = frame.groupby('city')['user_id'].nunique()
+    exact_grouped = GroupedDistinctCount.from_frame(frame, ['city'], 'user_id').counts()
+
+    print(f"{'case':<39}{'exact':>10}{'estimate':>12}{'error':>10}")
+    results = [
+        check("random ids", HyperLogLog.from_values(ids).count(), ids.nunique(), tolerance),
+        check("hash-sampled ids (fraction=0.1)", HyperLogLog.from_values(sampled).count(), sampled.nunique(), tolerance),
+        check("merged halves", (HyperLogLog.from_values(ids[:100_000]) + HyperLogLog.from_values(ids[100_000:])).count(),
+              ids.nunique(), tolerance),
+    ]
+    counts = grouped.counts()
+    results += [check(f"city={city}", counts[city], exact[city], tolerance) for city in exact.index]
+    results.append(check("exact DistinctCount", DistinctCount.from_values(ids).count(), ids.nunique(), 0))
+    results.append(check("exact GroupedDistinctCount", exact_grouped.sum(), exact.sum(), 0))
+
+    if not all(results):
+        print("❌ 去重计数检查失败")
+        sys.exit(1)
+    print("✅ 去重计数检查通过")
+
+
+if __name__ == "__main__":
+    main()
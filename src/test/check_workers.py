@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+@Author: Jupiter.Lin
+@CreateDate: 2026-10-17
+@Description: 并行分析确定性检查：同一输入分别用 1 / 2 / 4 个进程分析 (parallel.analyze_parallel)，
+              四个模块的结果必须完全一致（去重用户数、分位数、RFM 分档与 Top-K 并列顺序）。
+              加 --sketches 时 t-digest 分位数随切分方式变化，只允许 SKETCH_FIELDS 中的字段不同。
+              输入与 generate_dashboard.py 一样经 frame_cache.load_preprocessed 加载（完整预处理 + id 编码）。
+              行数低于 PARALLEL_MIN_ROWS 时会内联运行，此处临时放开该阈值。
+@Usage:
+    python src/test/check_workers.py                          # config 中的默认输入文件
+    python src/test/check_workers.py --input-file=BIG.csv --workers-list=1,2,4
+    python src/test/check_workers.py --sketches
+@Version: 1.1
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from main import parallel
+from main.config import get_cli_option, get_input_filename, use_sketches
+from main.frame_cache import load_preprocessed
+
+# 草图模式下允许随进程数变化的字段：t-digest 合并结果与合并顺序有关
+# （HyperLogLog 寄存器取最大值、RFM 切点由主进程对整帧计算，均与进程数无关）
+SKETCH_FIELDS = ["category_price_percentiles"]
+
+
+def diff(left, right, path: str = "") -> list:
+    """Paths where two result dicts differ."""
+    if isinstance(left, dict) and isinstance(right, dict):
+        return [p for key in set(left) | set(right) for p in diff(left.get(key), right.get(key), f"{path}/{key}")]
+    if isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)) and len(left) == len(right):
+        return [p for i, (a, b) in enumerate(zip(left, right)) for p in diff(a, b, f"{path}[{i}]")]
+    return [] if left == right else [path]
+
+
+def main():
+    workers_list = [int(w) for w in get_cli_option('workers-list', 'WORKERS_LIST', '1,2,4').split(',')]
+    df = load_preprocessed(get_input_filename())
+    print(f"📊 {len(df)} 行, 列: {', '.join(df.columns)}")
+    parallel.PARALLEL_MIN_ROWS = 0
+
+    allowed = SKETCH_FIELDS if use_sketches() else []
+
+    baseline = parallel.analyze_parallel(df, workers_list[0])
+    failed = False
+    for workers in workers_list[1:]:
+        paths = diff(baseline, parallel.analyze_parallel(df, workers))
+        expected = [path for path in paths if any(f"/{field}/" in path for field in allowed)]
+        paths = [path for path in paths if path not in expected]
+        print(f"{'✅' if not paths else '❌'} workers={workers_list[0]} vs workers={workers}: {len(paths)} 处差异"
+              f"（允许的草图字段差异 {len(expected)} 处）")
+        for path in paths[:20]:
+            print(f"   {path}")
+        failed = failed or bool(paths)
+
+    if failed:
+        print("❌ 并行分析确定性检查失败")
+        sys.exit(1)
+    print("✅ 并行分析确定性检查通过")
+
+
+if __name__ == "__main__":
+    main()